@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+账号来源（两套实现共用，仅依赖标准库）
+
+账号记录按需逐个读取（迭代器），不一次性读入内存，数千个账号也只占常量内存：
+
+    env:NL_COOKIE                 环境变量，每行一个 Cookie（默认，与原来的行为相同）
+    file:/path/accounts.txt       文件，每行一个 Cookie，或一个 JSON 对象
+    dir:/path/accounts            目录，每个文件一个账号（*.json 为 JSON 对象，其他文件内容为 Cookie）
+    sqlite:/path/accounts.db      SQLite 表（默认表名 accounts，sqlite:/path.db#表名 指定其他表）
+
+JSON 对象 / 表的列：cookie、username、password，以及按账号覆盖的配置（LIKE_PROB、CLICK_COUNT，大小写不限），
+其他字段忽略；SQLite 表有 enabled 列时跳过 enabled = 0 的行。例：
+
+    {"cookie": "_t=...; _forum_session=...", "like_prob": 0.1, "click_count": 5}
+    {"username": "me@example.com", "password": "...", "CLICK_COUNT": 20}
+
+账号密码登录只有 DrissionPage 实现（nodeloc.py）支持；nodeloc/ 目录的实现只使用 Cookie。
+"""
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from checkin_state import account_key
+
+# ------------------ 基础配置 ------------------
+# 账号来源，为空时使用站点配置（默认环境变量 NL_COOKIE）
+ACCOUNTS_SOURCE = os.environ.get("ACCOUNTS_SOURCE", "").strip()
+# 每批读取的账号数（每批并发预检一次，之后逐个处理）
+ACCOUNT_CHUNK = int(os.environ.get("ACCOUNT_CHUNK", "50"))
+# ----------------------------------------------------
+
+# 可以按账号覆盖的配置项 -> 类型
+OVERRIDES = {"LIKE_PROB": float, "CLICK_COUNT": int}
+DEFAULT_TABLE = "accounts"
+
+
+class Account:
+    """一个账号：Cookie 或 用户名 / 密码，加上按账号覆盖的配置。ref 为在来源中的位置（load() 用）。"""
+
+    def __init__(self, cookie: str = "", username: str = "", password: str = "",
+                 overrides: Optional[dict] = None, ref=None) -> None:
+        self.cookie = (cookie or "").strip()
+        self.username = (username or "").strip()
+        self.password = password or ""
+        self.overrides = dict(overrides or {})
+        self.ref = ref
+
+    @property
+    def key(self) -> str:
+        return account_key(self.cookie, self.username)
+
+    def option(self, name: str, default):
+        return self.overrides.get(name, default)
+
+    @classmethod
+    def from_dict(cls, d: dict, ref=None) -> "Account":
+        fields, overrides = {}, {}
+        for k, v in d.items():
+            name = str(k).strip()
+            if name.lower() in ("cookie", "username", "password"):
+                fields[name.lower()] = "" if v is None else str(v)
+            elif name.upper() in OVERRIDES and v not in (None, ""):
+                try:
+                    overrides[name.upper()] = OVERRIDES[name.upper()](v)
+                except (TypeError, ValueError):
+                    raise ValueError(f"账号配置 {name} 的值无效: {v!r}（位置 {ref}）")
+        return cls(overrides=overrides, ref=ref, **fields)
+
+    @classmethod
+    def parse(cls, text: str, ref=None) -> Optional["Account"]:
+        """一行 / 一个文件的内容：JSON 对象，或 Cookie（# 之后为备注）；空行返回 None。"""
+        text = (text or "").strip().lstrip("\ufeff")
+        if text.startswith("{"):
+            return cls.from_dict(json.loads(text), ref)
+        cookie = text.split("#", 1)[0].strip()
+        return cls(cookie=cookie, ref=ref) if cookie else None
+
+    @contextmanager
+    def environ(self):
+        """临时把本账号写入环境变量（之后启动的子进程按单账号读取）。"""
+        env = {"NL_COOKIE": self.cookie, "NODELOC_USERNAME": self.username, "NODELOC_PASSWORD": self.password}
+        env.update({k: str(v) for k, v in self.overrides.items()})
+        saved = {k: os.environ.get(k) for k in env}
+        try:
+            for k, v in env.items():
+                if v:
+                    os.environ[k] = v
+                else:
+                    os.environ.pop(k, None)
+            yield
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+    def __repr__(self) -> str:
+        # 不输出 Cookie / 密码
+        return f"Account({self.key!r}, ref={self.ref!r})"
+
+
+class AccountSource:
+    """账号来源：迭代时逐个产出 Account；load(ref) 按迭代时记下的位置重新读取一个账号。"""
+
+    spec = ""
+
+    def __iter__(self) -> Iterator[Account]:
+        raise NotImplementedError
+
+    def load(self, ref) -> Optional[Account]:
+        for account in self:
+            if account.ref == ref:
+                return account
+        return None
+
+    def first(self) -> Optional[Account]:
+        return next(iter(self), None)
+
+
+class EnvSource(AccountSource):
+    def __init__(self, name: str) -> None:
+        self.name = name or "NL_COOKIE"
+        self.spec = f"env:{self.name}"
+
+    def __iter__(self):
+        for no, line in enumerate(os.environ.get(self.name, "").splitlines(), 1):
+            account = Account.parse(line, ref=no)
+            if account:
+                yield account
+
+
+class FileSource(AccountSource):
+    """ref 为行首的字节偏移，load() 直接 seek。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.spec = f"file:{path}"
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            offset = 0
+            for raw in f:
+                account = Account.parse(raw.decode("utf-8"), ref=offset)
+                offset += len(raw)
+                if account:
+                    yield account
+
+    def load(self, ref):
+        with open(self.path, "rb") as f:
+            f.seek(ref)
+            return Account.parse(f.readline().decode("utf-8"), ref=ref)
+
+
+class DirSource(AccountSource):
+    """按文件名排序（只在内存中保留文件名列表），隐藏文件和子目录跳过；ref 为文件名。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.spec = f"dir:{path}"
+
+    def __iter__(self):
+        for name in sorted(os.listdir(self.path)):
+            account = self.load(name)
+            if account:
+                yield account
+
+    def load(self, ref):
+        path = os.path.join(self.path, ref)
+        if ref.startswith(".") or not os.path.isfile(path):
+            return None
+        with open(path, "r", encoding="utf-8-sig") as f:
+            if ref.lower().endswith(".json"):
+                return Account.from_dict(json.load(f), ref=ref)
+            for line in f:
+                account = Account.parse(line, ref=ref)
+                if account:
+                    return account
+        return None
+
+
+class SqliteSource(AccountSource):
+    """按 rowid 顺序用游标逐行读取；ref 为 rowid。"""
+
+    def __init__(self, spec: str) -> None:
+        path, _, table = spec.partition("#")
+        table = table.strip() or DEFAULT_TABLE
+        if not table.isidentifier():
+            raise ValueError(f"SQLite 账号表名无效: {table}")
+        self.path, self.table = path, table
+        self.spec = f"sqlite:{path}#{table}"
+
+    def _rows(self, where: str = "", args: tuple = ()):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            cur = conn.execute(f"SELECT rowid AS _rowid, * FROM {self.table} {where} ORDER BY rowid", args)
+            cols = [c[0] for c in cur.description]
+            for row in cur:
+                d = dict(zip(cols, row))
+                if d.get("enabled", 1) in (0, "0", "false"):
+                    continue
+                yield Account.from_dict(d, ref=d["_rowid"])
+        finally:
+            conn.close()
+
+    def __iter__(self):
+        return self._rows()
+
+    def load(self, ref):
+        rows = self._rows("WHERE rowid = ?", (ref,))
+        try:
+            return next(rows, None)
+        finally:
+            rows.close()
+
+
+# 来源类型 -> 工厂函数（参数为 "类型:" 之后的部分）
+_SOURCES: Dict[str, Callable[[str], AccountSource]] = {
+    "env": EnvSource,
+    "file": FileSource,
+    "dir": DirSource,
+    "sqlite": SqliteSource,
+}
+
+
+def register_source(kind: str, factory: Callable[[str], AccountSource]) -> None:
+    """注册其他账号来源，如 register_source("redis", RedisAccounts)。"""
+    _SOURCES[kind] = factory
+
+
+def open_source(spec: str) -> AccountSource:
+    """按 类型:参数 打开账号来源；没写类型时按路径判断（目录 / .db 等 SQLite 文件 / 普通文件）。"""
+    kind, sep, rest = (spec or "").strip().partition(":")
+    if sep and kind in _SOURCES:
+        return _SOURCES[kind](rest.strip())
+    path = (spec or "").strip()
+    if not path:
+        raise ValueError("未指定账号来源")
+    if os.path.isdir(path):
+        return DirSource(path)
+    if path.partition("#")[0].lower().endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteSource(path)
+    if os.path.isfile(path):
+        return FileSource(path)
+    raise ValueError(f"未知的账号来源: {spec}（可用: {', '.join(sorted(_SOURCES))}）")
+
+
+def chunked(items: Iterable, size: int = ACCOUNT_CHUNK) -> Iterator[List]:
+    """把迭代器切成不超过 size 个元素的列表，逐批产出。"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= max(size, 1):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+调试产物收集（仅依赖标准库）
+
+HTML / 截图 / console / 网络记录在调用时同步读取（与页面当前状态一致，也不会有两个线程同时操作同一个标签页），
+压缩与落盘交给后台线程：
+- 按 运行 / 账号 分目录命名，多个账号、多次运行互不覆盖
+- 目录总大小超过 DEBUG_ARTIFACTS_MAX_MB 时从最旧的文件开始删除（环形保留），每批写完检查一次
+"""
+import os
+import gzip
+import time
+import queue
+import threading
+from typing import Callable, Optional
+
+from checkin_state import DATA_DIR
+
+# ------------------ 基础配置 ------------------
+ARTIFACTS_DIR = os.environ.get("DEBUG_ARTIFACTS_DIR") or os.path.join(DATA_DIR, "artifacts")
+ARTIFACTS_MAX_MB = float(os.environ.get("DEBUG_ARTIFACTS_MAX_MB", "50"))
+# 队列满时直接丢弃新的采集任务，而不是等待
+QUEUE_SIZE = 32
+# ----------------------------------------------------
+
+# 页面内 console 缓冲：在文档创建前注入，最多保留最近 200 条
+CONSOLE_HOOK_JS = """
+(() => {
+    if (window.__nlConsole) return;
+    const buf = window.__nlConsole = [];
+    for (const level of ['log', 'info', 'warn', 'error']) {
+        const orig = console[level];
+        console[level] = function (...args) {
+            try {
+                buf.push({t: Date.now(), level: level, msg: args.map(a => {
+                    try { return typeof a === 'string' ? a : JSON.stringify(a); } catch (e) { return String(a); }
+                }).join(' ')});
+                if (buf.length > 200) buf.shift();
+            } catch (e) {}
+            return orig.apply(this, args);
+        };
+    }
+    window.addEventListener('error', e => buf.push({t: Date.now(), level: 'uncaught', msg: String(e.message)}));
+})();
+"""
+
+# 读取 console 缓冲与资源加载记录（Resource Timing）
+CONSOLE_DUMP_JS = "return JSON.stringify(window.__nlConsole || []);"
+NETWORK_DUMP_JS = """
+return JSON.stringify(performance.getEntriesByType('resource').map(e => ({
+    name: e.name, type: e.initiatorType, duration: Math.round(e.duration),
+    transfer: e.transferSize || 0, status: e.responseStatus || null
+})));
+"""
+
+# 已经是压缩格式的扩展名，不再 gzip
+_NO_GZIP = {"png", "jpg", "jpeg", "webp", "gz"}
+
+
+def _safe(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(name))[:64] or "_"
+
+
+def enforce_cap(root: str = ARTIFACTS_DIR, max_bytes: Optional[int] = None) -> int:
+    """目录总大小超过上限时按修改时间从旧到新删除，返回删除的字节数。"""
+    max_bytes = int(ARTIFACTS_MAX_MB * 1024 * 1024) if max_bytes is None else max_bytes
+    files = []
+    for d, _, names in os.walk(root):
+        for n in names:
+            p = os.path.join(d, n)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+    total = sum(f[1] for f in files)
+    freed = 0
+    for _, size, p in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(p)
+            total -= size
+            freed += size
+        except OSError:
+            pass
+    # 清理删空的目录
+    for d, subdirs, names in os.walk(root, topdown=False):
+        if d != root and not subdirs and not names:
+            try:
+                os.rmdir(d)
+            except OSError:
+                pass
+    return freed
+
+
+class ArtifactCollector:
+    """每个账号一次运行一个收集器；capture() 读取内容后入队，压缩与写盘在后台线程完成。"""
+
+    def __init__(self, account: str, run_id: Optional[str] = None, root: str = ARTIFACTS_DIR,
+                 max_bytes: Optional[int] = None) -> None:
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.root = root
+        self.dir = os.path.join(root, _safe(self.run_id), _safe(account))
+        self.max_bytes = max_bytes
+        self.saved = []
+        self._seq = 0
+        # 有新文件写入、还没检查总大小上限
+        self._dirty = False
+        self._q: "queue.Queue" = queue.Queue(maxsize=QUEUE_SIZE)
+        self._worker = threading.Thread(target=self._loop, name="artifact-collector", daemon=True)
+        self._worker.start()
+
+    def capture(self, name: str, producer: Callable[[], object], ext: str = "txt") -> bool:
+        """
+        采集一个调试产物：producer 在调用线程中立即执行（返回 str 或 bytes），结果入队后台写盘。
+        producer 出错、返回 None 或队列已满时丢弃并返回 False。
+        """
+        try:
+            data = producer()
+        except Exception:
+            return False
+        if data is None:
+            return False
+        self._seq += 1
+        try:
+            self._q.put_nowait((self._seq, name, data, ext))
+            return True
+        except queue.Full:
+            return False
+
+    def capture_page(self, page, tag: str, screenshot: bool = True) -> None:
+        """DrissionPage 页面：HTML + 截图 + console + 网络记录。"""
+        self.capture(f"{tag}-page", lambda: page.html or "", "html")
+        if screenshot:
+            self.capture(f"{tag}-snap", lambda: page.get_screenshot(as_bytes="png"), "png")
+        self.capture(f"{tag}-console", lambda: page.run_js(CONSOLE_DUMP_JS), "json")
+        self.capture(f"{tag}-network", lambda: page.run_js(NETWORK_DUMP_JS), "json")
+
+    def _loop(self) -> None:
+        while True:
+            item = self._q.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+                if self._q.empty():
+                    self._enforce_cap()
+            except Exception:
+                pass
+            finally:
+                self._q.task_done()
+
+    def _enforce_cap(self) -> None:
+        if self._dirty:
+            self._dirty = False
+            enforce_cap(self.root, self.max_bytes)
+
+    def _write(self, seq: int, name: str, data, ext: str) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        os.makedirs(self.dir, exist_ok=True)
+        path = os.path.join(self.dir, f"{seq:03d}-{_safe(name)}.{ext}")
+        if ext not in _NO_GZIP:
+            path += ".gz"
+            data = gzip.compress(data, compresslevel=6)
+        with open(path, "wb") as f:
+            f.write(data)
+        self.saved.append(path)
+        self._dirty = True
+
+    def close(self, timeout: float = 10.0) -> list:
+        """等待已入队的任务最多 timeout 秒，返回已保存的文件列表。"""
+        deadline = time.monotonic() + timeout
+        try:
+            self._q.put(None, timeout=timeout)
+        except queue.Full:
+            return list(self.saved)
+        self._worker.join(max(0.0, deadline - time.monotonic()))
+        if not self._worker.is_alive():
+            try:
+                self._enforce_cap()
+            except OSError:
+                pass
+        return list(self.saved)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+账号任务后端与按成本选择（两套实现共用，仅依赖标准库）
+
+同一个任务（validate 验证登录 / checkin 签到 / browse 浏览点赞）可以由不同后端完成：
+纯 HTTP、DrissionPage、undetected_chromedriver……成本依次升高。
+BackendSelector 按账号 × 任务记录每个后端的成功率与耗时（EWMA，持久化到本地），
+每次优先选择"期望成本"最低、最近成功过的后端，失败则逐级升级到更重的后端。
+"""
+import os
+import time
+import threading
+from typing import List, Optional, Tuple
+
+from checkin_state import DATA_DIR, file_lock, load_json, save_json
+
+# ------------------ 基础配置 ------------------
+BACKEND_STATS_FILE = os.environ.get("BACKEND_STATS_FILE") or os.path.join(DATA_DIR, "backend_stats.json")
+# 允许使用的后端（逗号分隔，按名称过滤；为空表示全部）
+BACKENDS = [s.strip() for s in os.environ.get("BACKENDS", "").split(",") if s.strip()]
+# 账号需要 HTTP 签到时使用的接口（相对路径，如 /checkin），为空表示站点不支持纯 HTTP 签到
+CHECKIN_ENDPOINT = os.environ.get("CHECKIN_ENDPOINT", "").strip()
+
+# EWMA 平滑系数
+EWMA_ALPHA = 0.3
+# 没有历史记录时假定的成功率
+PRIOR_OK_RATE = 0.9
+# 最近一次失败后，在该时间内把该后端排到后面（秒）
+FAIL_COOLDOWN = 6 * 3600
+# ----------------------------------------------------
+
+TASKS = ("validate", "checkin", "browse")
+
+
+class Backend:
+    """
+    账号任务后端。子类设置 name / base_cost / tasks，并实现 run()。
+    一个实例只服务一个账号，可以在多个任务之间复用已建立的会话 / 浏览器，close() 时释放。
+    """
+
+    name = ""
+    # 粗略的相对成本（秒级耗时量级），没有历史数据时用于排序
+    base_cost = 1.0
+    tasks: Tuple[str, ...] = ()
+    # 页面加载追踪（NAV_TRACE，见 nav_trace.py），浏览器后端在 close() 时填入
+    traces: List[dict] = []
+    # 浏览器启动记录（{profile, binary, seconds, rss_mb}），浏览器后端在 close() 时填入
+    launches: List[dict] = []
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, task: str) -> bool:
+        return task in self.tasks
+
+    def run(self, task: str) -> bool:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class BackendStats:
+    """账号 × 任务 × 后端 -> {n, ok_rate, latency, last_ok, last_fail}，JSON 持久化。"""
+
+    def __init__(self, path: str = BACKEND_STATS_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = load_json(path)
+
+    @staticmethod
+    def _key(account: str, task: str, backend: str) -> str:
+        return f"{account}|{task}|{backend}"
+
+    def get(self, account: str, task: str, backend: str) -> Optional[dict]:
+        with self._lock:
+            return self._data.get(self._key(account, task, backend))
+
+    def record(self, account: str, task: str, backend: str, ok: bool, latency: float) -> None:
+        key = self._key(account, task, backend)
+        now = int(time.time())
+        with self._lock, file_lock(self.path):
+            # 先合并其他进程写入的数据，再更新本条
+            self._data = load_json(self.path)
+            rec = dict(self._data.get(key) or {})
+            n = rec.get("n", 0)
+            if n == 0:
+                rec["ok_rate"] = 1.0 if ok else 0.0
+                rec["latency"] = latency
+            else:
+                rec["ok_rate"] = (1 - EWMA_ALPHA) * rec.get("ok_rate", PRIOR_OK_RATE) + EWMA_ALPHA * (1.0 if ok else 0.0)
+                if ok:
+                    rec["latency"] = (1 - EWMA_ALPHA) * rec.get("latency", latency) + EWMA_ALPHA * latency
+            rec["n"] = n + 1
+            rec["last_ok" if ok else "last_fail"] = now
+            self._data[key] = rec
+            save_json(self.path, self._data)
+
+
+class BackendSelector:
+    def __init__(self, stats: Optional[BackendStats] = None) -> None:
+        self.stats = stats or BackendStats()
+        # 最近一次 run() 的尝试明细：[(后端名, 是否成功, 耗时秒)]
+        self.attempts: List[Tuple[str, bool, float]] = []
+
+    def expected_cost(self, account: str, task: str, backend: Backend) -> float:
+        """期望成本 = 平均耗时 / 成功率；最近失败过（且之后没成功）的后端额外加重。"""
+        rec = self.stats.get(account, task, backend.name) or {}
+        latency = rec.get("latency", backend.base_cost)
+        ok_rate = max(rec.get("ok_rate", PRIOR_OK_RATE), 0.05)
+        cost = latency / ok_rate
+        last_fail, last_ok = rec.get("last_fail", 0), rec.get("last_ok", 0)
+        if last_fail > last_ok and time.time() - last_fail < FAIL_COOLDOWN:
+            cost *= 10
+        return cost
+
+    def rank(self, account: str, task: str, backends: List[Backend]) -> List[Backend]:
+        cands = [b for b in backends if b.supports(task) and (not BACKENDS or b.name in BACKENDS)]
+        return sorted(cands, key=lambda b: (self.expected_cost(account, task, b), b.base_cost))
+
+    def run(self, account: str, task: str, backends: List[Backend], log=None) -> Tuple[bool, str]:
+        """
+        按期望成本从低到高依次尝试，直到某个后端成功。
+        :return: (是否成功, 成功的后端名；全部失败时为最后尝试的后端名)
+        """
+        used = ""
+        self.attempts = []
+        for b in self.rank(account, task, backends):
+            used = b.name
+            t0 = time.monotonic()
+            try:
+                ok = bool(b.run(task))
+            except Exception as e:
+                ok = False
+                if log:
+                    log(f"[backend] {task} via {b.name} 异常: {e}")
+            latency = time.monotonic() - t0
+            self.stats.record(account, task, b.name, ok, latency)
+            self.attempts.append((b.name, ok, latency))
+            if log:
+                log(f"[backend] {task} via {b.name}: {'成功' if ok else '失败'}（{latency:.1f}s）")
+            if ok:
+                return True, b.name
+        return False, used
+
+
+def available_backends(backends: List[Backend]) -> List[Backend]:
+    return [b for b in backends if b.available()]
+
+
+def close_all(backends: List[Backend]) -> None:
+    for b in backends:
+        try:
+            b.close()
+        except Exception:
+            pass
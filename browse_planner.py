@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+按时间预算规划浏览（两套实现共用，仅依赖标准库）
+
+每个主题的阅读成本按帖子数估算（打开页面的固定开销 + 滚动到底需要的步数 × 停留时间），
+在预算内优先读"单位时间读到的帖子最多"的主题；临近截止时先缩短停留、再减少步数、最后少读几个主题。
+固定开销按实际耗时滚动修正。
+
+预算分两层：
+- BROWSE_BUDGET：每个账号的浏览时长上限
+- BROWSE_RUN_BUDGET：整次运行所有账号的浏览总时长上限；截止时间写入环境变量，
+  子进程（账号隔离进程、另一套实现）继承同一个截止时间
+"""
+import os
+import math
+import time
+import random
+from typing import List, Optional, Tuple
+
+from scroll_driver import STEPS_RANGE, DIST_RANGE, DWELL_RANGE, scroll_plan
+
+# ------------------ 基础配置 ------------------
+# 每个账号的浏览时间预算（秒），0 表示不限制
+BROWSE_BUDGET = float(os.environ.get("BROWSE_BUDGET", "600"))
+# 整次运行的浏览时间预算（秒），0 表示不限制
+BROWSE_RUN_BUDGET = float(os.environ.get("BROWSE_RUN_BUDGET", "0"))
+# ----------------------------------------------------
+
+_DEADLINE_ENV = "BROWSE_RUN_DEADLINE"
+
+# 估算参数：每帖约占的页面高度、没有帖子数时的默认值、每个主题的固定开销初值（打开 + 等待 + 点赞 + 关闭）
+PX_PER_POST = 400
+DEFAULT_POSTS = 8
+OPEN_OVERHEAD = 5.0
+# 降级下限：停留时间再短 Discourse 不计阅读；每个主题至少滚动的步数
+MIN_DWELL_RANGE = (1.0, 1.6)
+MIN_STEPS = 2
+
+_AVG_DIST = sum(DIST_RANGE) / 2.0
+
+# 从主题列表读取 链接 + 帖子数 + 浏览数（DrissionPage run_js / Selenium execute_script 通用）
+TOPIC_LIST_JS = """
+const num = (el) => {
+    if (!el) return null;
+    const t = (el.getAttribute('title') || el.textContent || '').trim().toLowerCase();
+    const m = t.match(/([\\d.,]+)\\s*(k|m)?/);
+    if (!m) return null;
+    let n = parseFloat(m[1].replace(/,/g, ''));
+    if (m[2] === 'k') n *= 1000;
+    if (m[2] === 'm') n *= 1000000;
+    return Math.round(n);
+};
+return Array.from(document.querySelectorAll('#list-area a.title')).map((a) => {
+    const row = a.closest('tr, .topic-list-item') || a.parentElement;
+    return {
+        url: a.href || a.getAttribute('href') || '',
+        posts: num(row && row.querySelector('.posts .number, .posts-map .number, .num.posts .number')),
+        views: num(row && row.querySelector('.views .number')),
+    };
+}).filter((t) => t.url);
+"""
+
+
+def run_deadline() -> Optional[float]:
+    """
+    整次运行的浏览截止时间（epoch 秒）；第一次调用时按 BROWSE_RUN_BUDGET 设定并写入环境变量。
+    入口进程要在启动账号子进程之前调用一次，子进程才能继承同一个截止时间。
+    """
+    raw = os.environ.get(_DEADLINE_ENV, "").strip()
+    if raw:
+        try:
+            return float(raw)
+        except ValueError:
+            pass
+    if BROWSE_RUN_BUDGET <= 0:
+        return None
+    deadline = time.time() + BROWSE_RUN_BUDGET
+    os.environ[_DEADLINE_ENV] = f"{deadline:.3f}"
+    return deadline
+
+
+def account_budget() -> float:
+    """本账号可用的浏览时间（秒）：账号预算与整次运行剩余时间取小；不限制时为 inf。"""
+    budget = BROWSE_BUDGET if BROWSE_BUDGET > 0 else math.inf
+    deadline = run_deadline()
+    if deadline is not None:
+        budget = min(budget, deadline - time.time())
+    return budget
+
+
+def _mean(r) -> float:
+    return (r[0] + r[1]) / 2.0
+
+
+class BrowsePlanner:
+    """
+    topics：[{"url", "posts", "views"}]（TOPIC_LIST_JS 的结果）
+    依次调用 next() 取 (主题, 滚动计划)，读完后用 done() 回报实际耗时；预算不够时 next() 返回 None。
+    """
+
+    def __init__(self, topics: List[dict], budget: float, max_topics: int, rng=random,
+                 started: Optional[float] = None) -> None:
+        self.rng = rng
+        self.budget = budget
+        self.started = time.monotonic() if started is None else started
+        self.max_topics = max_topics
+        self.overhead = OPEN_OVERHEAD
+        self.visited = 0
+        self.degraded = 0
+        self.posts_read = 0.0
+        seen = set()
+        self.pending = []
+        for t in topics:
+            if t.get("url") and t["url"] not in seen:
+                seen.add(t["url"])
+                # 随机扰动保留"随机浏览"的效果，不总是读同几个主题
+                self.pending.append(dict(t, _jitter=rng.uniform(0.75, 1.25)))
+
+    # ------------------ 估算 ------------------
+    @staticmethod
+    def _posts(topic: dict) -> int:
+        return max(1, int(topic.get("posts") or DEFAULT_POSTS))
+
+    def _steps_needed(self, topic: dict) -> int:
+        """滚到底大约需要的步数（到底后页内脚本自动结束，多给的步数不花时间）。"""
+        need = math.ceil(self._posts(topic) * PX_PER_POST / _AVG_DIST) + 1
+        return max(MIN_STEPS, min(STEPS_RANGE[1], need))
+
+    def _value(self, topic: dict, steps: int) -> float:
+        """读到的帖子数 + 进入主题本身。"""
+        return 1 + min(self._posts(topic), steps * _AVG_DIST / PX_PER_POST)
+
+    def _cost(self, steps: int, dwell_range=DWELL_RANGE) -> float:
+        return self.overhead + steps * _mean(dwell_range)
+
+    def remaining(self) -> float:
+        return self.budget - (time.monotonic() - self.started)
+    # ----------------------------------------------------
+
+    def next(self) -> Optional[Tuple[dict, dict]]:
+        left = self.remaining()
+        min_cost = self._cost(MIN_STEPS, MIN_DWELL_RANGE)
+        if not self.pending or self.visited >= self.max_topics or left < min_cost:
+            return None
+
+        # 1. 按 单位时间读到的帖子数 选主题
+        def ratio(t):
+            steps = self._steps_needed(t)
+            return self._value(t, steps) / self._cost(steps) * t["_jitter"]
+
+        self.pending.sort(key=ratio, reverse=True)
+        topic = self.pending.pop(0)
+
+        # 2. 剩余时间平摊到还打算读的主题上；连最短读法都摊不开时少读几个
+        target = min(self.max_topics - self.visited, len(self.pending) + 1)
+        while target > 1 and left / target < min_cost:
+            target -= 1
+        allowance = left / target - self.overhead
+
+        # 3. 正常读法放不下时先缩短停留，再减少步数
+        steps_range = (min(STEPS_RANGE[0], self._steps_needed(topic)), STEPS_RANGE[1])
+        steps = min(self._steps_needed(topic), STEPS_RANGE[1])
+        dwell = DWELL_RANGE
+        if steps * _mean(DWELL_RANGE) > allowance:
+            self.degraded += 1
+            scale = max(allowance / (steps * _mean(DWELL_RANGE)), 0.0)
+            dwell = (max(MIN_DWELL_RANGE[0], DWELL_RANGE[0] * scale), max(MIN_DWELL_RANGE[1], DWELL_RANGE[1] * scale))
+            if steps * _mean(dwell) > allowance:
+                steps = max(MIN_STEPS, int(allowance // _mean(dwell)))
+            steps_range = (steps, steps)
+
+        plan = scroll_plan(self.rng, steps_range=steps_range, dwell_range=dwell)
+        return topic, plan
+
+    def done(self, topic: dict, elapsed: float, plan: dict, summary: Optional[dict] = None) -> None:
+        """回报一个主题的实际耗时，修正固定开销的估计。"""
+        self.visited += 1
+        steps = (summary or {}).get("steps") or len(plan["steps"])
+        scrolled = sum(s["dwell_ms"] for s in plan["steps"][:steps]) / 1000.0
+        self.overhead = 0.7 * self.overhead + 0.3 * max(elapsed - scrolled, 0.5)
+        self.posts_read += self._value(topic, steps) - 1
+
+    def summary(self) -> str:
+        used = time.monotonic() - self.started
+        budget = "不限" if math.isinf(self.budget) else f"{self.budget:.0f}s"
+        text = f"浏览 {self.visited} 个主题，约 {self.posts_read:.0f} 帖，用时 {used:.0f}s / 预算 {budget}"
+        return text + (f"，{self.degraded} 个主题缩短了阅读" if self.degraded else "")
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 录制 / 回放（仅依赖标准库）
+
+HTTP_CASSETTE_MODE=record 时把本次运行 NodeLocBrowser.session 的所有请求 / 响应
+写入 gzip 压缩的 JSON 卡带（Cookie、Set-Cookie 值、CSRF、密码等敏感字段脱敏；
+HTML 页面中的 csrf-token meta 与 data-preloaded 预加载数据（含当前用户信息）同样脱敏）；
+HTTP_CASSETTE_MODE=replay 时完全离线，按匹配规则从卡带取响应，不访问站点。
+"""
+import os
+import re
+import gzip
+import json
+import base64
+import threading
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# ------------------ 基础配置 ------------------
+HTTP_CASSETTE = os.environ.get("HTTP_CASSETTE", "").strip()
+HTTP_CASSETTE_MODE = os.environ.get("HTTP_CASSETTE_MODE", "").strip().lower()  # record / replay
+# 匹配规则：method、url 必选，可追加 body
+HTTP_CASSETTE_MATCH = tuple(
+    s.strip() for s in os.environ.get("HTTP_CASSETTE_MATCH", "method,url").split(",") if s.strip()
+)
+# ----------------------------------------------------
+
+REDACTED = "REDACTED"
+# 请求 / 响应中需要脱敏的字段（表单、JSON、URL 参数）
+SECRET_KEYS = {"password", "login", "csrf", "token", "api_key", "auth_token", "second_factor_token"}
+# HTML 中需要脱敏的部分：<meta name="csrf-token" content="..."> 与 data-preloaded="..."（Discourse 预加载的当前用户等数据）
+_HTML_SECRETS = [
+    re.compile(r"""(<meta\b[^>]*\bname=["']csrf-token["'][^>]*\bcontent=)(["'])[^"']*\2""", re.I),
+    re.compile(r"""(<meta\b[^>]*\bcontent=)(["'])[^"']*\2(?=[^>]*\bname=["']csrf-token["'])""", re.I),
+    re.compile(r"""(\bdata-preloaded=)(["'])[^"']*\2""", re.I),
+]
+# 录制时保留的响应头
+KEEP_HEADERS = {"content-type", "retry-after", "location"}
+
+
+def _redact_obj(obj):
+    if isinstance(obj, dict):
+        return {k: (REDACTED if str(k).lower() in SECRET_KEYS else _redact_obj(v)) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_redact_obj(v) for v in obj]
+    return obj
+
+
+def _redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    q = [(k, REDACTED if k.lower() in SECRET_KEYS else v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(q)))
+
+
+def _request_body(kwargs: dict):
+    if kwargs.get("json") is not None:
+        return _redact_obj(kwargs["json"])
+    data = kwargs.get("data")
+    if isinstance(data, dict):
+        return _redact_obj(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8", "replace")
+    if isinstance(data, str):
+        return _redact_obj(dict(parse_qsl(data, keep_blank_values=True))) if "=" in data else data
+    return None
+
+
+def _redact_html(text: str) -> str:
+    for pattern in _HTML_SECRETS:
+        text = pattern.sub(lambda m: f"{m.group(1)}{m.group(2)}{REDACTED}{m.group(2)}", text)
+    return text
+
+
+def _redact_text(text: str, content_type: str) -> str:
+    if "json" not in (content_type or ""):
+        return _redact_html(text) if "<" in text else text
+    try:
+        return json.dumps(_redact_obj(json.loads(text)), ensure_ascii=False)
+    except ValueError:
+        return text
+
+
+class ReplayResponse:
+    """回放出的响应，提供 NodeLocBrowser 用到的 curl_cffi Response 接口子集。"""
+
+    def __init__(self, rec: dict, url: str) -> None:
+        self.url = url
+        self.status_code = rec["status"]
+        self.headers = dict(rec.get("headers") or {})
+        if rec.get("body_b64") is not None:
+            self.content = base64.b64decode(rec["body_b64"])
+        else:
+            self.content = (rec.get("body") or "").encode("utf-8")
+        self.set_cookie_names = list(rec.get("set_cookies") or [])
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f"HTTP {self.status_code} (replay) for {self.url}")
+
+
+class CassetteMiss(RuntimeError):
+    """回放时卡带中找不到匹配的请求。"""
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, match_on=HTTP_CASSETTE_MATCH) -> None:
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知的卡带模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.match_on = tuple(match_on) or ("method", "url")
+        self.entries = []
+        self._used = set()
+        self._lock = threading.Lock()
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                self.entries = json.load(f).get("interactions", [])
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _key(self, method: str, url: str, body) -> tuple:
+        key = []
+        if "method" in self.match_on:
+            key.append(method.upper())
+        if "url" in self.match_on:
+            key.append(_redact_url(url))
+        if "body" in self.match_on:
+            key.append(json.dumps(body, sort_keys=True, ensure_ascii=False))
+        return tuple(key)
+
+    def record(self, method: str, url: str, kwargs: dict, resp) -> None:
+        headers = {k.lower(): v for k, v in dict(resp.headers or {}).items() if k.lower() in KEEP_HEADERS}
+        content = resp.content or b""
+        rec = {
+            "method": method.upper(),
+            "url": _redact_url(url),
+            "body": _request_body(kwargs),
+            "response": {"status": resp.status_code, "headers": headers},
+        }
+        try:
+            rec["response"]["body"] = _redact_text(content.decode("utf-8"), headers.get("content-type", ""))
+        except UnicodeDecodeError:
+            rec["response"]["body_b64"] = base64.b64encode(content).decode("ascii")
+        try:
+            rec["response"]["set_cookies"] = sorted({c.name for c in resp.cookies.jar})
+        except Exception:
+            pass
+        with self._lock:
+            self.entries.append(rec)
+
+    def play(self, method: str, url: str, kwargs: dict) -> ReplayResponse:
+        """按录制顺序取第一条未使用的匹配项；都用过时复用最后一条匹配项。"""
+        key = self._key(method, url, _request_body(kwargs))
+        with self._lock:
+            last = None
+            for i, rec in enumerate(self.entries):
+                if self._key(rec["method"], rec["url"], rec.get("body")) != key:
+                    continue
+                last = i
+                if i not in self._used:
+                    self._used.add(i)
+                    return ReplayResponse(rec["response"], url)
+            if last is not None:
+                return ReplayResponse(self.entries[last]["response"], url)
+        raise CassetteMiss(f"卡带中没有匹配的请求: {method.upper()} {_redact_url(url)}")
+
+    def save(self) -> None:
+        if not self.recording:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            data = {"version": 1, "interactions": list(self.entries)}
+        with gzip.open(self.path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+
+_CASSETTE: Optional[Cassette] = None
+_CASSETTE_LOCK = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """按环境变量创建的进程级卡带；未配置时返回 None。"""
+    global _CASSETTE
+    if not (HTTP_CASSETTE and HTTP_CASSETTE_MODE):
+        return None
+    with _CASSETTE_LOCK:
+        if _CASSETTE is None:
+            _CASSETTE = Cassette(HTTP_CASSETTE, HTTP_CASSETTE_MODE)
+        return _CASSETTE
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+签到状态缓存（两套实现共用，仅依赖标准库）
+
+记录每个账号最近一次确认签到的日期（按站点时区），在启动浏览器 / 发 HTTP 之前查询：
+今天已签到的账号直接跳过签到。文件写入加锁 + 原子替换，允许多个进程同时写。
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# ------------------ 基础配置 ------------------
+DATA_DIR = os.environ.get("NODELOC_DATA_DIR") or os.path.join(os.path.expanduser("~"), ".nodeloc")
+STATE_FILE = os.environ.get("CHECKIN_STATE_FILE") or os.path.join(DATA_DIR, "checkin_state.json")
+# 站点按哪个时区换日（NodeLoc 为北京时间）
+SITE_TZ = os.environ.get("SITE_TZ", "Asia/Shanghai")
+# 忽略本地记录，强制重新签到
+FORCE_CHECKIN = os.environ.get("FORCE_CHECKIN", "false").strip().lower() in ["true", "1", "on"]
+# ----------------------------------------------------
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _site_tz():
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(SITE_TZ)
+    except Exception:
+        # 无 tzdata 的环境（如部分 Windows）退回固定 UTC+8
+        return timezone(timedelta(hours=8))
+
+
+def site_today() -> str:
+    """站点时区下的今天（YYYY-MM-DD）。"""
+    return datetime.now(_site_tz()).strftime("%Y-%m-%d")
+
+
+def account_key(cookie: str = "", username: str = "") -> str:
+    """账号标识：优先用户名；否则取 Cookie 中 _t（登录令牌）或整串 Cookie 的摘要，避免明文落盘。"""
+    if username:
+        return username
+    token = ""
+    for kv in (cookie or "").split(";"):
+        if "=" in kv and kv.split("=", 1)[0].strip() == "_t":
+            token = kv.split("=", 1)[1].strip()
+            break
+    return "cookie-" + hashlib.sha256((token or cookie or "").encode("utf-8")).hexdigest()[:12]
+
+
+@contextmanager
+def file_lock(path: str):
+    """跨进程排他锁（锁文件与状态文件同目录）。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a+") as fh:
+        if fcntl:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def load_json(path: str) -> dict:
+    """读取 JSON 对象文件；不存在或损坏时返回空 dict。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json(path: str, data: dict) -> None:
+    """原子写入 JSON（临时文件 + os.replace），读者不会看到半个文件。"""
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", dir=d)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class CheckinState:
+    """站点 × 账号 -> 最近一次确认签到的记录。"""
+
+    def __init__(self, path: str = STATE_FILE) -> None:
+        self.path = path
+
+    @staticmethod
+    def _key(site: str, account: str) -> str:
+        return f"{site}|{account}"
+
+    def get(self, site: str, account: str) -> Optional[dict]:
+        return load_json(self.path).get(self._key(site, account))
+
+    def checked_in_today(self, site: str, account: str, force: bool = FORCE_CHECKIN) -> bool:
+        """今天（站点时区）是否已确认签到；force 时总是返回 False。"""
+        if force:
+            return False
+        rec = self.get(site, account) or {}
+        return rec.get("date") == site_today()
+
+    def mark(self, site: str, account: str, **extra) -> None:
+        """记录今天已确认签到（读-改-写全程持锁，并发写不会互相覆盖）。"""
+        with file_lock(self.path):
+            data = load_json(self.path)
+            rec = dict(data.get(self._key(site, account)) or {})
+            rec.update(extra)
+            rec.update({"date": site_today(), "ts": int(time.time())})
+            data[self._key(site, account)] = rec
+            save_json(self.path, data)
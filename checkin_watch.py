@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+签到结果确认（两套实现共用，仅依赖标准库）
+
+点击签到按钮之前先在页面内装好监听（WATCH_JS），点击后以很短的间隔读取监听结果（STATE_JS），
+服务端一确认就返回，不再固定 sleep 后重新查按钮：
+
+- 签到 XHR / fetch 的响应（URL 匹配签到接口的非 GET 请求）：2xx 为成功，4xx/5xx 为失败
+- MessageBus：订阅签到插件推送的频道（CHECKIN_CHANNELS，{user_id} 替换为当前用户 id），收到消息即成功；
+  不带 {user_id} 的公共频道只认 user_id 与当前用户一致的消息（其他人的签到也会推送到公共频道）
+- 按钮状态：每次读取时重新查询按钮（checked-in class / 已签 文案），不持有可能过期的元素句柄
+
+都没有结论时（监听没装上、插件不发请求 / 消息），在 CHECKIN_DOM_FALLBACK 秒内回退为按钮状态轮询。
+
+纯 HTTP 签到（POST 签到接口）的响应由 confirm_http() 判断：只认签到接口返回的 JSON，
+Cloudflare 质询页、登录跳转页等非 JSON 响应一律视为未确认，由后端选择器改用浏览器签到。
+"""
+import os
+import re
+import json
+import time
+from typing import Callable, List, Optional, Tuple
+
+# ------------------ 基础配置 ------------------
+# 等待 XHR / MessageBus / 按钮状态确认的最长时间（秒）
+CHECKIN_CONFIRM_TIMEOUT = float(os.environ.get("CHECKIN_CONFIRM_TIMEOUT", "10"))
+# 之后回退为按钮状态轮询的最长时间（秒）
+CHECKIN_DOM_FALLBACK = float(os.environ.get("CHECKIN_DOM_FALLBACK", "5"))
+# 签到插件推送的 MessageBus 频道（逗号分隔），{user_id} 为当前用户 id
+CHECKIN_CHANNELS = [s.strip() for s in os.environ.get("CHECKIN_CHANNELS", "/checkin/{user_id}").split(",")
+                    if s.strip()]
+# ----------------------------------------------------
+
+# 读取监听结果的间隔（秒）
+POLL_INTERVAL = 0.2
+# 没有配置签到接口时，按 URL 识别签到请求
+DEFAULT_URL_PATTERN = r"check[-_]?in"
+# 签到插件表示"今天已经签过"的报错文案：接口报错但状态其实已达成（不用 already 之类的泛词，以免误判）
+ALREADY_MARKS = ("已签到", "已经签到")
+
+# 参数：按钮选择器、签到请求 URL 正则、MessageBus 频道列表
+# 请求钩子只装一次（挂在原型 / window.fetch 上），每次调用重置结果对象
+WATCH_JS = """
+const sel = arguments[0], pattern = new RegExp(arguments[1] || 'check[-_]?in', 'i'), channels = arguments[2] || [];
+const w = window;
+const st = {xhr: null, bus: null};
+st.record = (url, method, status, body) => {
+    if (st.xhr || !pattern.test(String(url || '')) || /^(GET|HEAD)$/i.test(method || 'GET')) return;
+    st.xhr = {url: String(url), status: status, body: String(body || '').slice(0, 500)};
+};
+st.checked = () => {
+    const el = document.querySelector(sel);
+    if (!el) return false;
+    const cls = (typeof el.className === 'string') ? el.className : (el.getAttribute('class') || '');
+    const label = (el.getAttribute('title') || '') + ' ' + (el.getAttribute('aria-label') || '');
+    return cls.includes('checked-in') || label.includes('已签');
+};
+w.__nlCheckin = st;
+
+if (!w.__nlCheckinHooked) {
+    w.__nlCheckinHooked = true;
+    const open = XMLHttpRequest.prototype.open, send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__nlReq = [method, url];
+        return open.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.send = function () {
+        const req = this.__nlReq;
+        if (req) {
+            this.addEventListener('loadend', () => {
+                const text = (this.responseType === '' || this.responseType === 'text') ? this.responseText : '';
+                if (w.__nlCheckin) w.__nlCheckin.record(req[1], req[0], this.status, text);
+            });
+        }
+        return send.apply(this, arguments);
+    };
+    if (w.fetch) {
+        const fetch = w.fetch;
+        w.fetch = function (input, init) {
+            const url = (typeof input === 'string') ? input : ((input && input.url) || '');
+            const method = (init && init.method) || (input && input.method) || 'GET';
+            const p = fetch.apply(this, arguments);
+            p.then((r) => r.clone().text().then((t) => {
+                if (w.__nlCheckin) w.__nlCheckin.record(url, method, r.status, t);
+            })).catch(() => {});
+            return p;
+        };
+    }
+}
+
+let mb = w.MessageBus, uid = null;
+try {
+    const c = w.Discourse && w.Discourse.__container__;
+    if (c) {
+        mb = mb || c.lookup('service:message-bus');
+        const u = c.lookup('service:current-user');
+        uid = u && u.id;
+    }
+} catch (e) {}
+// 公共频道上的消息必须带有当前用户的 id
+const own = (data) => {
+    const id = data && (data.user_id ?? data.userId ?? (data.user && data.user.id));
+    return uid != null && id != null && String(id) === String(uid);
+};
+const subscribed = [];
+if (mb && typeof mb.subscribe === 'function') {
+    for (const tpl of channels) {
+        const scoped = tpl.includes('{user_id}');
+        if (scoped && !uid) continue;
+        const ch = tpl.replace('{user_id}', uid);
+        try {
+            // 不传 lastId：只接收订阅之后的新消息
+            mb.subscribe(ch, (data) => {
+                if (!scoped && !own(data)) return;
+                if (w.__nlCheckin === st && !st.bus) st.bus = {channel: ch, data: JSON.stringify(data || null).slice(0, 500)};
+            });
+            subscribed.push(ch);
+        } catch (e) {}
+    }
+}
+return {checked: st.checked(), channels: subscribed};
+"""
+
+STATE_JS = """
+const st = window.__nlCheckin;
+if (!st) return null;
+return {xhr: st.xhr, bus: st.bus, dom: st.checked()};
+"""
+
+
+def url_pattern(endpoint: str = "") -> str:
+    """签到请求的 URL 正则：配置了签到接口时精确匹配它的路径。"""
+    endpoint = (endpoint or "").strip()
+    if not endpoint:
+        return DEFAULT_URL_PATTERN
+    path = re.sub(r"^https?://[^/]+", "", endpoint)
+    return re.escape(path.split("?", 1)[0])
+
+
+def watch_args(selector: str, endpoint: str = "", channels: Optional[List[str]] = None) -> tuple:
+    """WATCH_JS 的参数。"""
+    return selector, url_pattern(endpoint), list(CHECKIN_CHANNELS if channels is None else channels)
+
+
+def _error_body(body: str) -> bool:
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and bool(data.get("errors") or data.get("failed") or data.get("success") is False)
+
+
+def confirm(state: Optional[dict]) -> Optional[Tuple[bool, str]]:
+    """
+    由一次 STATE_JS 的结果得出结论
+    :return: (是否签到成功, 依据)；还没有结论时为 None
+    """
+    if not state:
+        return None
+    if state.get("dom"):
+        return True, "按钮状态"
+    xhr = state.get("xhr")
+    if xhr:
+        status, body = int(xhr.get("status") or 0), xhr.get("body") or ""
+        if any(m in body for m in ALREADY_MARKS):
+            return True, f"签到接口 {status}（今日已签到）"
+        if 200 <= status < 300 and not _error_body(body):
+            return True, f"签到接口 {status}"
+        if status:
+            return False, f"签到接口 {status}: {body[:120]}"
+        # status 0：请求被中断（如页面跳转），不作结论
+    bus = state.get("bus")
+    if bus:
+        return True, f"MessageBus {bus.get('channel')}"
+    return None
+
+
+def confirm_http(status: int, body: str) -> Tuple[Optional[bool], str]:
+    """
+    由纯 HTTP 签到接口的响应得出结论
+    :return: (True 签到成功 / 今日已签到，False 接口明确报错，None 无法确认), 依据
+    """
+    try:
+        data = json.loads(body or "")
+    except ValueError:
+        # 非 JSON：Cloudflare 质询页、登录跳转页等，不代表签到接口的结果
+        return None, f"HTTP {status}，响应不是 JSON"
+    if not isinstance(data, dict):
+        return None, f"HTTP {status}，无法识别的响应"
+    text = str(data.get("error") or data.get("errors") or data.get("message") or "")
+    if any(m in text for m in ALREADY_MARKS):
+        return True, "今日已签到"
+    if 200 <= status < 300 and not (data.get("error") or _error_body(body)):
+        return True, f"HTTP {status}"
+    return False, f"HTTP {status}: {text[:120]}" if text else f"HTTP {status}"
+
+
+def wait_confirmed(read: Callable[[], Optional[dict]], timeout: float = CHECKIN_CONFIRM_TIMEOUT,
+                   interval: float = POLL_INTERVAL) -> Tuple[Optional[bool], str]:
+    """
+    反复执行 read()（在页面内执行 STATE_JS）直到有结论或超时
+    :return: (是否签到成功, 依据)；超时为 (None, "超时")
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            res = confirm(read())
+        except Exception:
+            # 页面跳转 / 重新渲染期间执行脚本可能失败，下一轮再读
+            res = None
+        if res:
+            return res
+        if time.monotonic() >= deadline:
+            return None, "超时"
+        time.sleep(interval)
+
+
+def poll_dom(probe: Callable[[], bool], timeout: float = CHECKIN_DOM_FALLBACK, interval: float = 1.0) -> bool:
+    """回退：每次重新查询按钮状态（probe），timeout 秒内变为已签到则返回 True。"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if probe():
+                return True
+        except Exception:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
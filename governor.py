@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+全局请求调度器（两套实现共用，仅依赖标准库）
+
+所有发往站点的流量（curl_cffi 请求、浏览器导航）都先在这里取令牌：
+- 每个 host 一个令牌桶，每个账号一个令牌桶，两者都满足才放行
+- 使用代理时 host 令牌桶按 出口（代理）× host 区分：不同出口的账号互不占用同一个 host 配额
+- 遇到 429 / Retry-After 时自适应降速，之后随成功请求逐步恢复
+- 记录排队等待时间，运行结束时可输出统计
+"""
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# ------------------ 基础配置 ------------------
+RATE_HOST_PER_MIN = float(os.environ.get("RATE_HOST_PER_MIN", "40"))
+RATE_HOST_BURST = int(os.environ.get("RATE_HOST_BURST", "6"))
+RATE_ACCOUNT_PER_MIN = float(os.environ.get("RATE_ACCOUNT_PER_MIN", "20"))
+RATE_ACCOUNT_BURST = int(os.environ.get("RATE_ACCOUNT_BURST", "4"))
+
+# 降速下限（相对于基础速率）与每次成功后的恢复系数
+MIN_RATE_FACTOR = 0.1
+RECOVER_FACTOR = 1.1
+# 429 未给出 Retry-After 时的默认冷却秒数
+DEFAULT_COOLDOWN = 30.0
+# ----------------------------------------------------
+
+_current_account: contextvars.ContextVar = contextvars.ContextVar("governor_account", default=None)
+_current_egress: contextvars.ContextVar = contextvars.ContextVar("governor_egress", default=None)
+
+
+def _host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """解析 Retry-After：秒数或 HTTP 日期，返回需等待的秒数。"""
+    if value is None or value == "":
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """线程安全的令牌桶；reserve() 预占一个令牌并返回需等待的秒数。"""
+
+    def __init__(self, per_min: float, burst: int) -> None:
+        self.base_rate = max(per_min, 0.001) / 60.0
+        self.rate = self.base_rate
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1.0
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.blocked_until - now)
+
+    def penalize(self, cooldown: float) -> None:
+        """被限流：速率减半（不低于下限），并在 cooldown 内暂停放行。"""
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.base_rate * MIN_RATE_FACTOR, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.blocked_until = max(self.blocked_until, now + cooldown)
+
+    def reward(self) -> None:
+        with self.lock:
+            if self.rate < self.base_rate:
+                self._refill(time.monotonic())
+                self.rate = min(self.base_rate, self.rate * RECOVER_FACTOR)
+
+
+class RequestGovernor:
+    """按 host + 账号双令牌桶放行请求，并统计排队等待时间。"""
+
+    def __init__(
+        self,
+        host_per_min: float = RATE_HOST_PER_MIN,
+        host_burst: int = RATE_HOST_BURST,
+        account_per_min: float = RATE_ACCOUNT_PER_MIN,
+        account_burst: int = RATE_ACCOUNT_BURST,
+    ) -> None:
+        self.host_conf = (host_per_min, host_burst)
+        self.account_conf = (account_per_min, account_burst)
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+        self._account_bytes: Dict[str, int] = {}
+        # 单独配置过限速的 host（多站点时每个站点可以不同）
+        self._host_overrides: Dict[str, Tuple[float, int]] = {}
+
+    def set_host_rate(self, host: str, per_min: Optional[float] = None, burst: Optional[int] = None) -> None:
+        """覆盖某个 host 的速率；未给出的参数沿用全局默认。"""
+        conf = (per_min or self.host_conf[0], burst or self.host_conf[1])
+        with self._lock:
+            self._host_overrides[host] = conf
+            for key in [k for k in self._buckets if k[0] == "host" and k[1].split("@", 1)[0] == host]:
+                self._buckets.pop(key, None)
+
+    def _bucket(self, kind: str, key: str) -> TokenBucket:
+        with self._lock:
+            b = self._buckets.get((kind, key))
+            if b is None:
+                if kind == "host":
+                    per_min, burst = self._host_overrides.get(key.split("@", 1)[0], self.host_conf)
+                else:
+                    per_min, burst = self.account_conf
+                b = self._buckets[(kind, key)] = TokenBucket(per_min, burst)
+            return b
+
+    def _stat(self, host: str) -> dict:
+        return self._stats.setdefault(host, {"requests": 0, "throttled": 0, "wait_total": 0.0, "wait_max": 0.0})
+
+    def _buckets_for(self, url: str, account: Optional[str], egress: Optional[str] = None):
+        egress = egress if egress is not None else _current_egress.get()
+        host = _host_of(url)
+        buckets = [self._bucket("host", f"{host}@{egress}" if egress else host)]
+        account = account if account is not None else _current_account.get()
+        if account:
+            buckets.append(self._bucket("account", account))
+        return buckets
+
+    @contextmanager
+    def bind_account(self, account: Optional[str]):
+        """在当前上下文内把请求归到指定账号的令牌桶。"""
+        token = _current_account.set(account)
+        try:
+            yield
+        finally:
+            _current_account.reset(token)
+
+    @contextmanager
+    def bind_egress(self, egress: Optional[str]):
+        """在当前上下文内把请求归到指定出口（代理）的 host 令牌桶；None 表示直连。"""
+        token = _current_egress.set(egress)
+        try:
+            yield
+        finally:
+            _current_egress.reset(token)
+
+    def acquire(self, url: str, account: Optional[str] = None, egress: Optional[str] = None) -> float:
+        """阻塞直到允许访问 url，返回实际排队的秒数。"""
+        wait = max(b.reserve() for b in self._buckets_for(url, account, egress))
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            s = self._stat(_host_of(url))
+            s["requests"] += 1
+            s["wait_total"] += wait
+            s["wait_max"] = max(s["wait_max"], wait)
+        return wait
+
+    def feedback(self, url: str, status: Optional[int], retry_after=None, account: Optional[str] = None,
+                 nbytes: int = 0, egress: Optional[str] = None) -> None:
+        """根据响应状态调整速率：429/503 降速，其他成功响应逐步恢复；nbytes 计入账号流量。"""
+        buckets = self._buckets_for(url, account, egress)
+        account = account if account is not None else _current_account.get()
+        if nbytes and account:
+            with self._lock:
+                self._account_bytes[account] = self._account_bytes.get(account, 0) + nbytes
+        if status in (429, 503):
+            cooldown = parse_retry_after(retry_after)
+            cooldown = DEFAULT_COOLDOWN if cooldown is None else cooldown
+            for b in buckets:
+                b.penalize(cooldown)
+            with self._lock:
+                self._stat(_host_of(url))["throttled"] += 1
+        elif status is not None and status < 400:
+            for b in buckets:
+                b.reward()
+
+    def account_bytes(self, account: str) -> int:
+        """该账号经由 governor 的 HTTP 响应字节数。"""
+        with self._lock:
+            return self._account_bytes.get(account, 0)
+
+    def stats(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for host, s in self._stats.items():
+                out[host] = dict(s, wait_avg=(s["wait_total"] / s["requests"]) if s["requests"] else 0.0)
+            return out
+
+    def summary(self) -> str:
+        parts = []
+        for host, s in self.stats().items():
+            parts.append(
+                f"{host}: {s['requests']} 次, 限流 {s['throttled']} 次, "
+                f"排队合计 {s['wait_total']:.1f}s / 平均 {s['wait_avg']:.2f}s / 最长 {s['wait_max']:.1f}s"
+            )
+        return "; ".join(parts) or "无请求"
+
+
+_GOVERNOR: Optional[RequestGovernor] = None
+_GOVERNOR_LOCK = threading.Lock()
+
+
+def get_governor() -> RequestGovernor:
+    """进程级单例。"""
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = RequestGovernor()
+        return _GOVERNOR
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Chromium 启动配置缓存（仅依赖标准库）
+
+第一次启动时依次探测 二进制 × 无头模式 × 参数组合，记下第一个能启动的组合；
+之后的运行直接复用，不再为不可用的组合白等一次启动超时。
+缓存按二进制版本（chrome --version）区分，Chrome 升级或换了路径后自动失效重新探测。
+
+只签到、不浏览的任务用轻量配置（lite）：优先 chrome-headless-shell，小窗口，
+关闭后台网络、组件更新、同步等与页面无关的服务；完整配置（full）保持原样。
+"""
+import os
+import glob
+import time
+import shutil
+import subprocess
+from typing import Iterable, List, Optional
+
+from checkin_state import file_lock, load_json, save_json, DATA_DIR
+
+# ------------------ 基础配置 ------------------
+LAUNCH_PROFILE_FILE = os.environ.get("LAUNCH_PROFILE_FILE") or os.path.join(DATA_DIR, "launch_profile.json")
+# 浏览器启动配置：auto（需要浏览时 full，只签到时 lite）/ full / lite
+BROWSER_PROFILE = os.environ.get("BROWSER_PROFILE", "auto").strip().lower()
+# chrome-headless-shell 路径，默认在 PATH 与常见安装位置中查找
+HEADLESS_SHELL_PATH = os.environ.get("HEADLESS_SHELL_PATH", "")
+# ----------------------------------------------------
+
+PROFILES = ("full", "lite")
+
+# lite 配置：小视口 + 关闭与签到无关的后台服务
+LITE_WINDOW = "800,600"
+LITE_ARGS = (
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--disable-domain-reliability",
+    "--disable-client-side-phishing-detection",
+    "--disable-breakpad",
+    "--metrics-recording-only",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--no-pings",
+)
+LITE_DISABLE_FEATURES = (
+    "Translate",
+    "OptimizationHints",
+    "MediaRouter",
+    "AutofillServerCommunication",
+    "CertificateTransparencyComponentUpdater",
+)
+
+_HEADLESS_SHELL_GLOBS = [
+    "/opt/chrome-headless-shell*/chrome-headless-shell",
+    "/opt/google/chrome-headless-shell/chrome-headless-shell",
+    # npx @puppeteer/browsers install chrome-headless-shell
+    os.path.expanduser("~/.cache/puppeteer/chrome-headless-shell/*/chrome-headless-shell-*/chrome-headless-shell"),
+    os.path.expanduser("~/chrome-headless-shell/*/chrome-headless-shell-*/chrome-headless-shell"),
+]
+
+_CANDIDATE_PATHS = [
+    "/usr/bin/chromium",
+    "/usr/bin/chromium-browser",
+    "/usr/bin/google-chrome",
+    "/opt/google/chrome/chrome",
+]
+
+
+def chrome_candidates() -> List[str]:
+    """存在的 Chromium/Chrome 二进制；设置了 CHROME_PATH 时只用它。"""
+    env_path = os.environ.get("CHROME_PATH")
+    if env_path and os.path.exists(env_path):
+        return [env_path]
+    return [p for p in _CANDIDATE_PATHS if os.path.exists(p)]
+
+
+def headless_shell_candidates() -> List[str]:
+    """存在的 chrome-headless-shell；设置了 HEADLESS_SHELL_PATH 时只用它。"""
+    if HEADLESS_SHELL_PATH:
+        return [HEADLESS_SHELL_PATH] if os.path.exists(HEADLESS_SHELL_PATH) else []
+    found = [shutil.which("chrome-headless-shell") or ""]
+    for pattern in _HEADLESS_SHELL_GLOBS:
+        # 多个版本时新的在前
+        found += sorted(glob.glob(pattern), reverse=True)
+    return list(dict.fromkeys(p for p in found if p and os.access(p, os.X_OK)))
+
+
+def pick_profile(tasks: Iterable[str], profile: str = BROWSER_PROFILE) -> str:
+    """
+    按浏览器要执行的任务选择启动配置：显式指定 full / lite 时照办，
+    auto 时只有要浏览才用 full（浏览需要完整的桌面渲染与视口）。
+    """
+    if profile in PROFILES:
+        return profile
+    return "full" if "browse" in tasks else "lite"
+
+
+def _fingerprint(binary: Optional[str]) -> str:
+    """文件大小 + 修改时间：不用启动子进程就能发现二进制被替换。"""
+    if not binary:
+        return ""
+    try:
+        st = os.stat(os.path.realpath(binary))
+        return f"{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return ""
+
+
+def binary_version(binary: Optional[str]) -> str:
+    """`chrome --version` 的输出；拿不到（如 Windows 下的 chrome.exe）时为空串。"""
+    if not binary:
+        return ""
+    try:
+        out = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=10)
+        return (out.stdout or "").strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class LaunchProfileCache:
+    """模式（headless / headed）-> {binary, version, fingerprint, variant, args}，JSON 持久化。"""
+
+    def __init__(self, path: str = LAUNCH_PROFILE_FILE) -> None:
+        self.path = path
+
+    def lookup(self, mode: str, candidates: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        返回当前仍然有效的启动配置；二进制不在候选中或版本变化时返回 None。
+        :param candidates: 可用的二进制，默认 chrome_candidates()
+        """
+        prof = load_json(self.path).get(mode)
+        if not prof:
+            return None
+        binary = prof.get("binary") or None
+        cands = chrome_candidates() if candidates is None else candidates
+        if (binary or cands) and binary not in cands:
+            return None
+        fp = _fingerprint(binary)
+        if fp == prof.get("fingerprint", ""):
+            return prof
+        # 文件变了：再确认一次版本号，只有版本真的变了才重新探测
+        version = binary_version(binary)
+        if not version or version != prof.get("version"):
+            return None
+        self._update(mode, dict(prof, fingerprint=fp))
+        return prof
+
+    def save(self, mode: str, binary: Optional[str], variant: str, args) -> None:
+        self._update(mode, {
+            "binary": binary or "",
+            "version": binary_version(binary),
+            "fingerprint": _fingerprint(binary),
+            "variant": variant,
+            "args": list(args),
+            "ts": int(time.time()),
+        })
+
+    def invalidate(self, mode: str) -> None:
+        self._update(mode, None)
+
+    def _update(self, mode: str, prof: Optional[dict]) -> None:
+        try:
+            with file_lock(self.path):
+                data = load_json(self.path)
+                if prof is None:
+                    data.pop(mode, None)
+                else:
+                    data[mode] = prof
+                save_json(self.path, data)
+        except OSError:
+            # 缓存写不了只是下次重新探测
+            pass
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+导航规划（两套实现共用，仅依赖标准库）
+
+每个步骤声明自己需要的页面（URL，或"当前页面已具备某状态"的判断），
+只有当前页面不满足时才真正导航；同时统计本次运行的导航 / 跳过次数。
+"""
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+
+def _norm(url: str) -> str:
+    """忽略协议大小写、末尾斜杠和 #fragment。"""
+    parts = urlsplit((url or "").strip())
+    path = parts.path.rstrip("/") or "/"
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{path}{query}"
+
+
+def same_page(a: str, b: str) -> bool:
+    return _norm(a) == _norm(b)
+
+
+def same_site(a: str, b: str) -> bool:
+    return urlsplit(a or "").netloc.lower() == urlsplit(b or "").netloc.lower()
+
+
+def any_page(_page) -> bool:
+    """ready 判断：同站点任意页面即可（例如只需要顶部导航栏 / 当前用户菜单）。"""
+    return True
+
+
+class NavPlanner:
+    """
+    navigate(page, url)：真正的导航（含限速）；current_url(page)：读取页面当前 URL。
+    page 可以是标签页对象，也可以是 WebDriver（多窗口时取当前窗口）。
+    """
+
+    def __init__(self, navigate: Callable, current_url: Callable) -> None:
+        self._navigate = navigate
+        self._current_url = current_url
+        self.navigations = 0
+        self.skipped = 0
+        self.by_url: Dict[str, int] = {}
+
+    def current(self, page) -> str:
+        try:
+            return self._current_url(page) or ""
+        except Exception:
+            return ""
+
+    def ensure(self, page, url: str, ready: Optional[Callable] = None, fresh: bool = False) -> bool:
+        """
+        保证 page 处于该步骤需要的状态：
+        - fresh=True：必须重新加载（如确认服务端已持久化）
+        - ready(page) 为真且在同一站点：当前页面已满足，不导航
+        - 已经在 url：不导航
+        :return: 是否真的发生了导航
+        """
+        if not fresh:
+            cur = self.current(page)
+            if cur and (same_page(cur, url) or (ready is not None and same_site(cur, url) and self._ready(ready, page))):
+                self.skipped += 1
+                return False
+        self._navigate(page, url)
+        self.navigations += 1
+        key = _norm(url)
+        self.by_url[key] = self.by_url.get(key, 0) + 1
+        return True
+
+    @staticmethod
+    def _ready(ready: Callable, page) -> bool:
+        try:
+            return bool(ready(page))
+        except Exception:
+            return False
+
+    def summary(self) -> str:
+        top = sorted(self.by_url.items(), key=lambda kv: -kv[1])[:3]
+        detail = ", ".join(f"{u} x{n}" for u, n in top)
+        return f"导航 {self.navigations} 次，跳过 {self.skipped} 次" + (f"（{detail}）" if detail else "")
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+逐次导航的页面加载追踪（两套实现共用，仅依赖标准库）
+
+NAV_TRACE=true 时，每次浏览器导航（page.get / driver.get，包括主题标签页）结束后采集：
+- Navigation Timing：DNS / 建连 / TLS / 服务端响应 / TTFB / DOMContentLoaded / load
+- Resource Timing：按资源类型（script / css / img / xmlhttprequest ...）汇总的请求数与传输字节
+- CDP Performance.getMetrics：JS 执行 / 主线程任务 / 布局耗时、JS 堆大小、DOM 节点数
+与 get() 本身的墙钟耗时一起记入运行历史（run_history.py 报表中的"页面加载"部分）。
+
+跨域资源没有 Timing-Allow-Origin 时浏览器报告的 transferSize 为 0，字节数偏低。
+"""
+import os
+from typing import Dict, List, Optional
+
+from run_history import percentile
+
+# ------------------ 基础配置 ------------------
+NAV_TRACE = os.environ.get("NAV_TRACE", "false").strip().lower() in ["true", "1", "on"]
+# ----------------------------------------------------
+
+# DrissionPage run_js / Selenium execute_script 通用
+NAV_TIMING_JS = """
+const nav = performance.getEntriesByType('navigation')[0] || {};
+const sec = (a, b) => (nav[b] > 0 && nav[b] >= (nav[a] || 0)) ? (nav[b] - (nav[a] || 0)) / 1000 : null;
+const resources = {};
+for (const r of performance.getEntriesByType('resource')) {
+    const type = r.initiatorType || 'other';
+    const e = resources[type] || (resources[type] = {count: 0, bytes: 0});
+    e.count += 1;
+    e.bytes += r.transferSize || 0;
+}
+const mem = performance.memory || {};
+return {
+    dns: sec('domainLookupStart', 'domainLookupEnd'),
+    connect: sec('connectStart', 'connectEnd'),
+    tls: nav.secureConnectionStart > 0 ? sec('secureConnectionStart', 'connectEnd') : null,
+    server: sec('requestStart', 'responseStart'),
+    ttfb: sec('startTime', 'responseStart'),
+    dcl: sec('startTime', 'domContentLoadedEventEnd'),
+    load: sec('startTime', 'loadEventEnd'),
+    doc_bytes: nav.transferSize || 0,
+    resources: resources,
+    heap: mem.usedJSHeapSize || null,
+};
+"""
+
+# CDP Performance.getMetrics 中保留的指标 -> 记录字段
+_CDP_METRICS = {
+    "ScriptDuration": "script_s",
+    "TaskDuration": "task_s",
+    "LayoutDuration": "layout_s",
+    "JSHeapUsedSize": "heap",
+    "Nodes": "nodes",
+}
+
+
+def nav_kind(url: str) -> str:
+    """主题页（/t/...）单独统计，其余都算普通页面。"""
+    return "topic" if "/t/" in (url or "") else "page"
+
+
+def build_trace(url: str, wall: float, timing: Optional[dict], metrics: Optional[dict]) -> dict:
+    """合并 Navigation Timing 与 CDP 指标为一条记录；heap 统一换算为 MB。"""
+    timing = timing or {}
+    trace = {
+        "url": url,
+        "kind": nav_kind(url),
+        "wall": wall,
+        "dns": timing.get("dns"),
+        "connect": timing.get("connect"),
+        "tls": timing.get("tls"),
+        "server": timing.get("server"),
+        "ttfb": timing.get("ttfb"),
+        "dcl": timing.get("dcl"),
+        "load": timing.get("load"),
+        "resources": timing.get("resources") or {},
+        "heap": timing.get("heap"),
+    }
+    for item in (metrics or {}).get("metrics", []):
+        field = _CDP_METRICS.get(item.get("name"))
+        if field:
+            trace[field] = item.get("value")
+    trace["bytes"] = (timing.get("doc_bytes") or 0) + sum(r.get("bytes", 0) for r in trace["resources"].values())
+    if trace["heap"]:
+        trace["heap"] = trace["heap"] / 1024 / 1024
+    return trace
+
+
+class NavTracer:
+    """收集一个浏览器的导航追踪记录。"""
+
+    def __init__(self, enabled: bool = NAV_TRACE) -> None:
+        self.enabled = enabled
+        self.traces: List[dict] = []
+
+    def record(self, url: str, wall: float, timing: Optional[dict], metrics: Optional[dict]) -> dict:
+        trace = build_trace(url, wall, timing, metrics)
+        self.traces.append(trace)
+        return trace
+
+    @staticmethod
+    def describe(trace: dict) -> str:
+        def s(v):
+            return "-" if v is None else f"{v:.2f}s"
+        return (f"{trace['kind']} get {trace['wall']:.2f}s | dns {s(trace['dns'])} tls {s(trace['tls'])} "
+                f"server {s(trace['server'])} ttfb {s(trace['ttfb'])} dcl {s(trace['dcl'])} load {s(trace['load'])} | "
+                f"{trace['bytes'] / 1024:.0f}KB heap {trace['heap'] or 0:.0f}MB | {trace['url']}")
+
+    def summary(self) -> str:
+        if not self.traces:
+            return "无导航记录"
+        walls = [t["wall"] for t in self.traces]
+        ttfbs = [t["ttfb"] for t in self.traces if t["ttfb"] is not None]
+        loads = [t["load"] for t in self.traces if t["load"] is not None]
+        by_type: Dict[str, int] = {}
+        for t in self.traces:
+            for rtype, r in t["resources"].items():
+                by_type[rtype] = by_type.get(rtype, 0) + r.get("bytes", 0)
+        total = sum(t["bytes"] for t in self.traces)
+        res_total = sum(by_type.values()) or 1
+        top = sorted(by_type.items(), key=lambda kv: -kv[1])[:3]
+        mix = ", ".join(f"{k} {v / res_total:.0%}" for k, v in top)
+        return (f"{len(self.traces)} 次导航：get p50 {percentile(walls, 50):.1f}s / p95 {percentile(walls, 95):.1f}s，"
+                f"TTFB p50 {percentile(ttfbs, 50):.2f}s，load p50 {percentile(loads, 50):.1f}s，"
+                f"共 {total / 1024 / 1024:.1f}MB" + (f"（{mix}）" if mix else ""))
@@ -2,9 +2,13 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+import sys
 import time
 import random
-from typing import Optional
+import threading
+import subprocess
+import importlib.util
+from typing import Callable, Optional
 
 from loguru import logger
 from curl_cffi import requests
@@ -14,6 +18,25 @@ from DrissionPage.errors import BrowserConnectError
 from tabulate import tabulate
 
 from utils import retry
+from governor import get_governor
+from checkin_state import CheckinState, DATA_DIR, account_key, site_today, load_json, save_json
+from scroll_driver import DRISSION_SCROLL_JS, plan_timeout
+from browse_planner import BrowsePlanner, TOPIC_LIST_JS, account_budget, run_deadline
+from cassette import get_cassette
+from artifacts import ArtifactCollector, CONSOLE_HOOK_JS
+from backends import Backend, BackendSelector, CHECKIN_ENDPOINT, available_backends, close_all
+from run_history import RunRecorder
+from launch_profile import (LaunchProfileCache, LITE_ARGS, LITE_DISABLE_FEATURES, LITE_WINDOW, chrome_candidates,
+                            headless_shell_candidates, pick_profile)
+from nav_planner import NavPlanner, any_page
+from nav_trace import NavTracer, NAV_TIMING_JS
+from supervisor import (ACCOUNT_TIMEOUT, ISOLATE_ACCOUNTS, PHASE_TIMEOUTS, ProcessTree, Watchdog, parse_phase_timeouts,
+                        run_supervised)
+import reaper
+from proxy_pool import PROXY_ERROR_STATUS, browser_proxy, get_proxy_pool, proxy_key, requests_proxies
+from account_source import ACCOUNTS_SOURCE, open_source
+from profiling import PROFILE, PhaseProfiler, run_id
+from checkin_watch import STATE_JS, WATCH_JS, confirm_http, poll_dom, wait_confirmed, watch_args
 
 # ------------------ 基础配置 ------------------
 BASE_URL = os.environ.get("NODELOC_BASE_URL", "https://www.nodeloc.com").rstrip("/")
@@ -49,23 +72,6 @@ TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID")
 # ----------------------------------------------------
 
 
-def _detect_chrome_path() -> Optional[str]:
-    """在常见路径中寻找 Chromium/Chrome 二进制；优先用 CHROME_PATH。"""
-    env_path = os.environ.get("CHROME_PATH")
-    if env_path and os.path.exists(env_path):
-        return env_path
-    candidates = [
-        "/usr/bin/chromium",
-        "/usr/bin/chromium-browser",
-        "/usr/bin/google-chrome",
-        "/opt/google/chrome/chrome",
-    ]
-    for p in candidates:
-        if os.path.exists(p):
-            return p
-    return None
-
-
 def _split_host(base_url: str) -> str:
     """从 URL 中提取 host（可能带 www.）"""
     return base_url.split("://", 1)[-1].split("/", 1)[0]
@@ -76,20 +82,24 @@ def _root_domain(host: str) -> str:
     return host[4:] if host.startswith("www.") else host
 
 
-def _make_chromium(headless: bool, headless_variant: str = "new") -> Chromium:
+def _make_chromium(headless: bool, headless_variant: str = "new",
+                   chrome_path: Optional[str] = None, extra_args=(), proxy: Optional[str] = None,
+                   lite: bool = False) -> Chromium:
     """
     创建稳定的 Chromium：
     - auto_port(True)：避免固定 9222 端口冲突与用户目录冲突
     - 容器友好参数：--no-sandbox / --disable-dev-shm-usage / --disable-gpu 等
-    - headless_variant: "new" 或 "old"
+    - headless_variant: "new" / "old"，chrome-headless-shell 为 "shell"
+    - chrome_path / extra_args：由启动配置探测决定（None 表示交给 DrissionPage 自己找）
+    - proxy：--proxy-server 地址（proxy_pool.browser_proxy 的结果），None 表示直连
+    - lite：只签到时的轻量配置（小视口，关闭后台网络 / 组件更新 / 同步等服务）
     """
     co = ChromiumOptions(read_file=False)
 
     # 自动分配端口 + 独立临时用户目录
     co.auto_port(True)
 
-    # 指定浏览器路径（优先环境变量）
-    chrome_path = _detect_chrome_path()
+    # 指定浏览器路径
     if chrome_path:
         co.set_browser_path(chrome_path)
 
@@ -100,8 +110,8 @@ def _make_chromium(headless: bool, headless_variant: str = "new") -> Chromium:
     co.set_argument("--disable-software-rasterizer")
     co.set_argument("--disable-extensions")
     co.set_argument("--mute-audio")
-    co.set_argument("--window-size", "1920,1080")
-    co.set_tmp_path("/tmp/DrissionPage")
+    co.set_argument("--window-size", LITE_WINDOW if lite else "1920,1080")
+    co.set_tmp_path(reaper.BROWSER_TMP_DIR)
     co.incognito(True)
     co.set_timeouts(page_load=30)
 
@@ -111,48 +121,591 @@ def _make_chromium(headless: bool, headless_variant: str = "new") -> Chromium:
             co.set_argument("--headless", "new")
         elif headless_variant == "old":
             co.set_argument("--headless", "old")
+        elif headless_variant == "shell":
+            # chrome-headless-shell 本身就是无头的，不区分 new/old
+            co.set_argument("--headless")
         else:
             co.set_argument("--headless", "new")
 
     # 桌面渲染/反自动化检测的原有参数（保留你的设置）
     co.set_argument("--disable-blink-features=AutomationControlled")
-    co.set_argument("--disable-features=IsolateOrigins,site-per-process")
+    features = ["IsolateOrigins", "site-per-process"]
+    if lite:
+        # --disable-features 只认最后一个，合并成一个参数
+        features += LITE_DISABLE_FEATURES
+        for arg in LITE_ARGS:
+            co.set_argument(arg)
+    co.set_argument("--disable-features", ",".join(features))
+    for arg in extra_args:
+        co.set_argument(arg)
+    if proxy:
+        co.set_proxy(proxy)
 
     return Chromium(co)
 
 
+# 探测时依次尝试的附加参数组合（最后一组用于限制较多的容器）
+_LAUNCH_ARGSETS = [(), ("--no-zygote", "--single-process")]
+
+
+def _shell_candidates(lite: bool) -> list:
+    """lite 且无头时可用的 chrome-headless-shell（启动更快、占用更少），优先于完整 Chromium。"""
+    return headless_shell_candidates() if lite and HEADLESS else []
+
+
+def _launch_candidates(lite: bool = False):
+    """(二进制, 无头模式, 附加参数) 的探测顺序。"""
+    shells = _shell_candidates(lite)
+    binaries = chrome_candidates() or [None]
+    if not HEADLESS:
+        variants = [""]
+    elif HEADLESS_VARIANT in ("", "new", "auto"):
+        # 少量环境/版本对 old 更友好
+        variants = ["new", "old"]
+    else:
+        variants = [HEADLESS_VARIANT]
+    for args in _LAUNCH_ARGSETS:
+        for binary in shells:
+            yield binary, "shell", args
+        for binary in binaries:
+            for variant in variants:
+                yield binary, variant, args
+
+
+def _launch_chromium(proxy: Optional[str] = None, lite: bool = False):
+    """
+    按缓存的启动配置启动 Chromium；没有缓存（首次运行 / Chrome 升级 / 缓存的配置启动失败）时
+    依次探测 二进制 × 无头模式 × 参数组合，第一个能启动的组合写入缓存供以后复用。
+    lite 与 full 分开缓存（lite 可能用的是 chrome-headless-shell）。
+    :return: (Chromium, 使用的二进制；空串表示 DrissionPage 自己找的浏览器)
+    """
+    cache = LaunchProfileCache()
+    mode = ("headless" if HEADLESS else "headed") + ("-lite" if lite else "")
+    prof = cache.lookup(mode, _shell_candidates(lite) + chrome_candidates())
+    variant = prof.get("variant") if prof else ""
+    if prof and (not HEADLESS or variant == "shell" or HEADLESS_VARIANT in ("", "new", "auto", variant)):
+        try:
+            binary = prof.get("binary") or None
+            browser = _make_chromium(HEADLESS, variant or "new", binary, prof.get("args") or (), proxy, lite)
+            return browser, binary or ""
+        except BrowserConnectError as e:
+            logger.warning(f"[launch] 缓存的启动配置不可用（{e}），重新探测")
+            cache.invalidate(mode)
+
+    last_err: Optional[Exception] = None
+    for binary, variant, args in _launch_candidates(lite):
+        try:
+            browser = _make_chromium(HEADLESS, variant or "new", binary, args, proxy, lite)
+        except BrowserConnectError as e:
+            logger.debug(f"[launch] {binary or '默认浏览器'} headless={variant or '-'} {list(args)} 启动失败：{e}")
+            last_err = e
+            continue
+        cache.save(mode, binary, variant, args)
+        logger.info(f"[launch] 可用启动配置：{binary or '默认浏览器'} headless={variant or '-'} {list(args)}"
+                    f"{'（lite）' if lite else ''}（已缓存）")
+        return browser, binary or ""
+    raise last_err
+
+
+def _quit_chromium(browser: Chromium) -> None:
+    """关闭浏览器；quit() 失败或没退干净时由 reaper 结束残留进程。"""
+    pid = getattr(browser, "process_id", None)
+    try:
+        browser.quit()
+    except Exception as e:
+        logger.warning(f"[reaper] 浏览器关闭失败：{e}")
+    killed = reaper.release(pid)
+    if killed:
+        logger.warning(f"[reaper] 浏览器未正常退出，已结束残留进程 {killed} 个")
+
+
+class _BrowserBoot:
+    """
+    后台启动 Chromium（与 HTTP 登录并行），第一次真正用到浏览器时才等待；用不到时可取消。
+    proxy 为账号的出口代理，启动时转换为 --proxy-server 地址；浏览器用不了该代理时
+    result() 抛出 BrowserProxyError，不直连。
+    """
+
+    def __init__(self, proxy: Optional[str] = None, profile: str = "full",
+                 watch: Optional[Callable[[int], None]] = None) -> None:
+        self.proxy = proxy
+        # 启动后把浏览器 pid 登记给进程内看门狗（supervisor.Watchdog.watch），超限时被结束
+        self.watch = watch
+        # 启动配置（launch_profile.pick_profile）；与启动耗时、关闭前内存一起记入运行历史
+        self.profile = profile
+        self.binary = ""
+        self.launched = False
+        self.rss_mb: Optional[float] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._cancelled = False
+        self.browser: Optional[Chromium] = None
+        self.page = None
+        self.error: Optional[BaseException] = None
+        self.elapsed = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None and not self._cancelled:
+                self._thread = threading.Thread(target=self._launch, name="chromium-boot", daemon=True)
+                self._thread.start()
+
+    def _launch(self) -> None:
+        t0 = time.monotonic()
+        try:
+            browser, self.binary = _launch_chromium(browser_proxy(self.proxy), lite=self.profile == "lite")
+            self.launched = True
+            # 登记进程与用户目录：本次没关干净时，下次启动 / 退出时回收
+            reaper.register(getattr(browser, "process_id", None), getattr(browser, "user_data_path", "") or "", "drission")
+            if self.watch:
+                self.watch(getattr(browser, "process_id", None))
+            page = browser.new_tab()
+            # console 缓冲钩子，失败时随调试产物一起导出
+            try:
+                page.run_cdp("Page.addScriptToEvaluateOnNewDocument", source=CONSOLE_HOOK_JS)
+            except Exception:
+                pass
+            with self._lock:
+                if not self._cancelled:
+                    self.browser, self.page = browser, page
+                    browser = None
+            if browser is not None:
+                # 启动期间已被取消：直接关掉
+                _quit_chromium(browser)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.elapsed = time.monotonic() - t0
+            self._done.set()
+
+    def result(self):
+        """等待启动完成，返回 (browser, page)；启动失败时抛出原异常。"""
+        self.start()
+        t0 = time.monotonic()
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        if self.browser is None:
+            raise RuntimeError("浏览器已关闭")
+        waited = time.monotonic() - t0
+        logger.debug(f"[boot] Chromium 启动 {self.elapsed:.1f}s，其中等待 {waited:.1f}s（其余与 HTTP 登录重叠）")
+        return self.browser, self.page
+
+    def close(self, timeout: float = 30) -> None:
+        """取消未完成的启动；已启动则关闭页面与浏览器。"""
+        with self._lock:
+            self._cancelled = True
+            browser, page = self.browser, self.page
+            self.browser = self.page = None
+        if browser is None and self._thread is not None:
+            # 正在启动：等它结束，由启动线程自行关闭，避免遗留 Chromium 进程
+            self._thread.join(timeout)
+            return
+        if browser is not None:
+            # 关闭前整棵浏览器进程树的内存，用于对比 full / lite
+            pid = getattr(browser, "process_id", None)
+            self.rss_mb = ProcessTree(pid).rss_mb() if pid else None
+            logger.info(f"[launch] {self.profile} 配置：启动 {self.elapsed:.1f}s"
+                        f"{f'，关闭前内存 {self.rss_mb:.0f}MB' if self.rss_mb else ''}（{self.binary or '默认浏览器'}）")
+        try:
+            if page is not None:
+                page.close()
+        except Exception:
+            pass
+        if browser is not None:
+            _quit_chromium(browser)
+
+    def info(self) -> Optional[dict]:
+        """启动成功时的 {profile, binary, seconds, rss_mb}，否则为 None。"""
+        if not self.launched:
+            return None
+        return {"profile": self.profile, "binary": self.binary, "seconds": self.elapsed, "rss_mb": self.rss_mb}
+
+
+# 单次往返探测：登录标记 + 当前用户 + 第一个命中的签到按钮及其状态
+_PROBE_JS = """
+const sels = arguments[0] || [];
+const out = {current_user: false, logged_in: false, username: '', selector: '', cls: '', label: '', checked: false};
+out.current_user = !!document.querySelector('#current-user');
+const me = document.querySelector('#current-user a[data-user-card]');
+out.username = me ? (me.getAttribute('data-user-card') || '') : '';
+if (!out.username) {
+    try {
+        if (window.Discourse && Discourse.User && Discourse.User.currentProp) {
+            out.username = Discourse.User.currentProp('username') || '';
+        }
+    } catch (e) {}
+}
+out.logged_in = out.current_user || !!out.username
+    || !!document.querySelector('img.avatar, a[href*="/u/"]');
+for (const sel of sels) {
+    let el = null;
+    try { el = document.querySelector(sel); } catch (e) { continue; }
+    if (!el) continue;
+    out.selector = sel;
+    out.cls = (typeof el.className === 'string') ? el.className : (el.getAttribute('class') || '');
+    out.label = (el.getAttribute('title') || '') + ' ' + (el.getAttribute('aria-label') || '');
+    out.checked = out.cls.includes('checked-in') || out.label.includes('已签');
+    break;
+}
+return out;
+"""
+
+SELECTOR_CACHE_FILE = os.path.join(DATA_DIR, "selector_cache.json")
+
+
+def _load_winning_selector() -> str:
+    """上次命中的签到按钮选择器（按 BASE_URL 区分）。"""
+    return load_json(SELECTOR_CACHE_FILE).get(BASE_URL, "")
+
+
+def _save_winning_selector(sel: str) -> None:
+    if not sel or _load_winning_selector() == sel:
+        return
+    try:
+        data = load_json(SELECTOR_CACHE_FILE)
+        data[BASE_URL] = sel
+        save_json(SELECTOR_CACHE_FILE, data)
+    except OSError as e:
+        logger.debug(f"写入选择器缓存失败：{e}")
+
+
+def server_side_verify(session, base_url: str) -> str:
+    """服务端侧核验：抓 /u 与 /badges，确认登录用户与可访问性"""
+    try:
+        r1 = session.get(f"{base_url}/u", impersonate="chrome136", timeout=10)
+        hit_user = ""
+        if r1.status_code == 200:
+            m = re.search(r'data-user-card="([^"]+)"', r1.text or "")
+            hit_user = m.group(1) if m else ""
+        r2 = session.get(f"{base_url}/badges", impersonate="chrome136", timeout=10)
+        code2 = r2.status_code
+        return f"[server] user={hit_user or '未知'} /badges_code={code2}"
+    except Exception as e:
+        return f"[server] verify error: {e}"
+
+
+class GovernedSession(requests.Session):
+    """
+    所有请求先经过全局 governor 取令牌，并把 429/Retry-After 反馈回去。
+    配置 HTTP_CASSETTE 时可录制本次请求，或完全离线从卡带回放。
+    配置了代理池（PROXIES）时经账号固定的代理发出，代理出错自动换一个重试。
+    """
+
+    # 代理亲和用的账号标识；为空时直连
+    account = ""
+
+    def request(self, method, url, *args, **kwargs):
+        cassette = get_cassette()
+        if cassette and cassette.replaying:
+            resp = cassette.play(method, url, kwargs)
+            for name in resp.set_cookie_names:
+                self.cookies.set(name, "REDACTED", domain=f".{_root_domain(_split_host(url))}", path="/")
+            return resp
+
+        pool = get_proxy_pool()
+        if not pool.enabled or not self.account or "proxies" in kwargs:
+            return self._send(None, method, url, *args, **kwargs)
+        return pool.call(
+            self.account,
+            lambda proxy: self._send(proxy, method, url, *args, **kwargs),
+            is_proxy_error=lambda resp: resp.status_code in PROXY_ERROR_STATUS,
+        )
+
+    def _send(self, proxy, method, url, *args, **kwargs):
+        # 不同出口（代理）分别限速
+        egress = proxy_key(proxy) if proxy else None
+        if proxy:
+            kwargs["proxies"] = requests_proxies(proxy)
+        gov = get_governor()
+        gov.acquire(url, egress=egress)
+        resp = super().request(method, url, *args, **kwargs)
+        gov.feedback(url, resp.status_code, resp.headers.get("Retry-After"), nbytes=len(resp.content or b""),
+                     egress=egress)
+        cassette = get_cassette()
+        if cassette and cassette.recording:
+            cassette.record(method, url, {k: v for k, v in kwargs.items() if k != "proxies"}, resp)
+        return resp
+
+
+# ------------------ HTTP 侧公共逻辑（NodeLocBrowser 与 HTTP 后端共用） ------------------
+def new_session(account: str = "") -> GovernedSession:
+    """HTTP 会话（curl_cffi）；account 非空且配置了代理池时经该账号的代理发出"""
+    session = GovernedSession()
+    session.account = account
+    session.headers.update({
+        "User-Agent": (
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) "
+            "Chrome/118.0.0.0 Safari/537.36"
+        ),
+        "Accept": "application/json, text/javascript, */*; q=0.01",
+        "Accept-Language": "zh-CN,zh;q=0.9",
+    })
+    return session
+
+
+def parse_cookie_str(cookie_str: str) -> dict:
+    pairs = [kv.strip() for kv in (cookie_str or "").split(";") if "=" in kv]
+    return {kv.split("=", 1)[0].strip(): kv.split("=", 1)[1].strip() for kv in pairs}
+
+
+def set_session_cookies(session, cookie_dict: dict):
+    """写入 requests 会话 Cookie（主域 + 可能的 www 子域）"""
+    host = _split_host(BASE_URL)
+    root = _root_domain(host)
+    for k, v in cookie_dict.items():
+        # 主域
+        session.cookies.set(k, v, domain=f".{root}", path="/")
+        # 带 www 的子域（若当前使用 www）
+        if host.startswith("www."):
+            session.cookies.set(k, v, domain=f".www.{root}", path="/")
+
+
+def http_session_user(session) -> Optional[str]:
+    """
+    只用 HTTP 确认会话：返回当前用户名；服务端明确未登录（404 / current_user 为空）返回 ""；
+    网络异常、风控拦截等无法判断时返回 None（交给浏览器再确认）。
+    """
+    try:
+        r = session.get(f"{BASE_URL}/session/current.json", impersonate="chrome136", timeout=10)
+    except Exception:
+        return None
+    if r.status_code == 404:
+        return ""
+    if r.status_code != 200:
+        return None
+    try:
+        cu = r.json().get("current_user") or {}
+    except Exception:
+        return None
+    return cu.get("username") or cu.get("name") or ""
+
+
+def server_current_user(session) -> str:
+    """服务端获取当前登录用户名。优先 /session/current.json，降级 /u。"""
+    # 1) 标准接口（Discourse）
+    try:
+        r = session.get(f"{BASE_URL}/session/current.json", impersonate="chrome136", timeout=10)
+        if r.status_code == 200:
+            j = r.json()
+            cu = (j.get("current_user") or {})
+            name = cu.get("username") or cu.get("name") or ""
+            if name:
+                return name
+    except Exception:
+        pass
+
+    # 2) 降级：解析 /u 页面 data-user-card
+    try:
+        r1 = session.get(f"{BASE_URL}/u", impersonate="chrome136", timeout=10)
+        if r1.status_code == 200:
+            m = re.search(r'data-user-card="([^"]+)"', r1.text or "")
+            if m:
+                return m.group(1)
+    except Exception:
+        pass
+    return ""
+
+
+def _xhr_headers(session, referer: str) -> dict:
+    return {
+        "User-Agent": session.headers["User-Agent"],
+        "Accept": session.headers["Accept"],
+        "Accept-Language": session.headers["Accept-Language"],
+        "X-Requested-With": "XMLHttpRequest",
+        "Referer": referer,
+    }
+
+
+def _fetch_csrf(session, headers: dict) -> str:
+    resp_csrf = session.get(CSRF_URL, headers=headers, impersonate="chrome136")
+    try:
+        return resp_csrf.json().get("csrf") or ""
+    except (ValueError, AttributeError):
+        # 非 JSON（质询页 / 登录跳转）
+        logger.warning(f"[csrf] 响应不是 JSON（状态码 {resp_csrf.status_code}）")
+        return ""
+
+
+def http_password_login(session) -> bool:
+    """Discourse 登录流：先 GET /session/csrf 再 POST /session（只做 HTTP 部分）"""
+    headers = _xhr_headers(session, LOGIN_URL)
+    csrf = _fetch_csrf(session, headers)
+    if not csrf:
+        logger.error("未获取到 CSRF")
+        return False
+    logger.info(f"CSRF: {csrf[:10]}...")
+
+    headers.update({
+        "X-CSRF-Token": csrf,
+        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+        "Origin": BASE_URL,
+    })
+    data = {"login": USERNAME, "password": PASSWORD}
+    resp_login = session.post(SESSION_URL, data=data, headers=headers, impersonate="chrome136")
+    if resp_login.status_code != 200:
+        logger.error(f"登录失败，状态码: {resp_login.status_code}")
+        return False
+    j = resp_login.json()
+    if j.get("error"):
+        logger.error(f"登录失败: {j.get('error')}")
+        return False
+    return True
+
+
+def http_checkin(session) -> bool:
+    """纯 HTTP 签到：POST CHECKIN_ENDPOINT（需站点签到插件提供接口）"""
+    if not CHECKIN_ENDPOINT:
+        return False
+    headers = _xhr_headers(session, BASE_URL + "/")
+    csrf = _fetch_csrf(session, headers)
+    if not csrf:
+        return False
+    headers.update({"X-CSRF-Token": csrf, "Origin": BASE_URL})
+    url = CHECKIN_ENDPOINT if CHECKIN_ENDPOINT.startswith("http") else BASE_URL + CHECKIN_ENDPOINT
+    r = session.post(url, headers=headers, impersonate="chrome136", timeout=15)
+    # 只认签到接口的 JSON 结果；质询页 / 登录跳转页等无法确认时返回 False，交给浏览器后端
+    ok, reason = confirm_http(r.status_code, r.text)
+    if ok:
+        logger.info(f"[http-checkin] 签到确认：{reason}")
+    else:
+        logger.warning(f"[http-checkin] 签到{'失败' if ok is False else '未确认'}：{reason}")
+    return bool(ok)
+
+
+def send_notifications(ok: bool, did_checkin: bool, browsed: bool, note: str = ""):
+    status = ("✅ 登录成功" if ok else "❌ 登录失败")
+    if did_checkin:
+        status += " + 签到完成"
+    if browsed and BROWSE_ENABLED:
+        status += " + 浏览任务完成"
+    if note:
+        status += f"（{note}）"
+
+    # Gotify
+    if GOTIFY_URL and GOTIFY_TOKEN:
+        try:
+            r = requests.post(
+                f"{GOTIFY_URL}/message",
+                params={"token": GOTIFY_TOKEN},
+                json={"title": "NODELOC", "message": status, "priority": 1},
+                timeout=10,
+            )
+            r.raise_for_status()
+        except Exception:
+            pass
+
+    # Server酱³
+    if SC3_PUSH_KEY:
+        m = re.match(r"sct(\d+)t", SC3_PUSH_KEY, re.I)
+        if m:
+            uid = m.group(1)
+            url = f"https://{uid}.push.ft07.com/send/{SC3_PUSH_KEY}"
+            params = {"title": "NODELOC", "desp": status}
+            for _ in range(3):
+                try:
+                    r = requests.get(url, params=params, timeout=10)
+                    r.raise_for_status()
+                    break
+                except Exception:
+                    time.sleep(random.randint(120, 240))
+
+    # Telegram
+    if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
+        try:
+            tg_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+            params = {
+                "chat_id": TELEGRAM_CHAT_ID,
+                "text": f"NODELOC\n\n{status}",
+            }
+            requests.get(tg_url, params=params, timeout=10)
+        except Exception:
+            pass
+
+
+def print_basic_info(session):
+    try:
+        resp = session.get(f"{BASE_URL}/badges", impersonate="chrome136")
+        soup = BeautifulSoup(resp.text, "html.parser")
+        rows = soup.select("table tr")
+        info = []
+        for r in rows:
+            cols = [c.text.strip() for c in r.select("td")]
+            if len(cols) >= 2:
+                info.append(cols[:3])
+        if info:
+            print("------------- Badges / Info -------------")
+            print(tabulate(info, headers=["列1", "列2", "列3"], tablefmt="pretty"))
+    except Exception:
+        pass
+# ----------------------------------------------------
+
+
 class NodeLocBrowser:
-    def __init__(self) -> None:
+    def __init__(self, account: str = "default", profile: str = "full",
+                 watch: Optional[Callable[[int], None]] = None) -> None:
         logger.info(f"Using BASE_URL: {BASE_URL}")
+        self.account = account
+        # 调试产物：后台采集 + 压缩 + 总量上限，按 运行/账号 命名
+        self.artifacts = ArtifactCollector(account)
 
         # 登录账号格式提示
         if USERNAME and ("@" not in USERNAME):
             logger.warning(f"当前 NODELOC_USERNAME='{USERNAME}' 看起来不是邮箱。大多数站点推荐使用邮箱登录。")
 
         # HTTP 会话（curl_cffi）
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/118.0.0.0 Safari/537.36"
-            ),
-            "Accept": "application/json, text/javascript, */*; q=0.01",
-            "Accept-Language": "zh-CN,zh;q=0.9",
-        })
-
-        # ---------- 稳健启动 Chromium ----------
+        self.session = new_session(account)
+
+        # 浏览器与 HTTP 会话走同一个代理（未配置代理池时直连）
+        proxy = get_proxy_pool().for_account(account)
+        self.egress = proxy_key(proxy) if proxy else None
+        if proxy:
+            logger.info(f"[proxy] 出口代理：{proxy_key(proxy)}")
+
+        # Chromium 在 login() 中后台启动，与 HTTP 登录并行；第一次访问 self.browser / self.page 时才等待
+        self._boot = _BrowserBoot(proxy, profile, watch)
+        # 导航规划：当前页面已满足下一步的需要时不再重复加载
+        self.nav = NavPlanner(self._goto, lambda page: page.url)
+        # 逐次导航的页面加载追踪（NAV_TRACE）
+        self.tracer = NavTracer()
+
+    @property
+    def browser(self) -> Chromium:
+        return self._boot.result()[0]
+
+    @property
+    def page(self):
+        return self._boot.result()[1]
+
+    def _goto(self, page, url: str):
+        """浏览器导航同样受 governor 限速（按浏览器的出口）；NAV_TRACE 时记录页面加载指标。"""
+        get_governor().acquire(url, egress=self.egress)
+        if not self.tracer.enabled:
+            page.get(url)
+            return
         try:
-            variant = HEADLESS_VARIANT or "new"
-            self.browser = _make_chromium(HEADLESS, variant)
-        except BrowserConnectError:
-            if HEADLESS and (HEADLESS_VARIANT in ("", "new", "auto")):
-                # 少量环境/版本对 old 更友好，自动回退一次
-                self.browser = _make_chromium(True, "old")
-            else:
-                raise
-
-        self.page = self.browser.new_tab()
+            page.run_cdp("Performance.enable")
+        except Exception:
+            pass
+        t0 = time.monotonic()
+        page.get(url)
+        wall = time.monotonic() - t0
+        try:
+            timing = page.run_js(NAV_TIMING_JS)
+        except Exception:
+            timing = None
+        try:
+            metrics = page.run_cdp("Performance.getMetrics")
+        except Exception:
+            metrics = None
+        trace = self.tracer.record(url, wall, timing, metrics)
+        logger.debug(f"[trace] {NavTracer.describe(trace)}")
 
     # ------------------ Cookie/Login ------------------
     def set_cookies_to_both(self, cookie_dict: dict):
@@ -161,12 +714,7 @@ class NodeLocBrowser:
         root = _root_domain(host)
 
         # 写入 requests 会话 Cookie（主域 + 可能的 www 子域）
-        for k, v in cookie_dict.items():
-            # 主域
-            self.session.cookies.set(k, v, domain=f".{root}", path="/")
-            # 带 www 的子域（若当前使用 www）
-            if host.startswith("www."):
-                self.session.cookies.set(k, v, domain=f".www.{root}", path="/")
+        set_session_cookies(self.session, cookie_dict)
 
         # 写入浏览器端 Cookie
         dp_cookies = []
@@ -179,43 +727,20 @@ class NodeLocBrowser:
             self.page.set.cookies(dp_cookies)
 
     def _parse_cookie_str(self, cookie_str: str) -> dict:
-        pairs = [kv.strip() for kv in cookie_str.split(";") if "=" in kv]
-        return {kv.split("=", 1)[0].strip(): kv.split("=", 1)[1].strip() for kv in pairs}
+        return parse_cookie_str(cookie_str)
 
     def _server_current_user(self) -> str:
-        """服务端获取当前登录用户名。优先 /session/current.json，降级 /u。"""
-        # 1) 标准接口（Discourse）
-        try:
-            r = self.session.get(f"{BASE_URL}/session/current.json", impersonate="chrome136", timeout=10)
-            if r.status_code == 200:
-                j = r.json()
-                cu = (j.get("current_user") or {})
-                name = cu.get("username") or cu.get("name") or ""
-                if name:
-                    return name
-        except Exception:
-            pass
-
-        # 2) 降级：解析 /u 页面 data-user-card
-        try:
-            r1 = self.session.get(f"{BASE_URL}/u", impersonate="chrome136", timeout=10)
-            if r1.status_code == 200:
-                m = re.search(r'data-user-card="([^"]+)"', r1.text or "")
-                if m:
-                    return m.group(1)
-        except Exception:
-            pass
-        return ""
+        return server_current_user(self.session)
 
     def _post_login_consistency_check(self, phase: str):
         """登录或关键操作后，服务端 + DOM 双确认当前账号。"""
         # 服务器侧
         server_user = self._server_current_user()
 
-        # DOM 侧（首页当前用户菜单 + JS 变量双保险）
+        # DOM 侧（当前用户菜单 + JS 变量双保险；站内任意页面都有顶部菜单）
         dom_user = ""
         try:
-            self.page.get(BASE_URL + "/")
+            self.nav.ensure(self.page, BASE_URL + "/", ready=any_page)
             # 等待用户菜单渲染（最多 8s）
             self.page.wait.ele_present("css=#current-user a[data-user-card]", timeout=8)
             dom_el = self.page.ele("css=#current-user a[data-user-card]")
@@ -245,9 +770,14 @@ class NodeLocBrowser:
             if not cookie_dict:
                 logger.warning("NL_COOKIE 为空或格式不正确")
                 return False
+            # 先用 HTTP 确认会话（此时浏览器仍在后台启动）；服务端明确未登录就不必再等浏览器
+            set_session_cookies(self.session, cookie_dict)
+            if http_session_user(self.session) == "":
+                logger.warning("服务端确认 NL_COOKIE 未登录（current_user 为空）")
+                return False
             self.set_cookies_to_both(cookie_dict)
-            self.page.get(BASE_URL + "/")
-            time.sleep(3)
+            if self.nav.ensure(self.page, BASE_URL + "/"):
+                time.sleep(3)
             ok = self._verify_logged_in()
             if ok:
                 self._post_login_consistency_check("after-login(cookie)")
@@ -262,37 +792,12 @@ class NodeLocBrowser:
             logger.error("未提供用户名或密码，无法使用密码登录")
             return False
         try:
-            headers = {
-                "User-Agent": self.session.headers["User-Agent"],
-                "Accept": self.session.headers["Accept"],
-                "Accept-Language": self.session.headers["Accept-Language"],
-                "X-Requested-With": "XMLHttpRequest",
-                "Referer": LOGIN_URL,
-            }
-            resp_csrf = self.session.get(CSRF_URL, headers=headers, impersonate="chrome136")
-            csrf = resp_csrf.json().get("csrf")
-            if not csrf:
-                logger.error("未获取到 CSRF")
-                return False
-            logger.info(f"CSRF: {csrf[:10]}...")
-
-            headers.update({
-                "X-CSRF-Token": csrf,
-                "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                "Origin": BASE_URL,
-            })
-            data = {"login": USERNAME, "password": PASSWORD}
-            resp_login = self.session.post(SESSION_URL, data=data, headers=headers, impersonate="chrome136")
-            if resp_login.status_code != 200:
-                logger.error(f"登录失败，状态码: {resp_login.status_code}")
-                return False
-            j = resp_login.json()
-            if j.get("error"):
-                logger.error(f"登录失败: {j.get('error')}")
+            if not http_password_login(self.session):
                 return False
 
             self.set_cookies_to_both(self.session.cookies.get_dict())
-            self.page.get(BASE_URL + "/")
+            # Cookie 已更换：即使当前就在首页也要重新加载
+            self.nav.ensure(self.page, BASE_URL + "/", fresh=True)
             time.sleep(4)
             ok = self._verify_logged_in()
             self._post_login_consistency_check("after-login(password)")
@@ -302,44 +807,76 @@ class NodeLocBrowser:
             return False
 
     def _verify_logged_in(self) -> bool:
-        # 优先标准 CSS 写法
-        user_ele = self.page.ele("css=#current-user") or self.page.ele("@id=current-user")
-        if user_ele:
+        state = self._probe_state([])
+        if state.get("current_user"):
             logger.info("登录验证成功（current-user）")
             return True
-        html = self.page.html or ""
-        if "avatar" in html or "/u/" in html:
+        if state.get("logged_in"):
             logger.info("登录验证成功（avatar / /u/）")
             return True
         logger.error("登录验证失败")
         return False
+
+    def _probe_state(self, selectors: list) -> dict:
+        """一次 run_js 同时取回登录标记、当前用户名与签到按钮状态（避免逐个选择器的隐式等待与多次 CDP 往返）。"""
+        try:
+            state = self.page.run_js(_PROBE_JS, selectors)
+            return state if isinstance(state, dict) else {}
+        except Exception as e:
+            logger.debug(f"[probe] 执行失败：{e}")
+            return {}
+
+    def _watch_checkin(self, sel: str) -> bool:
+        """点击前在页面内装好签到 XHR / MessageBus 监听；装不上时只能回退为按钮状态轮询。"""
+        try:
+            res = self.page.run_js(WATCH_JS, *watch_args(sel, CHECKIN_ENDPOINT))
+        except Exception as e:
+            logger.debug(f"[checkin] 监听安装失败：{e}")
+            return False
+        logger.debug(f"[checkin] 已监听签到请求，MessageBus 频道：{(res or {}).get('channels') or '无'}")
+        return True
+
+    def _checkin_selectors(self) -> list:
+        """签到按钮候选：内置 + CHECKIN_SELECTOR，上次命中的选择器排在最前。"""
+        selectors = [
+            "li.header-dropdown-toggle.checkin-icon button.checkin-button",  # 你的 DOM
+            "li.checkin-icon button.checkin-button",                         # 略宽松
+            "button[title='每日签到']",                          # 利用 title 文案
+            "button[aria-label='每日签到']",                     # 利用 aria-label 文案
+        ]
+        # 允许通过环境变量覆盖/追加
+        env_sel = [s.strip() for s in (CHECKIN_SELECTOR or "").split(",") if s.strip()]
+        for s in env_sel:
+            if s not in selectors:
+                selectors.append(s)
+
+        winner = _load_winning_selector()
+        if winner in selectors:
+            selectors.remove(winner)
+            selectors.insert(0, winner)
+        return selectors
     # ----------------------------------------------------
 
     # ------------------ 签到（Desktop 版 + whoami/cookies/server verify） ------------------
     def try_checkin(self) -> bool:
         logger.info("尝试执行签到...")
 
-        self.page.get(BASE_URL + "/")
-        time.sleep(3)
+        # 登录步骤通常已停在首页，无需再加载
+        if self.nav.ensure(self.page, BASE_URL + "/"):
+            time.sleep(3)
 
-        # whoami（从 DOM 读取“当前登录用户”菜单 + JS 变量降级）
-        uname = ""
+        # 等待 Desktop 顶部导航栏渲染完成
         try:
-            self.page.wait.ele_present("css=#current-user a[data-user-card]", timeout=8)
-            me = self.page.ele("css=#current-user a[data-user-card]")
-            uname = me.attr("data-user-card") if me else ""
+            self.page.wait.ele_displayed("css=ul.icons.d-header-icons", timeout=10)
         except Exception:
-            pass
+            logger.warning("顶部导航栏未完全渲染，可能导致找不到签到按钮")
 
-        if not uname:
-            try:
-                uname = self.page.run_js(
-                    "return (window.Discourse && Discourse.User && Discourse.User.currentProp) "
-                    "? Discourse.User.currentProp('username') : '';"
-                )
-            except Exception:
-                pass
+        selectors = self._checkin_selectors()
+        logger.debug(f"签到按钮候选（CSS）：{selectors}")
 
+        # whoami + 按钮状态：一次探测取回
+        state = self._probe_state(selectors)
+        uname = state.get("username") or ""
         logger.info(f"[whoami(dom)] 当前登录用户：{uname or '未知'}  @ {BASE_URL}")
 
         # 打印浏览器内 Cookie（域/路径/关键名）
@@ -357,189 +894,134 @@ class NodeLocBrowser:
         except Exception:
             pass
 
-        # 等待 Desktop 顶部导航栏渲染完成
-        try:
-            self.page.wait.ele_displayed("css=ul.icons.d-header-icons", timeout=10)
-        except Exception:
-            logger.warning("顶部导航栏未完全渲染，可能导致找不到签到按钮")
+        remaining = list(selectors)
+        while state.get("selector"):
+            sel = state["selector"]
+            logger.debug(f"命中签到按钮：{sel} classes={state.get('cls', '')}")
+            remaining = remaining[remaining.index(sel) + 1:] if sel in remaining else []
 
-        # 精准按钮 + 更稳备选（统一用 css= 前缀）
-        selectors = [
-            "li.header-dropdown-toggle.checkin-icon button.checkin-button",  # 你的 DOM
-            "li.checkin-icon button.checkin-button",                         # 略宽松
-            "button[title='每日签到']",                          # 利用 title 文案
-            "button[aria-label='每日签到']",                     # 利用 aria-label 文案
-        ]
-        # 允许通过环境变量覆盖/追加
-        env_sel = [s.strip() for s in (CHECKIN_SELECTOR or "").split(",") if s.strip()]
-        for s in env_sel:
-            if s not in selectors:
-                selectors.append(s)
-
-        logger.debug(f"签到按钮候选（CSS）：{selectors}")
-
-        def _checked(ele) -> bool:
-            """更稳的已签到判断：class 或 文案（title/aria-label）"""
-            try:
-                cls = ele.attr("class") or ""
-                title = (ele.attr("title") or "") + " " + (ele.attr("aria-label") or "")
-                return ("checked-in" in cls) or ("已签" in title) or ("已签到" in title)
-            except Exception:
-                return False
-
-        def server_side_verify(session, base_url: str) -> str:
-            """服务端侧核验：抓 /u 与 /badges，确认登录用户与可访问性"""
-            try:
-                r1 = session.get(f"{base_url}/u", impersonate="chrome136", timeout=10)
-                hit_user = ""
-                if r1.status_code == 200:
-                    m = re.search(r'data-user-card="([^"]+)"', r1.text or "")
-                    hit_user = m.group(1) if m else ""
-                r2 = session.get(f"{base_url}/badges", impersonate="chrome136", timeout=10)
-                code2 = r2.status_code
-                return f"[server] user={hit_user or '未知'} /badges_code={code2}"
-            except Exception as e:
-                return f"[server] verify error: {e}"
-
-        # 逐个候选尝试
-        for sel in selectors:
-            btn = None
-            try:
-                btn = self.page.ele(f"css={sel}")   # 关键：DrissionPage 使用 css= 前缀
-            except Exception:
-                btn = None
-
-            if not btn:
-                logger.debug(f"未找到：{sel}")
-                continue
-
-            if _checked(btn):
+            if state.get("checked"):
                 logger.success("今日已签到（checked-in / 文案提示）")
-                # --------- 增强校验：服务端 + DOM 双确认 ----------
-                logger.info(server_side_verify(self.session, BASE_URL))
-                self._post_login_consistency_check("after-checkin")
-
-                # 刷新首页再次确认按钮状态
-                self.page.get(BASE_URL + "/")
-                time.sleep(2)
-                final_btn = self.page.ele("css=li.checkin-icon button.checkin-button") \
-                            or self.page.ele("css=button.checkin-button")
-                if final_btn:
-                    final_cls = final_btn.attr("class") or ""
-                    logger.info(f"[final-ui] checkin-button classes: {final_cls}")
-                if DEBUG_ARTIFACTS:
-                    try:
-                        self.page.save_screenshot("/app/snap_after.png")
-                    except Exception:
-                        pass
-                # ----------------------------------------------
+                _save_winning_selector(sel)
+                self._after_checkin_verify(reload=False)
                 return True
 
+            watching = self._watch_checkin(sel)
             # 点击（失败则 JS 兜底）
+            btn = self.page.ele(f"css={sel}", timeout=2)   # 关键：DrissionPage 使用 css= 前缀
             try:
                 btn.click()
             except Exception:
                 try:
-                    self.page.run_js("arguments[0].click();", btn)
+                    self.page.run_js("document.querySelector(arguments[0]).click();", sel)
                 except Exception as e:
                     logger.error(f"点击失败：{e}")
+                    state = self._probe_state(remaining)
                     continue
 
-            time.sleep(2)
-
-            # 二次确认
-            btn2 = self.page.ele(f"css={sel}")
-            if btn2 and _checked(btn2):
-                logger.success("签到成功（状态/文案已更新）")
-                # --------- 增强校验：服务端 + DOM 双确认 ----------
-                logger.info(server_side_verify(self.session, BASE_URL))
-                self._post_login_consistency_check("after-checkin")
-
-                self.page.get(BASE_URL + "/")
-                time.sleep(2)
-                final_btn = self.page.ele("css=li.checkin-icon button.checkin-button") \
-                            or self.page.ele("css=button.checkin-button")
-                if final_btn:
-                    final_cls = final_btn.attr("class") or ""
-                    logger.info(f"[final-ui] checkin-button classes: {final_cls}")
-                if DEBUG_ARTIFACTS:
-                    try:
-                        self.page.save_screenshot("/app/snap_after.png")
-                    except Exception:
-                        pass
-                # ----------------------------------------------
+            # 服务端确认（签到接口响应 / MessageBus 推送）或按钮状态变化时立即返回
+            ok, how = wait_confirmed(lambda: self.page.run_js(STATE_JS)) if watching else (None, "未监听")
+            if ok is None:
+                logger.debug(f"[checkin] 未收到确认（{how}），回退为按钮状态轮询")
+                ok = poll_dom(lambda: self._probe_state([sel]).get("checked"))
+                how = "按钮状态轮询" if ok else "按钮状态未变化"
+            if ok:
+                logger.success(f"签到成功（{how}）")
+                _save_winning_selector(sel)
+                self._after_checkin_verify(reload=True)
                 return True
+            logger.warning(f"签到未确认：{how}")
 
-        # 走到这里：仍未确认成功 → 导出调试信息
-        try:
-            with open("/app/debug_page.html", "w", encoding="utf-8") as f:
-                f.write(self.page.html or "")
-            try:
-                self.page.save_screenshot("/app/snap.png")
-            except Exception:
-                pass
-            icons = self.page.ele("css=ul.icons.d-header-icons")
-            if icons:
-                logger.debug(f"[debug] header icons HTML: {icons.html}")
-        except Exception:
-            pass
+            state = self._probe_state(remaining)
+
+        # 走到这里：仍未确认成功 → 后台导出调试信息（不阻塞主流程）
+        self.artifacts.capture_page(self.page, "checkin-failed")
+        self.artifacts.capture(
+            "header-icons",
+            lambda: self.page.run_js("const e = document.querySelector('ul.icons.d-header-icons'); return e ? e.outerHTML : '';"),
+            "html",
+        )
 
         logger.info(server_side_verify(self.session, BASE_URL))
-        logger.warning("未找到签到按钮或未确认到成功（已尝试导出 /app/debug_page.html 与 /app/snap.png）")
+        logger.warning(f"未找到签到按钮或未确认到成功（调试产物导出到 {self.artifacts.dir}）")
         return False
+
+    def _after_checkin_verify(self, reload: bool):
+        """
+        签到确认后：服务端 + DOM 双确认，并读取最终按钮状态。
+        reload=True（刚点击过签到）时先刷新一次首页，确认状态已在服务端持久化，后续检查复用这次加载。
+        """
+        logger.info(server_side_verify(self.session, BASE_URL))
+        if reload:
+            self.nav.ensure(self.page, BASE_URL + "/", fresh=True)
+            time.sleep(2)
+        self._post_login_consistency_check("after-checkin")
+
+        final_btn = self.page.ele("css=li.checkin-icon button.checkin-button") \
+                    or self.page.ele("css=button.checkin-button")
+        if final_btn:
+            final_cls = final_btn.attr("class") or ""
+            logger.info(f"[final-ui] checkin-button classes: {final_cls}")
+        if DEBUG_ARTIFACTS:
+            self.artifacts.capture_page(self.page, "after-checkin")
     # ----------------------------------------------------
 
     # ------------------ 浏览/点赞 ------------------
     def click_topics_and_browse(self) -> bool:
+        budget = account_budget()
+        if budget <= 0:
+            logger.warning("本次运行的浏览时间预算已用完，跳过浏览")
+            return False
+        started = time.monotonic()
+
         logger.info("开始随机浏览首页主题...")
-        self.page.get(BASE_URL + "/")
-        time.sleep(4)
+        if self.nav.ensure(self.page, BASE_URL + "/"):
+            time.sleep(4)
 
-        topic_links = [a.attr("href") for a in self.page.eles("css=#list-area a.title") if a.attr("href")]
-        if not topic_links:
+        # 链接 + 帖子数一次取回，用于估算每个主题的阅读成本
+        topics = self.page.run_js(TOPIC_LIST_JS) or []
+        if not topics:
             logger.error("未找到主题链接")
             return False
 
-        picks = random.sample(topic_links, min(CLICK_COUNT, len(topic_links)))
-        logger.info(f"发现 {len(topic_links)} 个主题，随机浏览 {len(picks)} 个")
+        planner = BrowsePlanner(topics, budget, CLICK_COUNT, started=started)
+        logger.info(f"发现 {len(topics)} 个主题，按时间预算浏览（最多 {CLICK_COUNT} 个）")
 
-        for url in picks:
+        while True:
+            picked = planner.next()
+            if picked is None:
+                break
+            topic, plan = picked
+            url = topic["url"]
             full = url if url.startswith("http") else (BASE_URL + url)
-            self._browse_one_topic(full)
+            t0 = time.monotonic()
+            summary = self._browse_one_topic(full, plan)
+            planner.done(topic, time.monotonic() - t0, plan, summary)
 
-        return True
+        logger.info(f"[browse] {planner.summary()}")
+        return planner.visited > 0
 
     @retry(3, sleep_seconds=1.0)
-    def _browse_one_topic(self, url: str):
+    def _browse_one_topic(self, url: str, plan: dict) -> dict:
         tab = self.browser.new_tab()
-        tab.get(url)
+        self.nav.ensure(tab, url)
         time.sleep(random.uniform(1.2, 2.2))
 
         if random.random() < LIKE_PROB:
             self._try_like(tab)
 
-        self._auto_scroll(tab)
+        summary = self._auto_scroll(tab, plan)
         tab.close()
+        return summary
 
-    def _auto_scroll(self, page):
-        prev_url = None
-        for _ in range(random.randint(6, 10)):
-            dist = random.randint(520, 700)
-            page.run_js(f"window.scrollBy(0, {dist})")
-            time.sleep(random.uniform(1.8, 3.5))
-
-            at_bottom = page.run_js(
-                "return window.scrollY + window.innerHeight >= document.body.scrollHeight;"
-            )
-            cur = page.url
-
-            if cur != prev_url:
-                prev_url = cur
-            elif at_bottom and prev_url == cur:
-                break
-
-            if random.random() < 0.07:
-                break
+    def _auto_scroll(self, page, plan: dict) -> dict:
+        """滚动 / 停留循环整体在页内执行，一个主题只需一次 CDP 调用。"""
+        summary = page.run_js(DRISSION_SCROLL_JS, plan, timeout=plan_timeout(plan)) or {}
+        logger.debug(
+            f"[scroll] steps={summary.get('steps')} bottom={summary.get('bottom')} "
+            f"url_changes={summary.get('url_changes')}"
+        )
+        return summary
 
     def _try_like(self, page) -> None:
         try:
@@ -560,82 +1042,21 @@ class NodeLocBrowser:
 
     # ------------------ 信息与推送 ------------------
     def print_basic_info(self):
-        try:
-            resp = self.session.get(f"{BASE_URL}/badges", impersonate="chrome136")
-            soup = BeautifulSoup(resp.text, "html.parser")
-            rows = soup.select("table tr")
-            info = []
-            for r in rows:
-                cols = [c.text.strip() for c in r.select("td")]
-                if len(cols) >= 2:
-                    info.append(cols[:3])
-            if info:
-                print("------------- Badges / Info -------------")
-                print(tabulate(info, headers=["列1", "列2", "列3"], tablefmt="pretty"))
-        except Exception:
-            pass
+        print_basic_info(self.session)
 
     def send_notifications(self, ok: bool, did_checkin: bool, browsed: bool):
-        status = ("✅ 登录成功" if ok else "❌ 登录失败")
-        if did_checkin:
-            status += " + 签到完成"
-        if browsed and BROWSE_ENABLED:
-            status += " + 浏览任务完成"
-
-        # Gotify
-        if GOTIFY_URL and GOTIFY_TOKEN:
-            try:
-                r = requests.post(
-                    f"{GOTIFY_URL}/message",
-                    params={"token": GOTIFY_TOKEN},
-                    json={"title": "NODELOC", "message": status, "priority": 1},
-                    timeout=10,
-                )
-                r.raise_for_status()
-            except Exception:
-                pass
-
-        # Server酱³
-        if SC3_PUSH_KEY:
-            m = re.match(r"sct(\d+)t", SC3_PUSH_KEY, re.I)
-            if m:
-                uid = m.group(1)
-                url = f"https://{uid}.push.ft07.com/send/{SC3_PUSH_KEY}"
-                params = {"title": "NODELOC", "desp": status}
-                for _ in range(3):
-                    try:
-                        r = requests.get(url, params=params, timeout=10)
-                        r.raise_for_status()
-                        break
-                    except Exception:
-                        time.sleep(random.randint(120, 240))
-
-        # Telegram
-        if TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID:
-            try:
-                tg_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-                params = {
-                    "chat_id": TELEGRAM_CHAT_ID,
-                    "text": f"NODELOC\n\n{status}",
-                }
-                requests.get(tg_url, params=params, timeout=10)
-            except Exception:
-                pass
+        send_notifications(ok, did_checkin, browsed)
     # ----------------------------------------------------
 
     # ------------------ 入口 ------------------
-    def run(self) -> bool:
+    def run(self, skip_checkin: bool = False) -> bool:
         ok = False
         did_checkin = False
         browsed = False
+        self.did_checkin = False
 
         try:
-            if NL_COOKIE:
-                ok = self.login_via_cookie()
-                if not ok and USERNAME and PASSWORD:
-                    ok = self.login_via_password()
-            else:
-                ok = self.login_via_password()
+            ok = self.login()
 
             if not ok:
                 self.send_notifications(False, False, False)
@@ -643,7 +1064,12 @@ class NodeLocBrowser:
 
             self.print_basic_info()
 
-            did_checkin = self.try_checkin()
+            if skip_checkin:
+                logger.info(f"本地记录显示今日（{site_today()}）已签到，跳过签到，仅执行浏览")
+                did_checkin = True
+            else:
+                did_checkin = self.try_checkin()
+                self.did_checkin = did_checkin
 
             if BROWSE_ENABLED:
                 browsed = self.click_topics_and_browse()
@@ -651,16 +1077,357 @@ class NodeLocBrowser:
             self.send_notifications(True, did_checkin, browsed)
             return True
         finally:
-            try:
-                self.page.close()
-                self.browser.quit()
-            except Exception:
-                pass
+            self.close()
+
+    def login(self) -> bool:
+        """
+        NL_COOKIE 优先，失败且有账号密码时回退密码登录。
+        浏览器与 HTTP 部分（Cookie 校验 / CSRF + 密码登录）并行启动；HTTP 明确判定无法登录时取消启动。
+        """
+        if not NL_COOKIE and not (USERNAME and PASSWORD):
+            logger.error("未提供 NL_COOKIE 或用户名/密码，无法登录")
+            return False
+        self._boot.start()
+
+        if NL_COOKIE:
+            ok = self.login_via_cookie()
+            if not ok and USERNAME and PASSWORD:
+                ok = self.login_via_password()
+        else:
+            ok = self.login_via_password()
+        if not ok:
+            # 登录失败后用不到浏览器：取消后台启动（已启动则关闭）
+            self._boot.close()
+        return ok
+
+    def close(self):
+        # 关闭浏览器前给后台采集留一点时间（有上限）
+        saved = self.artifacts.close(timeout=10)
+        if saved:
+            logger.info(f"[artifacts] 已保存 {len(saved)} 个调试产物 -> {self.artifacts.dir}")
+        if self.nav.navigations:
+            logger.info(f"[nav] {self.nav.summary()}")
+        if self.tracer.traces:
+            logger.info(f"[trace] {self.tracer.summary()}")
+        self._boot.close()
     # ----------------------------------------------------
 
 
+# ------------------ 任务后端（按成本自动选择） ------------------
+class HttpBackend(Backend):
+    """纯 HTTP：验证登录；站点提供签到接口（CHECKIN_ENDPOINT）时也可直接签到，不启动浏览器。"""
+
+    name = "http"
+    base_cost = 2.0
+    tasks = ("validate", "checkin") if CHECKIN_ENDPOINT else ("validate",)
+
+    def __init__(self, account: str = "") -> None:
+        self.account = account
+        self.session = None
+        self.user = ""
+
+    def _ensure_login(self) -> bool:
+        if self.session is None:
+            self.session = new_session(self.account)
+            if NL_COOKIE:
+                set_session_cookies(self.session, parse_cookie_str(NL_COOKIE))
+                self.user = server_current_user(self.session)
+            if not self.user and USERNAME and PASSWORD and http_password_login(self.session):
+                self.user = server_current_user(self.session)
+        return bool(self.user)
+
+    def run(self, task: str) -> bool:
+        if not self._ensure_login():
+            return False
+        if task == "validate":
+            logger.info(f"[http] 当前登录用户：{self.user}")
+            print_basic_info(self.session)
+            return True
+        return http_checkin(self.session)
+
+
+class DrissionBackend(Backend):
+    """
+    DrissionPage 浏览器：支持全部任务；浏览器在第一次需要时才启动，多个任务复用。
+    profile 为启动配置（full / lite），由本次要执行的任务决定，见 launch_profile.pick_profile。
+    """
+
+    name = "drission"
+    base_cost = 60.0
+    tasks = ("validate", "checkin", "browse")
+
+    def __init__(self, account: str, profile: str = "full", watch: Optional[Callable[[int], None]] = None) -> None:
+        self.account = account
+        self.profile = profile
+        self.watch = watch
+        self.browser: Optional[NodeLocBrowser] = None
+        self.logged_in = False
+
+    def run(self, task: str) -> bool:
+        if self.browser is None:
+            self.browser = NodeLocBrowser(account=self.account, profile=self.profile, watch=self.watch)
+        if not self.logged_in:
+            self.logged_in = self.browser.login()
+            if not self.logged_in:
+                return False
+        if task == "checkin":
+            return self.browser.try_checkin()
+        if task == "browse":
+            return self.browser.click_topics_and_browse()
+        return True
+
+    def close(self) -> None:
+        if self.browser is not None:
+            self.browser.close()
+            self.traces = self.browser.tracer.traces
+            info = self.browser._boot.info()
+            self.launches = [info] if info else []
+
+
+class UcBackend(Backend):
+    """
+    undetected_chromedriver：在子进程中运行 nodeloc/ 目录下的实现（仅支持 Cookie 登录）。
+    两套实现依赖不同，用子进程隔离；签到 / 浏览结果由子进程写入 NODELOC_RESULT_FILE 交回，
+    签到记录由本进程按与 _run 相同的账号标识写入。
+    """
+
+    name = "uc"
+    base_cost = 90.0
+    tasks = ("checkin", "browse")
+    entry = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nodeloc", "main.py")
+
+    def __init__(self, watch: Optional[Callable[[int], None]] = None) -> None:
+        self.watch = watch
+
+    def available(self) -> bool:
+        return bool(NL_COOKIE) \
+            and _split_host(BASE_URL) == "www.nodeloc.com" \
+            and os.path.exists(self.entry) \
+            and importlib.util.find_spec("undetected_chromedriver") is not None
+
+    def run(self, task: str) -> bool:
+        # 子进程把结果写入该文件；被结束 / 崩溃时没有结果文件，按失败处理
+        result_file = os.path.join(DATA_DIR, f"uc-result-{os.getpid()}-{threading.get_ident()}.json")
+        if os.path.exists(result_file):
+            os.remove(result_file)
+        env = dict(os.environ)
+        env.update({
+            "NODELOC_RESULT_FILE": result_file,
+            "NL_COOKIE": NL_COOKIE,
+            "BROWSE_ENABLED": "true" if task == "browse" else "false",
+            # 只处理本账号所在的默认站点
+            "SITES": "",
+            "SITES_FILE": "",
+            "ACCOUNTS_SOURCE": "",
+            "WORK_QUEUE": "",
+            # 与本进程使用同一个出口代理
+            "PROXIES": get_proxy_pool().for_account(account_key(NL_COOKIE, USERNAME or "")) or "",
+            "PROXIES_FILE": "",
+            # 汇总推送由本进程负责
+            "TG_BOT_TOKEN": "",
+            "GOTIFY_URL": "",
+        })
+        # 子进程按该阶段的时限（PHASE_TIMEOUTS，未配置时 ACCOUNT_TIMEOUT）运行，超时连同浏览器一起结束
+        timeout = parse_phase_timeouts(PHASE_TIMEOUTS).get(task) or ACCOUNT_TIMEOUT
+        proc = subprocess.Popen([sys.executable, self.entry], cwd=os.path.dirname(self.entry), env=env,
+                                start_new_session=True)
+        if self.watch:
+            # 不隔离账号时由进程内看门狗监督：超限时连同子进程的浏览器一起结束
+            self.watch(proc.pid)
+        try:
+            proc.wait(timeout=timeout if timeout > 0 else None)
+        except subprocess.TimeoutExpired:
+            killed = ProcessTree(proc.pid).kill()
+            proc.wait()
+            logger.error(f"[uc] {task} 超过 {timeout:.0f} 秒未结束，已结束子进程及其浏览器（{killed} 个进程）")
+        result = load_json(result_file)
+        try:
+            os.remove(result_file)
+        except OSError:
+            pass
+        if proc.returncode != 0 or not result:
+            logger.warning(f"[uc] 子进程退出码 {proc.returncode}，未拿到 {task} 结果")
+            return False
+        return bool(result.get("checked_in" if task == "checkin" else "browsed"))
+
+
+def build_backends(account: str, watch: Optional[Callable[[int], None]] = None) -> list:
+    """watch：浏览器 / 子进程启动后登记 pid（supervisor.Watchdog.watch / Reporter.watch）"""
+    # 不浏览时浏览器只用来打开首页、点一次签到按钮：默认用轻量启动配置
+    tasks = ("validate", "checkin", "browse") if BROWSE_ENABLED else ("validate", "checkin")
+    return available_backends([HttpBackend(account), DrissionBackend(account, pick_profile(tasks), watch),
+                               UcBackend(watch)])
+# ----------------------------------------------------
+
+
+def _runner_worker(reporter) -> bool:
+    """supervisor 子进程入口：执行完整流程，阶段与部分结果随时回传父进程。"""
+    return NodeLocRunner()._run(reporter)
+
+
 class NodeLocRunner:
     def run(self) -> bool:
-        b = NodeLocBrowser()
-        return b.run()
+        # 启动时先回收上次运行遗留的浏览器进程与临时用户目录，退出时再回收一次
+        reaper.reap(log=logger.info)
+        # 整次运行的浏览截止时间在启动账号子进程之前确定，所有账号共用
+        run_deadline()
+        if PROFILE:
+            # 剖析文件的运行目录同理，所有账号子进程写入同一个目录
+            run_id()
+        try:
+            if ACCOUNTS_SOURCE:
+                return self._run_source()
+            return self._run_supervised()
+        finally:
+            reaper.reap(final=True, log=logger.info)
+
+    def _run_source(self) -> bool:
+        """
+        ACCOUNTS_SOURCE：从账号来源逐个读取账号，每个账号都在受监督的子进程中执行。
+        子进程从环境变量读取该账号的 Cookie / 账号密码 / LIKE_PROB 等覆盖项，流程与单账号相同。
+        """
+        source = open_source(ACCOUNTS_SOURCE)
+        logger.info(f"账号来源: {source.spec}")
+        ok, n = True, 0
+        for n, account in enumerate(source, 1):
+            logger.info(f"========== 账号 {n}（{account.key}） ==========")
+            with account.environ():
+                ok = self._run_supervised(account.key) and ok
+        if not n:
+            logger.error(f"账号来源 {source.spec} 中没有账号")
+            return False
+        return ok
+
+    def _run_supervised(self, acct: Optional[str] = None) -> bool:
+        """
+        ISOLATE_ACCOUNTS 开启时在受监督的子进程中执行：某个阶段卡住或内存超限时
+        结束整棵进程树（包括 Chromium），父进程按已完成的部分照常推送。
+        acct 不为空时为账号来源中的一个账号（已写入环境变量），总是在子进程中执行。
+        """
+        from_source = acct is not None
+        acct = acct or account_key(NL_COOKIE, USERNAME or "")
+        skip = CheckinState().checked_in_today(BASE_URL, acct) and not BROWSE_ENABLED
+        if from_source and skip:
+            logger.success(f"本地记录显示今日（{site_today()}）已签到，且未启用浏览，跳过")
+            RunRecorder("drission-stack").account(acct).finish("skipped")
+            return True
+        if not from_source and skip:
+            return self._run()
+        if not from_source and not ISOLATE_ACCOUNTS:
+            # 在本进程中执行，时限与内存上限由看门狗执行：超限时结束浏览器（及 uc 子进程），该账号随之失败结束
+            with Watchdog(log=logger.error) as dog:
+                return self._run(dog)
+
+        res = run_supervised(_runner_worker)
+        if res["status"] == "done":
+            return bool(res["value"])
+
+        # 子进程被强制结束或异常退出：用回传的部分结果补记运行历史并推送
+        part = res["partial"]
+        logger.error(f"[supervisor] {res['reason'] or res['status']}，已结束工作进程及其浏览器")
+        if res["status"] != "error":
+            # status 为 error 时子进程是抛异常正常退出的，_run 的 finally 已写过这个账号的运行历史
+            record = RunRecorder("drission-stack").account(acct)
+            for name, duration, ok, backend in part.get("phases", []):
+                record.add_phase(name, duration, ok, backend)
+            if res["phase"] and res["status"] in ("timeout", "memory"):
+                record.add_phase(res["phase"], res["phase_elapsed"], False)
+            record.retries = part.get("retries", 0)
+            record.finish(res["status"])
+        if not part.get("notified"):
+            send_notifications(part.get("login_ok", False), part.get("did_checkin", False),
+                               part.get("browsed", False), note=res["reason"])
+        return bool(part.get("login_ok"))
+
+    def _run(self, reporter=None) -> bool:
+        state = CheckinState()
+        acct = account_key(NL_COOKIE, USERNAME or "")
+        record = RunRecorder("drission-stack").account(acct)
+        done_today = state.checked_in_today(BASE_URL, acct)
+        if done_today and not BROWSE_ENABLED:
+            logger.success(f"本地记录显示今日（{site_today()}）已签到，且未启用浏览，直接结束（FORCE_CHECKIN=true 可强制签到）")
+            record.finish("skipped")
+            return True
+
+        def _phase(name: str):
+            if reporter:
+                reporter.phase(name)
+
+        def _progress(**data):
+            # 每完成一步就回传，子进程被杀时父进程仍知道已完成的部分
+            if reporter:
+                reporter.update(phases=list(record.phases), retries=record.retries, **data)
+
+        def _note() -> str:
+            # 进程内看门狗超限时推送中注明原因（子进程隔离时由父进程推送）
+            return reporter.res["reason"] if reporter and reporter.tripped else ""
+
+        gov = get_governor()
+        selector = BackendSelector()
+        # PROFILE 开启时按阶段剖析（墙钟 / CPU 时间、调用栈）
+        profiler = PhaseProfiler(acct)
+        log = logger.info
+        with gov.bind_account(acct):
+            backends = []
+            try:
+                backends = build_backends(acct, reporter.watch if reporter else None)
+                # 每个任务选择最近成功过、期望成本最低的后端，失败则升级到更重的后端
+                _phase("validate")
+                with profiler.phase("validate"):
+                    ok, _ = selector.run(acct, "validate", backends, log=log)
+                record.add_attempts("validate", selector.attempts)
+                _progress(login_ok=ok)
+                if not ok:
+                    record.outcome = "failed"
+                    send_notifications(False, False, False, note=_note())
+                    _progress(notified=True)
+                    return False
+
+                if done_today:
+                    logger.info(f"本地记录显示今日（{site_today()}）已签到，跳过签到，仅执行浏览")
+                    did_checkin = True
+                else:
+                    _phase("checkin")
+                    with profiler.phase("checkin"):
+                        did_checkin, used = selector.run(acct, "checkin", backends, log=log)
+                    record.add_attempts("checkin", selector.attempts)
+                    if did_checkin:
+                        state.mark(BASE_URL, acct, backend=used)
+                _progress(did_checkin=did_checkin)
+
+                browsed = False
+                if BROWSE_ENABLED:
+                    _phase("browse")
+                    with profiler.phase("browse"):
+                        browsed, _ = selector.run(acct, "browse", backends, log=log)
+                    record.add_attempts("browse", selector.attempts)
+                    _progress(browsed=browsed)
+
+                record.outcome = "ok" if did_checkin else "checkin_failed"
+                _phase("notify")
+                send_notifications(True, did_checkin, browsed, note=_note())
+                _progress(notified=True)
+                return True
+            finally:
+                close_all(backends)
+                profiler.close(log=log)
+                for b in backends:
+                    record.add_traces(b.traces)
+                    for launch in b.launches:
+                        record.add_launch(**launch)
+                # 流量按 governor 统计（浏览器内的请求不经过 governor，不计入）
+                record.bytes = gov.account_bytes(acct)
+                if reporter and reporter.tripped:
+                    # 进程内看门狗超限：与子进程被结束时一样补记超限的阶段
+                    if reporter.res["phase"]:
+                        record.add_phase(reporter.res["phase"], reporter.res["phase_elapsed"], False)
+                    record.outcome = reporter.tripped
+                record.finish("failed" if record.outcome == "unknown" else None)
+                logger.info(f"[governor] {gov.summary()}")
+                if get_proxy_pool().enabled:
+                    logger.info(f"[proxy] {get_proxy_pool().summary()}")
+                cassette = get_cassette()
+                if cassette and cassette.recording:
+                    cassette.save()
+                    logger.info(f"[cassette] 已录制 {len(cassette.entries)} 个请求 -> {cassette.path}")
 
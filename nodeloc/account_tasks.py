@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+账号任务后端
+同一个账号任务（checkin 签到 / browse 浏览点赞）可由不同后端完成：
+- http: 纯 HTTP（仅当站点签到插件提供接口，并配置 CHECKIN_ENDPOINT 时可签到）
+- uc:   undetected_chromedriver 浏览器（第一次需要时才启动，多个任务复用同一个浏览器）
+由仓库根目录 backends.py 中的 BackendSelector 按历史成功率和耗时选择
+站点相关配置（地址、签到按钮、签到接口、Cookie 域）来自 sites.Site
+"""
+import time
+import logging
+from typing import Optional
+
+from backends import Backend
+from browser import browser_pids, create_browser, inject_cookies, ensure_page, nav_planner, nav_tracer, quit_browser
+from checkin import wait_login_success, get_username, do_checkin
+from browse import browse_topics, LIKE_PROB, CLICK_COUNT
+from preflight import check_cookie, http_pool, ALIVE, USER_AGENT
+from governor import get_governor
+from checkin_state import account_key
+from checkin_watch import confirm_http
+from proxy_pool import PROXY_ERROR_STATUS, BrowserProxyError, browser_proxy, get_proxy_pool, proxy_key, requests_proxies
+
+log = logging.getLogger(__name__)
+
+
+class HttpBackend(Backend):
+    """纯 HTTP 后端：不启动浏览器"""
+
+    name = "http"
+    base_cost = 2.0
+
+    def __init__(self, site, cookie: str):
+        self.site = site
+        self.base_url = site.base_url
+        self.cookie = cookie
+        # 站点提供签到接口时才能纯 HTTP 签到
+        self.tasks = ("validate", "checkin") if site.checkin_endpoint else ("validate",)
+        self.username = ""
+        self.logged_in = False
+        self.msg = ""
+
+    def _request(self, method: str, url: str, **kwargs):
+        """经账号固定的出口代理发请求（未配置代理池时直连），代理出错自动换一个重试"""
+        governor = get_governor()
+
+        def _send(proxy):
+            egress = proxy_key(proxy) if proxy else None
+            governor.acquire(url, egress=egress)
+            resp = http_pool().request(method, url, proxies=requests_proxies(proxy), **kwargs)
+            governor.feedback(url, resp.status_code, resp.headers.get("Retry-After"),
+                              nbytes=len(resp.content or b""), egress=egress)
+            return resp
+
+        return get_proxy_pool().call(account_key(self.cookie), _send,
+                                     is_proxy_error=lambda resp: resp.status_code in PROXY_ERROR_STATUS)
+
+    def _get(self, url: str, **kwargs):
+        return self._request("GET", url, **kwargs)
+
+    def _post(self, url: str, **kwargs):
+        return self._request("POST", url, **kwargs)
+
+    def _validate(self) -> bool:
+        if not self.logged_in:
+            check = check_cookie(self.base_url, self.cookie)
+            self.logged_in = check["status"] == ALIVE
+            self.username = check["username"]
+        return self.logged_in
+
+    def run(self, task: str) -> bool:
+        if not self._validate():
+            self.msg = "[❌] 登录失败，Cookie 可能失效"
+            return False
+        if task == "validate":
+            return True
+
+        # 签到：先取 CSRF，再 POST 签到接口
+        headers = {
+            "Cookie": self.cookie,
+            "User-Agent": USER_AGENT,
+            "Accept": "application/json",
+            "X-Requested-With": "XMLHttpRequest",
+            "Referer": self.base_url + "/",
+        }
+        resp = self._get(f"{self.base_url}/session/csrf", headers=headers, timeout=10)
+        try:
+            csrf = resp.json().get("csrf")
+        except (ValueError, AttributeError):
+            # 非 JSON（质询页 / 登录跳转）
+            csrf = None
+        if not csrf:
+            self.msg = f"[❌] {self.username} 未获取到 CSRF（{resp.status_code}）"
+            return False
+        headers.update({"X-CSRF-Token": csrf, "Origin": self.base_url})
+        endpoint = self.site.checkin_endpoint
+        url = endpoint if endpoint.startswith("http") else self.base_url + endpoint
+        resp = self._post(url, headers=headers, timeout=15)
+        ok, reason = confirm_http(resp.status_code, resp.text)
+        if ok is None:
+            # 无法确认（如 Cloudflare 质询页）：不算成功，交给浏览器后端
+            self.msg = f"[❌] {self.username} HTTP 签到未确认（{reason}）"
+            return False
+        if not ok:
+            self.msg = f"[❌] {self.username} HTTP 签到失败（{reason}）"
+            return False
+        self.msg = f"[✅] {self.username} 今日已签到" if reason == "今日已签到" else f"[🎉] {self.username} 签到成功"
+        return True
+
+
+class UcBackend(Backend):
+    """undetected_chromedriver 浏览器后端：支持全部任务"""
+
+    name = "uc"
+    base_cost = 90.0
+    tasks = ("validate", "checkin", "browse")
+
+    def __init__(self, site, cookie: str, pool=None, options: Optional[dict] = None, reporter=None):
+        self.site = site
+        self.base_url = site.base_url
+        self.cookie = cookie
+        # 进度回传 / 进程内看门狗（supervisor.Reporter / Watchdog）：浏览器进程登记给它，超限时被结束
+        self.reporter = reporter
+        # 按账号覆盖的配置（account_source.OVERRIDES，如 LIKE_PROB / CLICK_COUNT）
+        self.options = options or {}
+        # 与 HTTP 请求走同一个出口代理（未配置代理池时直连）
+        proxy = get_proxy_pool().for_account(account_key(cookie))
+        # 浏览器用不了该代理（带认证的 SOCKS / HTTPS）时不启动浏览器，也不直连
+        self.proxy_error = ""
+        try:
+            self.proxy_server = browser_proxy(proxy)
+        except BrowserProxyError as e:
+            self.proxy_server, self.proxy_error = None, str(e)
+        self.egress = proxy_key(proxy) if proxy else None
+        # 共享浏览器池（多站点运行时），为 None 时自己启动、用完关闭；走代理的账号不能用池里的浏览器
+        self.pool = None if proxy else pool
+        self.driver = None
+        # 自己启动浏览器时的 (耗时, 是否成功)，记入运行历史的 launch 阶段
+        self.launch = None
+        self.username = ""
+        self.logged_in = False
+        self.msg = ""
+
+    def _ensure_login(self) -> bool:
+        if self.logged_in:
+            return True
+        if self.proxy_error:
+            self.msg = f"[❌] {self.proxy_error}"
+            return False
+        if self.driver is None:
+            if self.pool:
+                self.driver = self.pool.acquire()
+            else:
+                t0 = time.monotonic()
+                self.driver = create_browser(proxy=self.proxy_server)
+                self.launch = (time.monotonic() - t0, self.driver is not None)
+            if not self.driver:
+                self.msg = "[❌] 浏览器启动失败"
+                return False
+            if self.reporter:
+                for pid in browser_pids(self.driver):
+                    self.reporter.watch(pid)
+
+        # 注入 Cookie（CDP 批量写入，无需先打开首页），第一次导航直接访问用户中心检查登录状态
+        inject_cookies(self.driver, self.base_url, self.cookie, self.site.cookie_domain)
+        ensure_page(self.driver, self.site.user_page)
+        if not wait_login_success(self.driver, site=self.site):
+            self.msg = "[❌] 登录失败，Cookie 可能失效"
+            return False
+
+        self.logged_in = True
+        self.username = get_username(self.driver)
+        log.info(f"👤 当前账号: {self.username}")
+        return True
+
+    def run(self, task: str) -> bool:
+        # 浏览器导航按浏览器的出口限速
+        with get_governor().bind_egress(self.egress):
+            return self._run(task)
+
+    def _run(self, task: str) -> bool:
+        if not self._ensure_login():
+            return False
+        if task == "checkin":
+            self.msg = do_checkin(self.driver, self.username, self.site)
+            return self.msg.startswith(("[✅]", "[🎉]"))
+        if task == "browse":
+            return browse_topics(
+                self.driver, self.base_url,
+                like_prob=self.options.get("LIKE_PROB", LIKE_PROB),
+                click_count=self.options.get("CLICK_COUNT", CLICK_COUNT),
+            )
+        return True
+
+    def close(self) -> None:
+        # 无论成功失败，最后都关闭浏览器（共享池则清理后归还）
+        if self.driver is not None:
+            log.info(f"🧭 {nav_planner(self.driver).summary()}")
+            self.traces = nav_tracer(self.driver).traces
+            if self.traces:
+                log.info(f"⏱️ 页面加载: {nav_tracer(self.driver).summary()}")
+            if self.pool:
+                self.pool.release(self.driver)
+            else:
+                quit_browser(self.driver)
+            self.driver = None
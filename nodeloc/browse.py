@@ -10,6 +10,10 @@ import logging
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 
+from browser import ensure_page
+from scroll_driver import SELENIUM_SCROLL_JS, plan_timeout
+from browse_planner import BrowsePlanner, TOPIC_LIST_JS, account_budget
+
 log = logging.getLogger(__name__)
 
 # ================== 浏览配置（从环境变量读取）==================
@@ -17,77 +21,94 @@ log = logging.getLogger(__name__)
 BROWSE_ENABLED = os.environ.get("BROWSE_ENABLED", "true").lower() == "true"
 # 点赞概率（0~1）
 LIKE_PROB = float(os.environ.get("LIKE_PROB", "0.3"))
-# 随机浏览帖子数量
+# 随机浏览帖子数量上限（实际数量还受 BROWSE_BUDGET / BROWSE_RUN_BUDGET 时间预算限制）
 CLICK_COUNT = int(os.environ.get("CLICK_COUNT", "10"))
 # ==============================================================
 
 
-def browse_topics(driver, base_url: str) -> bool:
+def browse_topics(driver, base_url: str, like_prob: float = LIKE_PROB, click_count: int = CLICK_COUNT) -> bool:
     """
     随机浏览首页帖子
     :param driver: Selenium WebDriver 实例
     :param base_url: 网站基础地址
+    :param like_prob: 点赞概率（可按账号覆盖）
+    :param click_count: 浏览帖子数量上限（可按账号覆盖）
     :return: 是否浏览成功
     """
     if not BROWSE_ENABLED:
         log.info("📖 浏览功能已禁用，跳过")
         return False
 
+    budget = account_budget()
+    if budget <= 0:
+        log.warning("⏱️ 本次运行的浏览时间预算已用完，跳过浏览")
+        return False
+    started = time.monotonic()
+
     log.info("📖 开始随机浏览首页主题...")
     
     try:
-        # 1. 访问首页
-        driver.get(base_url + "/")
-        time.sleep(4)
+        # 1. 访问首页（已在首页则不重复加载）
+        if ensure_page(driver, base_url + "/"):
+            time.sleep(4)
 
-        # 2. 获取所有帖子链接
-        # 使用 CSS 选择器查找帖子标题链接
-        topic_elements = driver.find_elements(By.CSS_SELECTOR, "#list-area a.title")
-        topic_links = [el.get_attribute("href") for el in topic_elements if el.get_attribute("href")]
+        # 2. 获取所有帖子链接和帖子数（一次脚本调用），用于估算每个主题的阅读成本
+        topics = driver.execute_script(TOPIC_LIST_JS) or []
 
-        if not topic_links:
+        if not topics:
             log.warning("⚠️ 未找到主题链接")
             return False
 
-        # 3. 随机选择要浏览的帖子
-        picks = random.sample(topic_links, min(CLICK_COUNT, len(topic_links)))
-        log.info(f"🔍 发现 {len(topic_links)} 个主题，随机浏览 {len(picks)} 个")
-
-        # 4. 逐个浏览每个帖子
-        for url in picks:
+        # 3. 按时间预算挑选主题与停留时间：临近截止时缩短停留、减少主题数
+        planner = BrowsePlanner(topics, budget, click_count, started=started)
+        log.info(f"🔍 发现 {len(topics)} 个主题，按时间预算浏览（最多 {click_count} 个）")
+
+        # 4. 逐个浏览，实际耗时回报给规划器修正估算
+        while True:
+            picked = planner.next()
+            if picked is None:
+                break
+            topic, plan = picked
+            url = topic["url"]
             full_url = url if url.startswith("http") else (base_url + url)
-            _browse_one_topic(driver, full_url, base_url)
+            t0 = time.monotonic()
+            summary = _browse_one_topic(driver, full_url, base_url, plan, like_prob)
+            planner.done(topic, time.monotonic() - t0, plan, summary)
 
-        log.info("✅ 浏览任务完成")
-        return True
+        log.info(f"✅ 浏览任务完成：{planner.summary()}")
+        return planner.visited > 0
 
     except Exception as e:
         log.error(f"❌ 浏览任务失败: {e}")
         return False
 
 
-def _browse_one_topic(driver, url: str, base_url: str) -> None:
+def _browse_one_topic(driver, url: str, base_url: str, plan: dict, like_prob: float = LIKE_PROB) -> dict:
     """
     浏览单个帖子
     :param driver: Selenium WebDriver 实例
     :param url: 帖子 URL
     :param base_url: 网站基础地址
+    :param plan: 滚动计划（由 BrowsePlanner 按剩余时间生成）
+    :param like_prob: 点赞概率
+    :return: 滚动摘要（出错时为空）
     """
     original_window = driver.current_window_handle
+    summary = {}
     
     try:
         # 1. 新开一个标签页访问帖子
         driver.execute_script("window.open('');")
         driver.switch_to.window(driver.window_handles[-1])
-        driver.get(url)
+        ensure_page(driver, url)
         time.sleep(random.uniform(1.2, 2.2))
 
         # 2. 根据概率决定是否点赞
-        if random.random() < LIKE_PROB:
+        if random.random() < like_prob:
             _try_like(driver)
 
         # 3. 模拟滚动阅读
-        _auto_scroll(driver)
+        summary = _auto_scroll(driver, plan)
 
     except Exception as e:
         log.debug(f"浏览帖子出错: {e}")
@@ -99,39 +120,23 @@ def _browse_one_topic(driver, url: str, base_url: str) -> None:
                 driver.switch_to.window(original_window)
         except Exception:
             pass
+    return summary
 
 
-def _auto_scroll(driver) -> None:
+def _auto_scroll(driver, plan: dict) -> dict:
     """
-    模拟真人滚动页面
+    模拟真人滚动页面（整个滚动 / 停留循环在页面内执行，只需一次调用）
     :param driver: Selenium WebDriver 实例
+    :param plan: 滚动计划（默认随机 6~10 次、每次 520~700 像素、停顿 1.8~3.5 秒，7% 概率提前结束）
+    :return: 滚动摘要
     """
-    prev_url = None
-    
-    # 随机滚动 6~10 次
-    for _ in range(random.randint(6, 10)):
-        # 每次滚动 520~700 像素
-        distance = random.randint(520, 700)
-        driver.execute_script(f"window.scrollBy(0, {distance})")
-        
-        # 随机停顿 1.8~3.5 秒，模拟阅读
-        time.sleep(random.uniform(1.8, 3.5))
-
-        # 检查是否到达页面底部
-        at_bottom = driver.execute_script(
-            "return window.scrollY + window.innerHeight >= document.body.scrollHeight;"
-        )
-        cur_url = driver.current_url
-
-        if cur_url != prev_url:
-            prev_url = cur_url
-        elif at_bottom and prev_url == cur_url:
-            # 已到底部，停止滚动
-            break
-
-        # 7% 概率提前结束（模拟真人随机行为）
-        if random.random() < 0.07:
-            break
+    driver.set_script_timeout(plan_timeout(plan))
+    summary = driver.execute_async_script(SELENIUM_SCROLL_JS, plan) or {}
+    log.debug(
+        f"滚动完成: {summary.get('steps')} 次, 到底={summary.get('bottom')}, "
+        f"URL 变化 {summary.get('url_changes')} 次"
+    )
+    return summary
 
 
 def _try_like(driver) -> None:
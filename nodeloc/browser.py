@@ -1,16 +1,28 @@
 # -*- coding: utf-8 -*-
 import os
+import time
 import logging
+import weakref
+import threading
 import undetected_chromedriver as uc
 
+from governor import get_governor
+from nav_planner import NavPlanner, any_page
+from nav_trace import NavTracer, NAV_TIMING_JS
+from driver_cache import prepare_driver
+import reaper
+
 log = logging.getLogger(__name__)
 
 # 从环境变量获取 Chrome 可执行文件路径（可选）
 CHROME_EXECUTABLE_PATH = os.environ.get("CHROME_EXECUTABLE_PATH", None)
 
 
-def create_browser(headless: bool = True):
-    """创建并返回 Chrome WebDriver"""
+def create_browser(headless: bool = True, proxy: str = None):
+    """
+    创建并返回 Chrome WebDriver
+    :param proxy: --proxy-server 地址（proxy_pool.browser_proxy 的结果），None 表示直连
+    """
     options = uc.ChromeOptions()
 
     base_args = [
@@ -28,18 +40,30 @@ def create_browser(headless: bool = True):
     if headless:
         options.add_argument("--headless=new")
 
+    if proxy:
+        options.add_argument(f"--proxy-server={proxy}")
+
     options.add_argument(
         "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
         "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0 Safari/537.36"
     )
 
     try:
+        t0 = time.monotonic()
+        # 使用按 Chrome 版本缓存、已修补好的 chromedriver（uc 不再每次下载 / 修补）
+        driver_path, version_main = prepare_driver(CHROME_EXECUTABLE_PATH)
+        kwargs = {}
+        if driver_path:
+            kwargs.update(driver_executable_path=driver_path, version_main=version_main)
         # 如果指定了 Chrome 路径，则使用指定的路径
         if CHROME_EXECUTABLE_PATH:
-            driver = uc.Chrome(options=options, browser_executable_path=CHROME_EXECUTABLE_PATH)
-        else:
-            driver = uc.Chrome(options=options)
+            kwargs["browser_executable_path"] = CHROME_EXECUTABLE_PATH
+        driver = uc.Chrome(options=options, **kwargs)
         driver.set_window_size(1920, 1080)
+        log.info(f"🚀 浏览器启动耗时 {time.monotonic() - t0:.1f}s（chromedriver: {driver_path or 'uc 自动下载修补'}）")
+
+        # 登记浏览器进程与用户目录：没关干净时由 reaper 在下次启动 / 退出时回收
+        reaper.register(getattr(driver, "browser_pid", None), getattr(driver, "user_data_dir", "") or "", "uc")
 
         # 反自动化基础伪装
         driver.execute_script("Object.defineProperty(navigator,'webdriver',{get:()=>false})")
@@ -53,20 +77,185 @@ def create_browser(headless: bool = True):
         return None
 
 
-def inject_cookies(driver, base_url: str, cookie_str: str, domain: str):
-    """向浏览器注入 Cookie"""
-    driver.get(base_url)
+def browser_pids(driver) -> list:
+    """Chrome 与 chromedriver 的 pid（不隔离账号时登记给进程内看门狗，超限时结束）"""
+    service = getattr(driver, "service", None)
+    return [getattr(driver, "browser_pid", None), getattr(getattr(service, "process", None), "pid", None)]
+
+
+def quit_browser(driver):
+    """关闭浏览器；quit() 失败或 Chrome 没退干净时由 reaper 当场结束残留进程"""
+    pid = getattr(driver, "browser_pid", None)
+    try:
+        driver.quit()
+    except Exception as e:
+        log.warning(f"⚠️ 浏览器关闭失败: {e}")
+    killed = reaper.release(pid)
+    if killed:
+        log.warning(f"🧹 浏览器未正常退出，已结束残留进程 {killed} 个")
+
+
+def open_url(driver, url: str):
+    """经全局 governor 限速后再导航；NAV_TRACE 时记录这次页面加载的指标"""
+    get_governor().acquire(url)
+    tracer = nav_tracer(driver)
+    if not tracer.enabled:
+        driver.get(url)
+        return
+
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+    except Exception:
+        pass
+    t0 = time.monotonic()
+    driver.get(url)
+    wall = time.monotonic() - t0
+    try:
+        timing = driver.execute_script(NAV_TIMING_JS)
+    except Exception:
+        timing = None
+    try:
+        metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})
+    except Exception:
+        metrics = None
+    trace = tracer.record(url, wall, timing, metrics)
+    log.debug(f"⏱️ {NavTracer.describe(trace)}")
+
+
+class BrowserPool:
+    """
+    多个站点 / 账号共用的浏览器池
+    同时最多 size 个浏览器；账号用完后清空 Cookie、关掉多余标签页再交给下一个账号，不必每个账号重启 Chrome
+    """
+
+    def __init__(self, size: int = 1):
+        self._sem = threading.Semaphore(max(1, size))
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def acquire(self):
+        """取一个浏览器（池满时等待）；启动失败返回 None"""
+        self._sem.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        driver = create_browser()
+        if driver is None:
+            self._sem.release()
+        return driver
+
+    def release(self, driver):
+        """清理后放回池中；清理失败则直接关闭"""
+        try:
+            for handle in driver.window_handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+            try:
+                driver.execute_script("localStorage.clear(); sessionStorage.clear();")
+            except Exception:
+                pass
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.get("about:blank")
+            _nav_planners.pop(driver, None)
+            _nav_tracers.pop(driver, None)
+            with self._lock:
+                self._idle.append(driver)
+        except Exception as e:
+            log.warning(f"⚠️ 浏览器清理失败，直接关闭: {e}")
+            quit_browser(driver)
+        finally:
+            self._sem.release()
 
+    def close(self):
+        """关闭池中所有空闲浏览器"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            quit_browser(driver)
+
+
+# 每个浏览器一个导航规划器（浏览器关闭后自动释放）
+_nav_planners = weakref.WeakKeyDictionary()
+
+
+def nav_planner(driver) -> NavPlanner:
+    """获取该浏览器的导航规划器（统计导航 / 跳过次数）"""
+    planner = _nav_planners.get(driver)
+    if planner is None:
+        planner = NavPlanner(open_url, lambda d: d.current_url)
+        _nav_planners[driver] = planner
+    return planner
+
+
+# 每个浏览器一个页面加载追踪器（NAV_TRACE 关闭时不采集）
+_nav_tracers = weakref.WeakKeyDictionary()
+
+
+def nav_tracer(driver) -> NavTracer:
+    """获取该浏览器的页面加载追踪器"""
+    tracer = _nav_tracers.get(driver)
+    if tracer is None:
+        tracer = NavTracer()
+        _nav_tracers[driver] = tracer
+    return tracer
+
+
+def ensure_page(driver, url: str, ready=None, fresh: bool = False) -> bool:
+    """
+    只有当前页面不满足需要时才导航
+    :param ready: 判断当前页面是否已具备所需状态的函数（如签到按钮已存在），满足时不导航
+    :param fresh: 为 True 时总是重新加载
+    :return: 是否真的发生了导航
+    """
+    return nav_planner(driver).ensure(driver, url, ready=ready, fresh=fresh)
+
+
+def _parse_cookie_str(cookie_str: str) -> list:
+    """把 "a=1; b=2" 解析成 [(name, value)]"""
+    pairs = []
     for item in cookie_str.split(";"):
         item = item.strip()
         if not item or "=" not in item:
             continue
-
         name, value = item.split("=", 1)
+        pairs.append((name.strip(), value.strip()))
+    return pairs
+
+
+def inject_cookies(driver, base_url: str, cookie_str: str, domain: str):
+    """
+    向浏览器注入 Cookie
+    优先通过 CDP Network.setCookies 一次性写入，不需要先打开页面，第一次导航就已带上登录态；
+    CDP 不可用时退回 WebDriver add_cookie（需要先打开站点页面）
+    """
+    pairs = _parse_cookie_str(cookie_str)
+    cookies = [
+        {
+            "name": name,
+            "value": value,
+            "domain": domain,
+            "path": "/",
+            "secure": True,
+            "httpOnly": False,
+        }
+        for name, value in pairs
+    ]
+    try:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        log.info(f"🍪 已通过 CDP 写入 {len(cookies)} 个 Cookie")
+        return
+    except Exception as e:
+        log.warning(f"⚠️ CDP 批量写入 Cookie 失败，改为逐个注入: {e}")
+
+    # 兜底：WebDriver 只能给当前域名写 Cookie，先打开站点（已在站内则不用）
+    ensure_page(driver, base_url, ready=any_page)
+
+    for name, value in pairs:
         try:
             driver.add_cookie({
-                "name": name.strip(),
-                "value": value.strip(),
+                "name": name,
+                "value": value,
                 "domain": domain,
                 "path": "/",
                 "secure": True,
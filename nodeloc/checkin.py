@@ -8,27 +8,33 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import TimeoutException
 
+from browser import ensure_page
+from sites import default_site
+from checkin_watch import STATE_JS, WATCH_JS, poll_dom, wait_confirmed, watch_args
+
 log = logging.getLogger(__name__)
 
 # ================== 站点配置 ==================
-DOMAIN = "www.nodeloc.com"
-BASE_URL = f"https://{DOMAIN}"
-USER_PAGE = f"{BASE_URL}/u/"
-COOKIE_DOMAIN = f".{DOMAIN}"
-
-CHECKIN_BUTTON = "li.header-dropdown-toggle.checkin-icon button.checkin-button"
+# 默认站点（NODELOC_BASE_URL，默认 NodeLoc）；多站点时各函数传入 site（见仓库根目录 sites.py）
+SITE = default_site()
+DOMAIN = SITE.host
+BASE_URL = SITE.base_url
+USER_PAGE = SITE.user_page
+COOKIE_DOMAIN = SITE.cookie_domain
+
+CHECKIN_BUTTON = SITE.checkin_button
 USERNAME_SELECTOR = "div.directory-table__row.me a[data-user-card]"
 LOGIN_OK_SELECTOR = "div.directory-table__row.me"
 # ============================================
 
 
-def wait_login_success(driver, timeout=15) -> bool:
+def wait_login_success(driver, timeout=15, site=SITE) -> bool:
     """判断是否登录成功"""
     try:
         WebDriverWait(driver, timeout).until(
             EC.any_of(
                 EC.presence_of_element_located((By.CSS_SELECTOR, LOGIN_OK_SELECTOR)),
-                EC.presence_of_element_located((By.CSS_SELECTOR, CHECKIN_BUTTON)),
+                EC.presence_of_element_located((By.CSS_SELECTOR, site.checkin_button)),
             )
         )
         return True
@@ -47,11 +53,11 @@ def get_username(driver) -> str:
         return "未知用户"
 
 
-def hover_checkin(driver):
+def hover_checkin(driver, site=SITE):
     """触发签到按钮 hover"""
     try:
         btn = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, CHECKIN_BUTTON))
+            EC.presence_of_element_located((By.CSS_SELECTOR, site.checkin_button))
         )
         ActionChains(driver).move_to_element(btn).perform()
         time.sleep(1)
@@ -66,15 +72,34 @@ def already_checked_in(button) -> bool:
     return "checked-in" in cls or disabled
 
 
-def do_checkin(driver, username: str) -> str:
+def checked_in_now(driver, site=SITE) -> bool:
+    """重新查询按钮判断是否已签到（不复用点击前的元素句柄，页面重新渲染后它可能已过期）"""
+    buttons = driver.find_elements(By.CSS_SELECTOR, site.checkin_button)
+    return bool(buttons) and bool(already_checked_in(buttons[0]))
+
+
+def watch_checkin(driver, site=SITE) -> bool:
+    """点击前在页面内监听签到 XHR 与 MessageBus 推送，见仓库根目录 checkin_watch.py"""
+    try:
+        res = driver.execute_script(WATCH_JS, *watch_args(site.checkin_button, site.checkin_endpoint))
+    except Exception as e:
+        log.debug(f"签到监听安装失败: {e}")
+        return False
+    log.debug(f"已监听签到请求，MessageBus 频道: {(res or {}).get('channels') or '无'}")
+    return True
+
+
+def do_checkin(driver, username: str, site=SITE) -> str:
     """执行签到流程"""
-    driver.get(BASE_URL)
+    # 签到按钮在顶部导航栏，站内任意页面（如登录检查用的用户页）都有，已存在就不用再打开首页
+    ensure_page(driver, site.base_url,
+                ready=lambda d: bool(d.find_elements(By.CSS_SELECTOR, site.checkin_button)))
 
-    hover_checkin(driver)
+    hover_checkin(driver, site)
 
     try:
         button = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, CHECKIN_BUTTON))
+            EC.presence_of_element_located((By.CSS_SELECTOR, site.checkin_button))
         )
     except TimeoutException:
         return f"[❌] {username} 未找到签到按钮"
@@ -85,12 +110,18 @@ def do_checkin(driver, username: str) -> str:
     log.info(f"📌 {username} 执行签到")
     driver.execute_script("arguments[0].scrollIntoView({block:'center'});", button)
     time.sleep(1)
+    watching = watch_checkin(driver, site)
     driver.execute_script("arguments[0].click();", button)
-    time.sleep(3)
 
-    hover_checkin(driver)
-
-    if already_checked_in(button):
-        return f"[🎉] {username} 签到成功"
-    else:
-        return f"[⚠️] {username} 签到状态未确认"
+    # 服务端确认（签到接口响应 / MessageBus 推送）或按钮状态变化时立即返回，没有结论时回退为按钮状态轮询
+    ok, how = wait_confirmed(lambda: driver.execute_script(STATE_JS)) if watching else (None, "未监听")
+    if ok is None:
+        log.debug(f"签到未收到确认（{how}），回退为按钮状态轮询")
+        ok = poll_dom(lambda: checked_in_now(driver, site))
+        how = "按钮状态轮询" if ok else "按钮状态未变化"
+
+    if ok:
+        return f"[🎉] {username} 签到成功（{how}）"
+    if how.startswith("签到接口"):
+        return f"[❌] {username} 签到失败（{how}）"
+    return f"[⚠️] {username} 签到状态未确认"
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+chromedriver 缓存模块
+undetected_chromedriver 默认每次启动都会删除、重新下载（最新稳定版，不一定与本机 Chrome 匹配）并修补
+同一个 chromedriver 文件，多个账号并行启动时还会删掉对方正在使用的文件。
+这里按本机 Chrome 的主版本准备一次修补好的 chromedriver，放进按版本分目录的缓存，之后每次 create_browser()
+都直接使用：uc 发现传入的驱动已经修补过，就不再下载 / 复制 / 修补。
+准备过程持有跨进程文件锁，写入临时文件后原子替换，并发启动的进程不会看到半个文件。
+"""
+import os
+import re
+import shutil
+import logging
+import threading
+import subprocess
+from typing import Optional, Tuple
+
+import undetected_chromedriver as uc
+
+from checkin_state import DATA_DIR, file_lock
+from launch_profile import binary_version
+
+log = logging.getLogger(__name__)
+
+# ================== 驱动缓存配置（从环境变量读取）==================
+# 是否使用 chromedriver 缓存（false 时恢复 uc 每次启动自行下载修补）
+UC_DRIVER_CACHE = os.environ.get("UC_DRIVER_CACHE", "true").lower() == "true"
+# 缓存目录（按 Chrome 主版本分子目录）
+DRIVER_CACHE_DIR = os.environ.get("DRIVER_CACHE_DIR") or os.path.join(DATA_DIR, "chromedriver")
+# 本机已有的 chromedriver（版本与 Chrome 一致时复制后修补，无需下载），默认在 PATH 中查找
+CHROMEDRIVER_PATH = os.environ.get("CHROMEDRIVER_PATH", "")
+# ==============================================================
+
+# uc 修补后写入驱动的标记
+_PATCH_MARK = b"undetected chromedriver"
+_EXE_NAME = "chromedriver.exe" if os.name == "nt" else "chromedriver"
+
+_prepared = {}
+_lock = threading.Lock()
+
+
+def _major(version: str) -> int:
+    m = re.search(r"(\d+)\.\d+", version or "")
+    return int(m.group(1)) if m else 0
+
+
+def _driver_major(path: str) -> int:
+    """`chromedriver --version` 的主版本号，拿不到时为 0"""
+    try:
+        out = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10)
+        return _major(out.stdout)
+    except (OSError, subprocess.SubprocessError):
+        return 0
+
+
+def _is_patched(path: str) -> bool:
+    try:
+        with open(path, "rb") as fh:
+            return fh.read().find(_PATCH_MARK) != -1
+    except OSError:
+        return False
+
+
+def _build(exe: str, major: int) -> None:
+    """
+    准备一个修补好的 chromedriver：本机 chromedriver 版本匹配时复制，否则下载该主版本
+    所有中间文件都在缓存目录内，修补完成后原子替换到 exe
+    """
+    d = os.path.dirname(exe)
+    os.makedirs(d, exist_ok=True)
+    tmp = os.path.join(d, f".tmp-{os.getpid()}-{_EXE_NAME}")
+    src = CHROMEDRIVER_PATH or shutil.which("chromedriver") or ""
+    try:
+        if src and _driver_major(src) == major:
+            log.info(f"🔧 复制本机 chromedriver {src}（Chrome {major}）")
+            shutil.copyfile(src, tmp)
+            os.chmod(tmp, 0o755)
+            patcher = uc.Patcher(executable_path=tmp, version_main=major)
+        else:
+            log.info(f"⬇️ 下载 Chrome {major} 对应的 chromedriver")
+            patcher = uc.Patcher(executable_path=tmp, version_main=major)
+            # 解压目录放在缓存内，不与 uc 默认的共享目录冲突
+            patcher.zip_path = tmp + ".unzip"
+            patcher.version_full = patcher.fetch_release_number()
+            patcher.unzip_package(patcher.fetch_package())
+        if not _is_patched(tmp):
+            patcher.patch_exe()
+        if not _is_patched(tmp):
+            raise RuntimeError("chromedriver 修补失败（未找到注入代码）")
+        os.replace(tmp, exe)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def prepare_driver(browser_path: Optional[str] = None) -> Tuple[Optional[str], int]:
+    """
+    返回 (修补好的 chromedriver 路径, Chrome 主版本)，供 uc.Chrome(driver_executable_path=..., version_main=...) 使用
+    未启用缓存或准备失败时返回 (None, 0)，由 uc 按原来的方式自行处理
+    :param browser_path: Chrome 可执行文件路径，默认由 uc 查找
+    """
+    if not UC_DRIVER_CACHE:
+        return None, 0
+    binary = browser_path or uc.find_chrome_executable()
+    major = _major(binary_version(binary))
+    if not major:
+        log.warning(f"⚠️ 无法获取 Chrome 版本（{binary}），不使用 chromedriver 缓存")
+        return None, 0
+
+    with _lock:
+        exe = _prepared.get(major)
+        if exe and os.path.exists(exe):
+            return exe, major
+        exe = os.path.join(DRIVER_CACHE_DIR, str(major), _EXE_NAME)
+        try:
+            if not _is_patched(exe):
+                # 跨进程加锁：并行启动的多个进程只有一个下载修补，其余等它完成后直接使用
+                with file_lock(exe):
+                    if not _is_patched(exe):
+                        _build(exe, major)
+        except Exception as e:
+            log.warning(f"⚠️ chromedriver 缓存准备失败，由 undetected_chromedriver 自行处理: {e}")
+            return None, 0
+        _prepared[major] = exe
+        return exe, major
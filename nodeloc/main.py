@@ -4,26 +4,61 @@
 # ================== 导入模块 ==================
 # 导入操作系统模块，用于读取环境变量等
 import os
-# 导入时间模块，用于程序暂停（sleep）
-import time
+# 导入系统模块，用于把仓库根目录加入模块搜索路径
+import sys
 # 导入日志模块，用于输出运行日志
 import logging
+# 导入线程池，用于多个站点同时处理
+from concurrent.futures import ThreadPoolExecutor
 
-# 从 browser.py 文件中导入创建浏览器和注入 Cookie 的函数
-from browser import create_browser, inject_cookies
-
-# 从 checkin.py 文件中导入签到相关的配置和函数
-from checkin import (
-    BASE_URL,            # 网站的基础网址
-    USER_PAGE,           # 用户个人中心页面地址
-    COOKIE_DOMAIN,       # Cookie 的作用域（域名）
-    wait_login_success,  # 等待并检查是否登录成功的函数
-    get_username,        # 获取当前登录用户名的函数
-    do_checkin,          # 执行核心签到动作的函数
-)
+# 仓库根目录下有两套实现共用的通用模块（如 governor.py），追加到搜索路径末尾
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 从 governor.py 导入全局请求调度器（按 host / 账号限速）
+from governor import get_governor
+
+# 从 backends.py 导入任务后端选择器（按历史成功率与耗时选择后端）
+from backends import BackendSelector, available_backends, close_all
+
+# 从 account_tasks.py 导入两种后端：纯 HTTP 与 undetected_chromedriver 浏览器
+from account_tasks import HttpBackend, UcBackend
+
+# 从 sites.py 导入站点注册表（可同时给多个 Discourse 论坛签到）
+from sites import load_sites
+
+# 从 browser.py 导入共享浏览器池（多个站点 / 账号复用浏览器）
+from browser import BrowserPool
+
+# 从 checkin_state.py 导入签到状态缓存（今天已签到的账号跳过签到）
+from checkin_state import CheckinState, account_key, save_json, site_today
+
+# 从 preflight.py 导入 Cookie 预检功能（启动浏览器前并发验证 Cookie）
+from preflight import validate_cookies, PREFLIGHT_ENABLED, DEAD
+
+# 从 browse.py 导入浏览功能开关
+from browse import BROWSE_ENABLED
+from browse_planner import run_deadline
+
+# 从 run_history.py 导入运行历史记录（各阶段耗时写入本地 SQLite，python run_history.py 查看报表）
+from run_history import RunRecorder, AccountRecord
 
-# 从 browse.py 导入浏览点赞功能
-from browse import browse_topics, BROWSE_ENABLED
+# 从 supervisor.py 导入账号级子进程隔离（分阶段时限、内存上限、超时结束整棵进程树）
+from supervisor import ISOLATE_ACCOUNTS, Watchdog, run_supervised
+
+# 从 reaper.py 导入遗留浏览器进程 / 临时用户目录回收
+from reaper import reap
+
+# 从 proxy_pool.py 导入按账号分配的出口代理池（PROXIES 未配置时直连）
+from proxy_pool import get_proxy_pool
+
+# 从 account_source.py 导入账号分批读取（账号来自环境变量 / 文件 / 目录 / SQLite，逐个读取）
+from account_source import chunked
+
+# 从 profiling.py 导入按阶段剖析（PROFILE=sample / cprofile 时输出调用栈与 CPU / 墙钟时间）
+from profiling import PROFILE, PhaseProfiler, run_id
+
+# 从 work_queue.py 导入账号任务队列（多进程 / 多机器领取账号，带租约、重试与死信）
+from work_queue import WORK_QUEUE, QUEUE_ROLE, ForeignTask, open_queue, batch_name, run_worker, worker_id
 
 # 从 notify.py 导入推送通知功能
 from notify import send_notification, build_result_message
@@ -40,101 +75,407 @@ log = logging.getLogger(__name__)
 # ==============================================
 
 
-def process_account(cookie: str) -> dict:
+# ================== 运行配置 ==================
+# 所有站点共用的浏览器数量上限（同时在跑的浏览器最多这么多个）
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+# 队列模式下不再重试的结果（成功 / 跳过 / Cookie 失效），其余结果按退避重试
+QUEUE_FINAL_OUTCOMES = ("ok", "skipped", "dead")
+# 作为根目录 nodeloc.py 的 uc 后端运行时，由父进程指定：运行结束后把结果（是否登录 / 签到 / 浏览成功）写入该文件
+RESULT_FILE = os.environ.get("NODELOC_RESULT_FILE", "").strip()
+# ==============================================
+
+
+def process_account(site, cookie: str, skip_checkin: bool = False, record=None, pool=None, reporter=None,
+                    options=None) -> dict:
     """
     处理单个账号的签到流程
+    每个任务由 BackendSelector 选择最近成功过、成本最低的后端（纯 HTTP / 浏览器），失败时逐级升级
+    :param site: 站点配置（sites.Site）
     :param cookie: 账号的 Cookie 字符串
+    :param skip_checkin: 本地记录显示今日已签到时为 True，只执行浏览
+    :param record: 运行历史记录（run_history.AccountRecord），为 None 时不记录
+    :param pool: 共享浏览器池，为 None 时单独启动浏览器
+    :param reporter: 子进程隔离时的进度回传（supervisor.Reporter），不隔离时为进程内看门狗（supervisor.Watchdog）
+    :param options: 按账号覆盖的配置（account_source.Account.overrides）
     :return: 包含签到结果和浏览结果的字典
     """
     result = {
         "checkin_msg": "",
         "login_ok": False,
         "browsed": False,
+        "checked_in": False,
     }
-    
-    # 1. 启动浏览器
-    driver = create_browser()
-    if not driver:
-        result["checkin_msg"] = "[❌] 浏览器启动失败"
-        return result
 
-    try:
-        # 2. 注入 Cookie 并访问用户中心
-        inject_cookies(driver, BASE_URL, cookie, COOKIE_DOMAIN)
-        driver.get(USER_PAGE)
+    account = account_key(cookie)
+    http = HttpBackend(site, cookie)
+    uc = UcBackend(site, cookie, pool=pool, options=options, reporter=reporter)
+    backends = available_backends([http, uc])
+    selector = BackendSelector()
+    # PROFILE 开启时按阶段剖析（墙钟 / CPU 时间、调用栈），未开启时不做任何事
+    profiler = PhaseProfiler(account)
 
-        # 3. 检查登录状态
-        if not wait_login_success(driver):
-            result["checkin_msg"] = "[❌] 登录失败，Cookie 可能失效"
-            return result
+    def _progress():
+        # 每完成一步就把当前结果回传父进程，之后的步骤卡死被强制结束时不丢失
+        if reporter:
+            result["login_ok"] = http.logged_in or uc.logged_in
+            reporter.update(**result, phases=list(record.phases) if record else [])
 
-        result["login_ok"] = True
-
-        # 4. 获取用户名
-        username = get_username(driver)
-        log.info(f"👤 当前账号: {username}")
-
-        # 5. 执行签到
-        result["checkin_msg"] = do_checkin(driver, username)
+    try:
+        # 1. 执行签到（本地记录今日已签到则跳过）
+        if not skip_checkin:
+            if reporter:
+                reporter.phase("checkin")
+            with profiler.phase("checkin"):
+                ok, used = selector.run(account, "checkin", backends, log=log.info)
+            if record:
+                record.add_attempts("checkin", selector.attempts)
+            result["checked_in"] = ok
+            # 后端抛异常或一个都没试到时 msg 为空，汇总推送中仍要有这个账号的一行
+            result["checkin_msg"] = (http if used == "http" else uc).msg or f"[❌] 签到失败（{used or '无可用后端'}）"
+            _progress()
 
-        # 6. 执行浏览点赞任务（如果启用）
+        # 2. 执行浏览点赞任务（如果启用）
         if BROWSE_ENABLED:
-            result["browsed"] = browse_topics(driver, BASE_URL)
+            if reporter:
+                reporter.phase("browse")
+            with profiler.phase("browse"):
+                result["browsed"], _ = selector.run(account, "browse", backends, log=log.info)
+            if record:
+                record.add_attempts("browse", selector.attempts)
+
+        result["login_ok"] = http.logged_in or uc.logged_in
+        if skip_checkin:
+            if result["login_ok"] or not BROWSE_ENABLED:
+                name = uc.username or http.username or "账号"
+                result["checkin_msg"] = f"[✅] {name} 今日已签到（本地记录）"
+            else:
+                result["checkin_msg"] = uc.msg or http.msg
 
         return result
 
     finally:
         # 无论成功失败，最后都关闭浏览器
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        close_all(backends)
+        profiler.close(log=log.info)
+        if record:
+            # 浏览器启动耗时单独记为 launch 阶段（run_history 报表中对比 chromedriver 缓存前后）
+            if uc.launch:
+                record.add_phase("launch", uc.launch[0], uc.launch[1], uc.name)
+            for b in backends:
+                record.add_traces(b.traces)
+
+
+def _account_worker(reporter, site, cookie: str, skip_checkin: bool, account: str, options=None) -> dict:
+    """
+    子进程入口：在独立进程中处理单个账号
+    运行历史的阶段记录、重试次数和流量随结果一起交回父进程写库
+    """
+    governor = get_governor()
+    record = AccountRecord(None, account_key(cookie))
+    with governor.bind_account(account):
+        result = process_account(site, cookie, skip_checkin=skip_checkin, record=record, reporter=reporter,
+                                 options=options)
+    result.update(
+        phases=record.phases,
+        traces=record.traces,
+        retries=record.retries,
+        backend=record.backend,
+        bytes=governor.account_bytes(account),
+    )
+    return result
+
+
+def _run_isolated(site, cookie: str, skip_checkin: bool, account: str, record, options=None) -> dict:
+    """
+    在受监督的子进程中处理单个账号：超时 / 超内存时结束整棵进程树（含浏览器），
+    返回已回传的部分结果，汇总推送照常进行
+    """
+    res = run_supervised(_account_worker, site, cookie, skip_checkin, account, options)
+    data = res["value"] if res["status"] == "done" else res["partial"]
+    result = {"checkin_msg": "", "login_ok": False, "browsed": False, "checked_in": False}
+    result.update({k: data[k] for k in result if k in data})
+
+    for name, duration, ok, backend in data.get("phases", []):
+        record.add_phase(name, duration, ok, backend)
+    record.add_traces(data.get("traces"))
+    record.retries = data.get("retries", 0)
+    record.bytes = data.get("bytes", 0)
+    record.backend = data.get("backend", "")
+
+    if res["status"] != "done":
+        log.error(f"⏱️ 账号工作进程被终止: {res['reason'] or res['status']}")
+        _mark_killed(result, res, record)
+    return result
+
+
+def _mark_killed(result: dict, res: dict, record) -> None:
+    """超时 / 超内存（或工作进程异常）被结束：补记超限的阶段，结果消息注明原因"""
+    if res["phase"] and res["status"] in ("timeout", "memory"):
+        record.add_phase(res["phase"], res["phase_elapsed"], False)
+    note = f"（{res['reason'] or res['status']}）"
+    result["checkin_msg"] = (result["checkin_msg"] or "[❌] 账号处理中断") + note
+    result["killed"] = res["status"]
+
+
+def run_account(site, idx: int, cookie: str, done: bool, check, pool, history: RunRecorder, options=None) -> dict:
+    """
+    处理一个账号并写入运行历史与签到记录（process_site 与队列工作进程共用）
+    :param idx: 账号在该站点中的序号（从 1 开始）
+    :param options: 按账号覆盖的配置
+    :param done: 本地记录显示今日已签到
+    :param check: Cookie 预检结果，未预检时为 None
+    :return: process_account 的结果，另含 outcome（写入运行历史的结果）
+    """
+    governor = get_governor()
+    record = history.account(account_key(cookie))
+    if check:
+        record.add_phase("preflight", check.get("elapsed", 0.0), check["status"] != DEAD)
+    if check and check["status"] == DEAD:
+        record.finish("dead")
+        return {
+            "checkin_msg": f"[❌] 账号 {idx} Cookie 已失效（预检: {check['reason']}），请重新获取",
+            "login_ok": False, "browsed": False, "checked_in": False, "outcome": "dead",
+        }
+
+    result = {"login_ok": False}
+    try:
+        if ISOLATE_ACCOUNTS:
+            # 独立进程不能共用浏览器池，每个账号自己启动浏览器
+            result = _run_isolated(site, cookie, done, f"{site.name}-{idx}", record, options)
+        else:
+            # 在本进程中执行（共用浏览器池与主机令牌桶），时限与内存上限由看门狗执行：超限时结束本账号的浏览器
+            with governor.bind_account(f"{site.name}-{idx}"), Watchdog(log=log.error) as dog:
+                result = process_account(site, cookie, skip_checkin=done, record=record, pool=pool, reporter=dog,
+                                         options=options)
+            # 流量按 governor 统计（浏览器内的请求不经过 governor，不计入）
+            record.bytes = governor.account_bytes(f"{site.name}-{idx}")
+            if dog.tripped:
+                _mark_killed(result, dog.res, record)
+    finally:
+        if result.get("killed"):
+            outcome = result["killed"]
+        elif not result["login_ok"]:
+            outcome = "failed"
+        elif done or result["checked_in"]:
+            outcome = "ok"
+        else:
+            outcome = "checkin_failed"
+        result["outcome"] = outcome
+        record.finish(outcome)
+
+    if result["checked_in"]:
+        CheckinState().mark(site.base_url, account_key(cookie))
+    return result
+
+
+def process_site(site, accounts, pool: BrowserPool, history: RunRecorder, prefix: str = "") -> dict:
+    """
+    处理一个站点的所有账号（站点内逐个账号处理，不同站点由 main() 并行调度）
+    账号按 ACCOUNT_CHUNK 分批从来源读取，每批并发预检后逐个处理，账号再多内存占用也不增长
+    :param site: 站点配置（sites.Site）
+    :param accounts: 该站点的账号（account_source.Account 的可迭代对象，逐个读取）
+    :param pool: 共享浏览器池
+    :param history: 运行历史记录器
+    :param prefix: 结果消息前缀（多站点时为站点名）
+    :return: {"results": 结果消息列表, "login_ok": 是否有账号登录成功, "browsed": 是否有账号完成浏览,
+              "checked_in": 是否所有账号今日都已签到}
+    """
+    results = []           # 签到结果消息列表
+    any_login_ok = False   # 是否有任何账号登录成功
+    any_browsed = False    # 是否有任何账号完成了浏览
+    all_checked_in = True  # 是否所有账号今日都已签到
+
+    state = CheckinState()
+
+    def _report(msg: str):
+        msg = prefix + msg
+        log.info(msg)
+        results.append(msg)
+
+    for chunk in chunked(enumerate(accounts, 1)):
+        # 1. 查询本地签到记录：今天已签到的账号不再签到；未启用浏览时直接结束
+        pending = []
+        for idx, account in chunk:
+            if not account.cookie:
+                _report(f"[❌] 账号 {idx} 未提供 Cookie（本实现只支持 Cookie 登录）")
+                all_checked_in = False
+                continue
+            done = state.checked_in_today(site.base_url, account_key(account.cookie))
+            if done and not BROWSE_ENABLED:
+                _report(f"[✅] 账号 {idx} 今日（{site_today()}）已签到（本地记录）")
+                history.account(account_key(account.cookie)).finish("skipped")
+            else:
+                pending.append((idx, account, done))
+
+        # 2. 预检 Cookie：失效账号直接判定失败，不再启动浏览器
+        if PREFLIGHT_ENABLED and pending:
+            checks = validate_cookies(
+                site.base_url,
+                [account.cookie for _, account, _ in pending],
+                accounts=[f"{site.name}-{idx}" for idx, _, _ in pending],
+            )
+        else:
+            checks = [None] * len(pending)
+
+        # 3. 逐个处理本批账号（访问频率由 governor 按 host / 账号令牌桶统一控制）
+        for (idx, account, done), check in zip(pending, checks):
+            result = run_account(site, idx, account.cookie, done, check, pool, history, account.overrides)
+            _report(result["checkin_msg"])
+            
+            if result["login_ok"]:
+                any_login_ok = True
+            if result["browsed"]:
+                any_browsed = True
+            if not (done or result["checked_in"]):
+                all_checked_in = False
+
+    return {"results": results, "login_ok": any_login_ok, "browsed": any_browsed, "checked_in": all_checked_in}
+
+
+def run_queue(sites: list, pool: BrowserPool, history: RunRecorder):
+    """
+    队列模式：写入当天的账号任务（生产者），再从队列领取账号处理（工作进程）
+    任务只记录站点名、序号和账号标识，Cookie 由工作进程从自己的账号来源中找回，不写入队列
+    工作进程只保留 账号标识 -> 来源中位置 的索引，处理时再按位置读取该账号
+    :param sites: [(站点配置, 账号来源)]
+    :return: 抢到汇总资格时返回与 process_site 相同结构的汇总，否则返回 None
+    """
+    store = open_queue()
+    batch = batch_name()
+    if QUEUE_ROLE in ("all", "producer"):
+        tasks = (
+            {"key": f"{site.name}|{account_key(a.cookie)}",
+             "payload": {"site": site.name, "idx": idx, "account": account_key(a.cookie)}}
+            for site, source in sites for idx, a in enumerate(source, 1) if a.cookie
+        )
+        log.info(f"📤 批次 {batch}：新写入 {store.enqueue(batch, tasks)} 个账号任务")
+        if QUEUE_ROLE == "producer":
+            return None
+
+    known = {
+        site.name: (site, source, {account_key(a.cookie): a.ref for a in source if a.cookie})
+        for site, source in sites
+    }
+    multi = len(sites) > 1
+
+    def handle(payload: dict) -> dict:
+        site, source, refs = known.get(payload["site"], (None, None, {}))
+        account = source.load(refs[payload["account"]]) if payload["account"] in refs else None
+        if account is None or not account.cookie:
+            # 放回队列（不计入尝试次数），让配置了该账号的工作进程领走
+            raise ForeignTask(f"本进程未配置站点 {payload['site']} 的账号 {payload['account']}")
+        cookie = account.cookie
+        idx = payload["idx"]
+        prefix = f"【{site.name}】" if multi else ""
+        done = CheckinState().checked_in_today(site.base_url, payload["account"])
+        if done and not BROWSE_ENABLED:
+            history.account(payload["account"]).finish("skipped")
+            msg = f"[✅] 账号 {idx} 今日（{site_today()}）已签到（本地记录）"
+            return {"msg": prefix + msg, "outcome": "skipped", "login_ok": False, "browsed": False}
+        check = None
+        if PREFLIGHT_ENABLED:
+            check = validate_cookies(site.base_url, [cookie], accounts=[f"{site.name}-{idx}"])[0]
+        result = run_account(site, idx, cookie, done, check, pool, history, account.overrides)
+        log.info(prefix + result["checkin_msg"])
+        return {"msg": prefix + result["checkin_msg"], "outcome": result["outcome"],
+                "login_ok": bool(result["login_ok"]), "browsed": bool(result["browsed"]), "error": result["outcome"]}
+
+    worker = worker_id()
+    handled = run_worker(store, batch, handle, lambda r: r["outcome"] not in QUEUE_FINAL_OUTCOMES,
+                         log=log.info, worker=worker)
+    log.info(f"📦 本进程处理了 {handled} 个账号任务")
+    if not store.claim_summary(batch, worker):
+        log.info(f"📦 批次 {batch} 的汇总推送由其他进程负责（或已发送）")
+        return None
+
+    # 汇总整个批次的结果（包括其他进程处理的账号与死信）
+    results, any_login_ok, any_browsed, all_checked_in = [], False, False, True
+    for task in store.results(batch):
+        res = task["result"] or {}
+        msg = res.get("msg") or f"[❌] {task['key']} 处理失败"
+        if task["status"] == "dead":
+            msg += f"（尝试 {task['attempts']} 次后放弃: {task['error']}）"
+        results.append(msg)
+        any_login_ok = any_login_ok or res.get("login_ok", False)
+        any_browsed = any_browsed or res.get("browsed", False)
+        all_checked_in = all_checked_in and res.get("outcome") in ("ok", "skipped")
+    return {"results": results, "login_ok": any_login_ok, "browsed": any_browsed, "checked_in": all_checked_in}
 
 
 def main():
     """
     主程序入口
     """
-    # 1. 检查环境变量
-    if "NL_COOKIE" not in os.environ:
-        print("❌ 未设置 NL_COOKIE 环境变量")
+    # 1. 读取站点与账号来源（默认为各站点的 Cookie 环境变量，每行一个账号；账号在处理时才逐个读取）
+    sites = [(site, site.account_source()) for site in load_sites()]
+    sites = [(site, source) for site, source in sites if source.first() is not None]
+    if not sites:
+        print("❌ 未设置 NL_COOKIE 环境变量（或 ACCOUNTS_SOURCE 中没有账号）")
         return
 
-    # 2. 解析 Cookie（支持多账号，每行一个）
-    cookies = [
-        line.strip().split("#", 1)[0]
-        for line in os.environ["NL_COOKIE"].splitlines()
-        if line.strip()
-    ]
-
-    log.info(f"✅ 共 {len(cookies)} 个账号，开始签到")
+    log.info(f"✅ 共 {len(sites)} 个站点（账号来源: {', '.join(source.spec for _, source in sites)}），开始签到")
     if BROWSE_ENABLED:
         log.info("📖 浏览点赞功能已启用")
 
-    results = []           # 签到结果消息列表
-    any_login_ok = False   # 是否有任何账号登录成功
-    any_browsed = False    # 是否有任何账号完成了浏览
+    # 启动时先回收上次运行遗留的浏览器进程与临时用户目录
+    reap(log=log.info)
+    # 整次运行的浏览截止时间在启动账号子进程之前确定，所有账号共用
+    run_deadline()
+    if PROFILE:
+        # 剖析文件的运行目录同理，所有账号子进程写入同一个目录
+        run_id()
+
+    governor = get_governor()
+    history = RunRecorder("uc-stack")
+    pool = BrowserPool(BROWSER_POOL_SIZE)
+    for site, _ in sites:
+        if site.rate_per_min or site.rate_burst:
+            governor.set_host_rate(site.host, site.rate_per_min, site.rate_burst)
+
+    # 2. 各站点并行处理：一个站点慢（限速 / 超时）不会拖住其他站点；浏览器由共享池限量复用
+    multi = len(sites) > 1
+    try:
+        if WORK_QUEUE:
+            # 队列模式：多个进程 / 机器从同一个队列领取账号，批次结束后只由一个进程汇总推送
+            outcome = run_queue(sites, pool, history)
+            outcomes = [outcome] if outcome else None
+        elif multi:
+            with ThreadPoolExecutor(max_workers=len(sites), thread_name_prefix="site") as executor:
+                futures = [
+                    executor.submit(process_site, site, source, pool, history, f"【{site.name}】")
+                    for site, source in sites
+                ]
+                outcomes = [f.result() for f in futures]
+        else:
+            site, source = sites[0]
+            outcomes = [process_site(site, source, pool, history)]
+    finally:
+        pool.close()
+        # 退出前再回收一次：quit() 失败、被强制结束的账号进程留下的浏览器
+        reap(final=True, log=log.info)
+
+    if outcomes is None:
+        log.info("✅ 本进程的队列任务已完成")
+        return
+
+    results = [msg for o in outcomes for msg in o["results"]]
+    any_browsed = any(o["browsed"] for o in outcomes)
+    if RESULT_FILE:
+        save_json(RESULT_FILE, {
+            "login_ok": any(o["login_ok"] for o in outcomes),
+            "checked_in": all(o["checked_in"] for o in outcomes),
+            "browsed": any_browsed,
+        })
+
+    log.info(f"🚦 请求调度统计: {governor.summary()}")
+    if get_proxy_pool().enabled:
+        log.info(f"🌐 出口代理: {get_proxy_pool().summary()}")
 
-    # 3. 遍历所有账号
-    for cookie in cookies:
-        result = process_account(cookie)
-        
-        log.info(result["checkin_msg"])
-        results.append(result["checkin_msg"])
-        
-        if result["login_ok"]:
-            any_login_ok = True
-        if result["browsed"]:
-            any_browsed = True
-        
-        # 账号间停顿 5 秒，防止风控
-        time.sleep(5)
-
-    # 4. 输出汇总结果
+    # 3. 输出汇总结果
     print("\n".join(results))
     log.info("✅ 全部完成")
 
-    # 5. 发送推送通知
+    # 4. 发送推送通知
     message = build_result_message(results, BROWSE_ENABLED, any_browsed)
     send_notification("NodeLoc 签到", message)
 
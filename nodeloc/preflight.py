@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Cookie 预检模块
+在启动任何浏览器之前，用纯 HTTP 并发请求 /session/current.json 验证每个账号的 Cookie，
+失效的账号直接判定失败，只有存活的账号才交给浏览器阶段
+"""
+import os
+import time
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from governor import get_governor
+from checkin_state import account_key
+from proxy_pool import PROXY_ERROR_STATUS, get_proxy_pool, proxy_key, requests_proxies
+
+log = logging.getLogger(__name__)
+
+# ================== 预检配置（从环境变量读取）==================
+# 是否启用预检
+PREFLIGHT_ENABLED = os.environ.get("PREFLIGHT_ENABLED", "true").lower() == "true"
+# 并发数
+PREFLIGHT_WORKERS = int(os.environ.get("PREFLIGHT_WORKERS", "8"))
+# 单次请求超时（秒）
+PREFLIGHT_TIMEOUT = float(os.environ.get("PREFLIGHT_TIMEOUT", "10"))
+# ==============================================================
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0 Safari/537.36"
+)
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def http_pool() -> requests.Session:
+    """
+    所有站点、所有账号共用的 HTTP 连接池（复用 TLS 连接）
+    每个请求自带 Cookie 头，会话本身拒收一切 Set-Cookie，避免账号之间串 Cookie
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            s = requests.Session()
+            s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max(8, PREFLIGHT_WORKERS))
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _POOL = s
+        return _POOL
+
+
+# 预检结论
+ALIVE = "alive"      # Cookie 有效
+DEAD = "dead"        # Cookie 已失效
+UNKNOWN = "unknown"  # 网络异常等无法判断，仍交给浏览器阶段
+
+
+def check_cookie(base_url: str, cookie: str, account: str = None) -> dict:
+    """
+    验证单个 Cookie 是否仍处于登录状态
+    :param base_url: 网站基础地址
+    :param cookie: 账号的 Cookie 字符串
+    :param account: 账号标识（用于 governor 按账号限速）
+    :return: {"status": ALIVE/DEAD/UNKNOWN, "username": str, "reason": str}
+    """
+    url = f"{base_url}/session/current.json"
+    governor = get_governor()
+
+    def _get(proxy):
+        # 经账号固定的出口代理（未配置代理池时直连），不同出口分别限速
+        egress = proxy_key(proxy) if proxy else None
+        governor.acquire(url, account=account, egress=egress)
+        resp = http_pool().get(
+            url,
+            headers={
+                "Cookie": cookie,
+                "User-Agent": USER_AGENT,
+                "Accept": "application/json",
+                "X-Requested-With": "XMLHttpRequest",
+            },
+            timeout=PREFLIGHT_TIMEOUT,
+            allow_redirects=False,
+            proxies=requests_proxies(proxy),
+        )
+        governor.feedback(url, resp.status_code, resp.headers.get("Retry-After"), account=account,
+                          nbytes=len(resp.content or b""), egress=egress)
+        return resp
+
+    try:
+        resp = get_proxy_pool().call(account_key(cookie), _get,
+                                     is_proxy_error=lambda r: r.status_code in PROXY_ERROR_STATUS)
+    except Exception as e:
+        return {"status": UNKNOWN, "username": "", "reason": f"请求异常: {e}"}
+
+    # Discourse 未登录时 current.json 返回 404（部分版本 200 + 空 current_user）
+    # 401 / 403 多为 Cloudflare / WAF 拦截（预检不带 TLS 指纹仿真），不能据此判定失效，交给浏览器阶段
+    if resp.status_code == 404:
+        return {"status": DEAD, "username": "", "reason": f"HTTP {resp.status_code}"}
+    if resp.status_code != 200:
+        return {"status": UNKNOWN, "username": "", "reason": f"HTTP {resp.status_code}"}
+
+    try:
+        user = resp.json().get("current_user") or {}
+    except ValueError:
+        return {"status": UNKNOWN, "username": "", "reason": "响应不是 JSON"}
+
+    username = user.get("username") or ""
+    if not username:
+        return {"status": DEAD, "username": "", "reason": "current_user 为空"}
+    return {"status": ALIVE, "username": username, "reason": ""}
+
+
+def validate_cookies(base_url: str, cookies: list, accounts: list = None) -> list:
+    """
+    并发预检所有账号的 Cookie
+    :param base_url: 网站基础地址
+    :param cookies: Cookie 字符串列表
+    :param accounts: 与 cookies 对应的账号标识（用于 governor 按账号限速），默认 account-1..N
+    :return: 与 cookies 顺序一致的预检结果列表（每项额外带 elapsed 耗时秒数）
+    """
+    if not cookies:
+        return []
+    if accounts is None:
+        accounts = [f"account-{i}" for i in range(1, len(cookies) + 1)]
+
+    def _check(item):
+        account, cookie = item
+        t0 = time.monotonic()
+        res = check_cookie(base_url, cookie, account=account)
+        res["elapsed"] = time.monotonic() - t0
+        return res
+
+    workers = max(1, min(PREFLIGHT_WORKERS, len(cookies)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_check, zip(accounts, cookies)))
+
+    alive = sum(1 for r in results if r["status"] == ALIVE)
+    dead = sum(1 for r in results if r["status"] == DEAD)
+    log.info(f"🔎 Cookie 预检完成: 有效 {alive} / 失效 {dead} / 未知 {len(results) - alive - dead}")
+    return results
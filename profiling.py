@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+按阶段的性能剖析（两套实现共用，仅依赖标准库）
+
+PROFILE 开启时，每个账号的每个阶段（validate / checkin / browse）单独剖析，输出到
+PROFILE_DIR/<运行>/<账号>/ 下：
+
+- <阶段>.pstats：cProfile 确定性剖析（PROFILE=cprofile），python -m pstats 或 snakeviz 查看
+- <阶段>.collapsed：采样得到的折叠调用栈（每行 "帧;帧;帧 次数"），可直接交给 flamegraph.pl / speedscope
+- summary.json：各阶段的墙钟时间与本线程 CPU 时间
+
+CPU 时间只统计执行阶段的 Python 线程（含其中调用的 C 代码），不含浏览器 / chromedriver 进程；
+墙钟时间远大于 CPU 时间说明主要在等浏览器或网络，两者接近说明瓶颈在我们自己的代码。
+账号隔离子进程继承同一个运行目录（PROFILE_RUN_ID 环境变量）。
+
+    PROFILE=sample python nodeloc.py
+    python profiling.py             # 最近一次运行各阶段的 墙钟 / CPU 汇总
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from checkin_state import DATA_DIR, load_json, save_json
+
+# ------------------ 基础配置 ------------------
+# 剖析模式：空（关闭）/ sample（只采样调用栈，开销小）/ cprofile（确定性剖析 + 采样）
+PROFILE = os.environ.get("PROFILE", "").strip().lower()
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(DATA_DIR, "profiles")
+# 采样间隔（秒）
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.01"))
+# ----------------------------------------------------
+
+MODES = ("sample", "cprofile")
+_RUN_ENV = "PROFILE_RUN_ID"
+
+
+def run_id() -> str:
+    """
+    本次运行的目录名；第一次调用时生成并写入环境变量，子进程沿用。
+    入口进程要在启动账号子进程之前调用一次，否则每个隔离的账号各自生成一个运行目录。
+    """
+    rid = os.environ.get(_RUN_ENV, "").strip()
+    if not rid:
+        rid = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        os.environ[_RUN_ENV] = rid
+    return rid
+
+
+def _safe(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_.@" else "_" for c in name)[:80] or "account"
+
+
+class StackSampler:
+    """后台线程定时采样目标线程的调用栈，按折叠格式计数。"""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="stack-sampler", daemon=True)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class PhaseProfiler:
+    """一个账号的分阶段剖析；未开启 PROFILE 时 phase() 什么也不做。"""
+
+    def __init__(self, account: str, mode: str = PROFILE, root: str = PROFILE_DIR) -> None:
+        self.mode = mode if mode in MODES else ""
+        self.account = account
+        self.dir = os.path.join(root, run_id(), _safe(account)) if self.mode else ""
+        self.phases: List[dict] = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mode)
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        # 同一阶段多次执行（或同一账号重试）时依次编号，不覆盖之前的文件
+        base, n = os.path.join(self.dir, name), 1
+        while os.path.exists(base + ".collapsed"):
+            n += 1
+            base = os.path.join(self.dir, f"{name}-{n}")
+
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        prof = None
+        if self.mode == "cprofile":
+            import cProfile
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+            except ValueError:
+                # 已有其他剖析器在运行（如外部 python -m cProfile）
+                prof = None
+        wall0, cpu0 = time.monotonic(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.monotonic() - wall0, time.thread_time() - cpu0
+            if prof:
+                prof.disable()
+            sampler.stop()
+            try:
+                sampler.write(base + ".collapsed")
+                if prof:
+                    prof.dump_stats(base + ".pstats")
+            except OSError:
+                pass
+            self.phases.append({"phase": name, "wall": round(wall, 3), "cpu": round(cpu, 3),
+                                "samples": sum(sampler.counts.values())})
+
+    def summary(self) -> str:
+        return "，".join(
+            f"{p['phase']} 墙钟 {p['wall']:.1f}s / CPU {p['cpu']:.1f}s（{p['cpu'] / p['wall'] if p['wall'] else 0:.0%}）"
+            for p in self.phases
+        )
+
+    def close(self, log=None) -> None:
+        """写入 summary.json，并输出一行汇总。"""
+        if not self.enabled or not self.phases:
+            return
+        path = os.path.join(self.dir, "summary.json")
+        try:
+            # 同一账号在本次运行中再次处理（如队列重试）时追加
+            phases = load_json(path).get("phases", []) + self.phases
+            save_json(path, {"account": self.account, "mode": self.mode, "phases": phases})
+        except OSError:
+            pass
+        if log:
+            log(f"[profile] {self.summary()}（剖析文件: {self.dir}）")
+
+
+# ------------------ 报表 ------------------
+def report(root: str = PROFILE_DIR, run: Optional[str] = None) -> str:
+    if not os.path.isdir(root) or not os.listdir(root):
+        return f"没有剖析记录：{root}"
+    run = run or sorted(os.listdir(root))[-1]
+    base = os.path.join(root, run)
+    by_phase: Dict[str, List[dict]] = {}
+    for acct in sorted(os.listdir(base)):
+        for p in load_json(os.path.join(base, acct, "summary.json")).get("phases", []):
+            by_phase.setdefault(p["phase"], []).append(p)
+    lines = [f"== 剖析汇总：{base} ==", "阶段        次数  墙钟合计  CPU 合计  CPU 占比"]
+    for name, items in sorted(by_phase.items()):
+        wall = sum(p["wall"] for p in items)
+        cpu = sum(p["cpu"] for p in items)
+        lines.append(f"{name:<10}  {len(items):>4}  {wall:>7.1f}s  {cpu:>7.1f}s  {cpu / wall if wall else 0:>7.0%}")
+    return "\n".join(lines)
+# ----------------------------------------------------
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NodeLoc 分阶段剖析汇总")
+    parser.add_argument("run", nargs="?", default=None, help="运行目录名，默认最近一次")
+    parser.add_argument("--dir", default=PROFILE_DIR, help="剖析文件根目录")
+    ns = parser.parse_args()
+    print(report(ns.dir, ns.run))
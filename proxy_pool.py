@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+按账号分配出口代理（两套实现共用，仅依赖标准库）
+
+PROXIES / PROXIES_FILE 配置代理列表（http:// / https:// / socks5:// / socks5h://，可带 user:pass@），
+每个账号固定走同一个代理（亲和关系持久化，账号隔离子进程、两套实现之间一致），
+HTTP 会话和浏览器使用同一个出口。
+
+健康评分：每个代理的延迟与错误率（EWMA）持久化到本地；连续失败后熔断一段时间，
+账号当前的代理不健康时自动换到评分最好、分到账号最少的代理。
+代理地址中的账号密码只保存在内存里，落盘与日志都用去掉认证信息的地址。
+
+Chrome 的 --proxy-server 不支持代理认证：带认证的 http:// 代理由本进程起一个本地转发
+（注入 Proxy-Authorization）给浏览器用；其他带认证的代理浏览器无法使用，抛出 BrowserProxyError，
+该账号不使用浏览器后端（不会让浏览器直连、暴露本机出口）。
+Chrome 不认识 socks5h://，按 socks5:// 传给浏览器（Chrome 的 SOCKS5 本来就在代理端解析域名）。
+"""
+import os
+import time
+import base64
+import socket
+import select
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, unquote
+
+from checkin_state import DATA_DIR, file_lock, load_json, save_json
+
+# ------------------ 基础配置 ------------------
+# 代理列表：逗号或换行分隔；为空表示不使用代理
+PROXIES = os.environ.get("PROXIES", "")
+PROXIES_FILE = os.environ.get("PROXIES_FILE", "").strip()
+PROXY_STATS_FILE = os.environ.get("PROXY_STATS_FILE") or os.path.join(DATA_DIR, "proxy_stats.json")
+# 所有代理都不可用时是否允许直连（默认不允许：仍用评分最好的代理）
+PROXY_ALLOW_DIRECT = os.environ.get("PROXY_ALLOW_DIRECT", "false").strip().lower() in ["true", "1", "on"]
+
+# EWMA 平滑系数
+EWMA_ALPHA = 0.3
+# 连续失败多少次熔断，以及熔断时长（秒）
+TRIP_AFTER = 3
+TRIP_SECONDS = 600
+# 错误率超过该值视为不健康
+MAX_ERR_RATE = 0.5
+# 请求失败后换代理重试的次数
+FAILOVER_RETRIES = 2
+# 视为代理层面失败的响应码（代理认证失败 / 代理连不上目标）
+PROXY_ERROR_STATUS = (407, 502)
+# ----------------------------------------------------
+
+SCHEMES = ("http", "https", "socks5", "socks5h", "socks4")
+
+
+def proxy_key(proxy: str) -> str:
+    """去掉认证信息的代理地址（日志 / 落盘用）。"""
+    parts = urlsplit(proxy)
+    return f"{parts.scheme}://{parts.hostname}:{parts.port}"
+
+
+def parse_proxies(text: str) -> List[str]:
+    out = []
+    for item in (text or "").replace(",", "\n").splitlines():
+        item = item.split("#", 1)[0].strip()
+        if not item:
+            continue
+        if "://" not in item:
+            item = "http://" + item
+        parts = urlsplit(item)
+        if parts.scheme not in SCHEMES or not parts.hostname or not parts.port:
+            raise ValueError(f"代理格式错误: {proxy_key(item) if parts.hostname else item}")
+        if item not in out:
+            out.append(item)
+    return out
+
+
+def requests_proxies(proxy: Optional[str]) -> Optional[dict]:
+    """requests / curl_cffi 的 proxies 参数。"""
+    return {"http": proxy, "https": proxy} if proxy else None
+
+
+class ProxyPool:
+    """账号 -> 代理的粘性分配 + 健康评分 + 故障切换。"""
+
+    def __init__(self, proxies: List[str], path: str = PROXY_STATS_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._urls: Dict[str, str] = {proxy_key(p): p for p in proxies}
+        self._data = load_json(path) if proxies else {}
+        # 本进程内已确定的分配，代理健康时不必每次读文件
+        self._assigned: Dict[str, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._urls)
+
+    # ------------------ 健康评分 ------------------
+    def _rec(self, key: str) -> dict:
+        return self._data.get("proxies", {}).get(key) or {}
+
+    def healthy(self, key: str) -> bool:
+        """未熔断，且错误率不高；错误率高但最近 TRIP_SECONDS 内没再失败过的，给一次重新试用的机会。"""
+        rec = self._rec(key)
+        now = time.time()
+        if rec.get("down_until", 0) > now:
+            return False
+        return rec.get("err_rate", 0.0) <= MAX_ERR_RATE or now - rec.get("last_fail", 0) > TRIP_SECONDS
+
+    def score(self, key: str) -> float:
+        """越小越好：平均延迟按错误率加重；没有记录的代理按 1s 计。"""
+        rec = self._rec(key)
+        return rec.get("latency", 1.0) * (1 + 4 * rec.get("err_rate", 0.0))
+
+    def report(self, proxy: Optional[str], ok: bool, latency: float = 0.0) -> None:
+        """记录一次经由该代理的请求结果（代理层面的失败：连接 / 超时 / 407 / 502 等）。"""
+        if not proxy or not self.enabled:
+            return
+        key = proxy_key(proxy)
+        with self._lock, file_lock(self.path):
+            # 先合并其他进程写入的数据，再更新本条
+            self._data = load_json(self.path)
+            rec = dict(self._rec(key))
+            n = rec.get("n", 0)
+            err = 0.0 if ok else 1.0
+            rec["err_rate"] = err if n == 0 else (1 - EWMA_ALPHA) * rec.get("err_rate", 0.0) + EWMA_ALPHA * err
+            if ok:
+                rec["latency"] = latency if "latency" not in rec else \
+                    (1 - EWMA_ALPHA) * rec["latency"] + EWMA_ALPHA * latency
+                rec["fails"] = 0
+                rec["last_ok"] = int(time.time())
+            else:
+                rec["fails"] = rec.get("fails", 0) + 1
+                rec["last_fail"] = int(time.time())
+                if rec["fails"] >= TRIP_AFTER:
+                    rec["down_until"] = int(time.time() + TRIP_SECONDS)
+            rec["n"] = n + 1
+            self._data.setdefault("proxies", {})[key] = rec
+            save_json(self.path, self._data)
+    # ----------------------------------------------------
+
+    # ------------------ 分配 ------------------
+    def _pick(self, exclude: Tuple[str, ...] = ()) -> Optional[str]:
+        """健康的代理里选 分到的账号最少、评分最好 的；全都不健康时按 PROXY_ALLOW_DIRECT 决定直连还是用评分最好的。"""
+        load: Dict[str, int] = {}
+        for key in self._data.get("affinity", {}).values():
+            load[key] = load.get(key, 0) + 1
+        keys = [k for k in self._urls if k not in exclude] or list(self._urls)
+        healthy = [k for k in keys if self.healthy(k)]
+        if not healthy:
+            if PROXY_ALLOW_DIRECT:
+                return None
+            return min(keys, key=self.score)
+        return min(healthy, key=lambda k: (load.get(k, 0), self.score(k)))
+
+    def for_account(self, account: str) -> Optional[str]:
+        """账号固定使用的代理（完整地址，含认证）；未配置代理时为 None（直连）。"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            key = self._assigned.get(account)
+            if key and self.healthy(key):
+                return self._urls[key]
+        with self._lock, file_lock(self.path):
+            self._data = load_json(self.path)
+            affinity = self._data.setdefault("affinity", {})
+            key = affinity.get(account)
+            if key not in self._urls or not self.healthy(key):
+                key = self._pick()
+                if key is None:
+                    affinity.pop(account, None)
+                else:
+                    affinity[account] = key
+                save_json(self.path, self._data)
+            self._assigned[account] = key
+            return self._urls.get(key) if key else None
+
+    def failover(self, account: str, proxy: Optional[str]) -> Optional[str]:
+        """当前代理出错：换一个（不再选刚失败的那个），更新亲和关系。"""
+        if not self.enabled:
+            return None
+        bad = proxy_key(proxy) if proxy else ""
+        with self._lock, file_lock(self.path):
+            self._data = load_json(self.path)
+            key = self._pick(exclude=(bad,))
+            affinity = self._data.setdefault("affinity", {})
+            if key is None:
+                affinity.pop(account, None)
+            else:
+                affinity[account] = key
+            save_json(self.path, self._data)
+            self._assigned[account] = key
+            return self._urls.get(key) if key else None
+
+    def call(self, account: str, fn: Callable[[Optional[str]], object], is_proxy_error: Callable = None):
+        """
+        fn(proxy) 经账号的代理执行；代理层面出错（异常，或 is_proxy_error(结果) 为真）时
+        记入健康评分并换代理重试，最多 FAILOVER_RETRIES 次。
+        """
+        proxy = self.for_account(account)
+        for attempt in range(FAILOVER_RETRIES + 1):
+            t0 = time.monotonic()
+            try:
+                result = fn(proxy)
+            except Exception:
+                if not proxy:
+                    raise
+                self.report(proxy, False)
+                if attempt == FAILOVER_RETRIES:
+                    raise
+                proxy = self.failover(account, proxy)
+                continue
+            if proxy and is_proxy_error and is_proxy_error(result):
+                self.report(proxy, False)
+                if attempt < FAILOVER_RETRIES:
+                    proxy = self.failover(account, proxy)
+                    continue
+                return result
+            self.report(proxy, True, time.monotonic() - t0)
+            return result
+
+    def summary(self) -> str:
+        with self._lock:
+            if self.enabled:
+                self._data = load_json(self.path)
+        parts = []
+        for key in self._urls:
+            rec = self._rec(key)
+            state = "健康" if self.healthy(key) else "熔断" if rec.get("down_until", 0) > time.time() else "不健康"
+            parts.append(f"{key}: {state}, 延迟 {rec.get('latency', 0.0):.2f}s, 错误率 {rec.get('err_rate', 0.0):.0%}")
+        return "; ".join(parts) or "未配置代理"
+    # ----------------------------------------------------
+
+
+# ------------------ 浏览器代理（本地认证转发） ------------------
+class _AuthRelay:
+    """把浏览器发来的代理请求转给上游 HTTP 代理，并在请求头里补上 Proxy-Authorization。"""
+
+    def __init__(self, proxy: str) -> None:
+        parts = urlsplit(proxy)
+        self.upstream = (parts.hostname, parts.port)
+        cred = f"{unquote(parts.username or '')}:{unquote(parts.password or '')}"
+        self.auth = b"Proxy-Authorization: Basic " + base64.b64encode(cred.encode()) + b"\r\n"
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, name="proxy-relay", daemon=True).start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client: socket.socket) -> None:
+        upstream = None
+        try:
+            head = b""
+            while b"\r\n\r\n" not in head and len(head) < 65536:
+                chunk = client.recv(4096)
+                if not chunk:
+                    return
+                head += chunk
+            line_end = head.index(b"\r\n") + 2
+            upstream = socket.create_connection(self.upstream, timeout=30)
+            upstream.settimeout(None)
+            # 请求行之后插入认证头，其余原样转发（CONNECT 隧道与普通代理请求都适用）
+            upstream.sendall(head[:line_end] + self.auth + head[line_end:])
+            _pipe(client, upstream)
+        except OSError:
+            pass
+        finally:
+            for s in (client, upstream):
+                if s is not None:
+                    try:
+                        s.close()
+                    except OSError:
+                        pass
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def _pipe(a: socket.socket, b: socket.socket) -> None:
+    socks = [a, b]
+    while True:
+        readable, _, _ = select.select(socks, [], [], 300)
+        if not readable:
+            return
+        for s in readable:
+            data = s.recv(65536)
+            if not data:
+                return
+            (b if s is a else a).sendall(data)
+
+
+_RELAYS: Dict[str, _AuthRelay] = {}
+_RELAYS_LOCK = threading.Lock()
+
+
+class BrowserProxyError(RuntimeError):
+    """浏览器无法使用账号的出口代理（带认证的 SOCKS / HTTPS 代理）：该账号不能使用浏览器后端。"""
+
+
+def browser_proxy(proxy: Optional[str]) -> Optional[str]:
+    """
+    给 Chrome --proxy-server 用的地址；带认证的 HTTP 代理返回本地转发地址
+    :raise BrowserProxyError: 浏览器无法使用该代理
+    """
+    if not proxy:
+        return None
+    parts = urlsplit(proxy)
+    if not parts.username:
+        scheme = "socks5" if parts.scheme == "socks5h" else parts.scheme
+        return f"{scheme}://{parts.hostname}:{parts.port}"
+    if parts.scheme != "http":
+        raise BrowserProxyError(f"Chrome 不支持带认证的 {parts.scheme} 代理（{proxy_key(proxy)}），该账号不能使用浏览器")
+    with _RELAYS_LOCK:
+        relay = _RELAYS.get(proxy)
+        if relay is None:
+            relay = _RELAYS[proxy] = _AuthRelay(proxy)
+        return f"http://127.0.0.1:{relay.port}"
+# ----------------------------------------------------
+
+
+_POOL: Optional[ProxyPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_proxy_pool() -> ProxyPool:
+    """进程级单例；代理列表来自 PROXIES_FILE 或 PROXIES。"""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            text = PROXIES
+            if PROXIES_FILE:
+                with open(PROXIES_FILE, "r", encoding="utf-8") as f:
+                    text = f.read()
+            _POOL = ProxyPool(parse_proxies(text))
+        return _POOL
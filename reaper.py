@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+遗留浏览器进程 / 临时用户目录回收（两套实现共用，仅依赖标准库）
+
+每次启动浏览器都登记 (pid, 启动时间, 用户目录, 所属进程)，启动和退出时各回收一次：
+- 所属进程已不在的浏览器（上次运行崩溃、quit() 失败）连同子进程一起结束
+- 没登记过的遗留：父进程已是 init（退出时还包括本进程的子进程）、用户目录在本工具临时目录（BROWSER_TMP_DIR）下的 Chromium
+- 本工具临时目录下的用户目录超过保留时长的删除；总大小仍超上限时从最旧的开始删
+正在被存活进程使用的用户目录不会删。进程相关的回收只在 Linux（/proc）上进行。
+"""
+import os
+import time
+import shutil
+from typing import Callable, List, Optional, Set
+
+from checkin_state import DATA_DIR, file_lock, load_json, save_json
+from supervisor import ProcessTree, proc_stat
+
+# ------------------ 基础配置 ------------------
+REAPER_ENABLED = os.environ.get("REAPER", "true").strip().lower() not in ["false", "0", "off"]
+REAPER_FILE = os.environ.get("REAPER_FILE") or os.path.join(DATA_DIR, "browsers.json")
+# 本工具专用的浏览器临时用户目录根（DrissionPage auto_port 每个端口一个目录）
+# 不用 DrissionPage 默认的 /tmp/DrissionPage：那里可能是同一台机器上其他脚本的浏览器
+BROWSER_TMP_DIR = os.environ.get("BROWSER_TMP_DIR") or os.path.join(DATA_DIR, "chromium-tmp")
+# 临时用户目录保留时长（小时）与总大小上限（MB）
+PROFILE_MAX_AGE_H = float(os.environ.get("PROFILE_MAX_AGE_H", "6"))
+PROFILE_MAX_MB = float(os.environ.get("PROFILE_MAX_MB", "1024"))
+# ----------------------------------------------------
+
+# 刚创建的目录可能马上就有浏览器要用，按大小清理时也不碰
+_MIN_AGE = 600
+
+
+def _alive(pid: int, start: int = 0) -> bool:
+    """进程存在且启动时间一致（防止 pid 被复用）；没有 /proc 时一律视为不可判断（False）。"""
+    st = proc_stat(pid) if pid else None
+    return st is not None and (not start or st[2] == start)
+
+
+def _pids() -> List[int]:
+    if not os.path.isdir("/proc"):
+        return []
+    return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+
+
+def _user_data_dirs(pid: int) -> List[str]:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            args = f.read().decode("utf-8", "replace").split("\0")
+    except OSError:
+        return []
+    return [os.path.realpath(a.split("=", 1)[1]) for a in args if a.startswith("--user-data-dir=")]
+
+
+def _under(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _dirs_in_use() -> Set[str]:
+    used = set()
+    for pid in _pids():
+        used.update(_user_data_dirs(pid))
+    return used
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _profile_dirs(root: str, depth: int = 3) -> List[str]:
+    """root 下的 Chromium 用户目录（含 Local State 或 Default/）。"""
+    found = []
+    try:
+        entries = [e for e in os.scandir(root) if e.is_dir(follow_symlinks=False)]
+    except OSError:
+        return found
+    for entry in entries:
+        if os.path.exists(os.path.join(entry.path, "Local State")) or os.path.isdir(os.path.join(entry.path, "Default")):
+            found.append(os.path.realpath(entry.path))
+        elif depth > 1:
+            found.extend(_profile_dirs(entry.path, depth - 1))
+    return found
+
+
+def _remove(path: str, in_use: Set[str]) -> Optional[int]:
+    """删除不在使用中的目录，返回释放的字节数；没删（不存在 / 使用中 / 删除失败）时为 None。"""
+    path = os.path.realpath(path)
+    if not os.path.isdir(path) or path in in_use:
+        return None
+    size = _dir_size(path)
+    shutil.rmtree(path, ignore_errors=True)
+    return None if os.path.exists(path) else size
+
+
+# ------------------ 登记 ------------------
+def register(pid: Optional[int], profile: str = "", stack: str = "") -> None:
+    """浏览器启动后登记（pid 拿不到时只能靠 init 收养 / 子进程扫描兜底）。"""
+    if not REAPER_ENABLED or not pid:
+        return
+    st, me = proc_stat(pid), proc_stat(os.getpid())
+    entry = {
+        "pid": pid,
+        "start": st[2] if st else 0,
+        "profile": os.path.realpath(profile) if profile else "",
+        "owner": os.getpid(),
+        "owner_start": me[2] if me else 0,
+        "stack": stack,
+        "created": time.time(),
+    }
+    with file_lock(REAPER_FILE):
+        data = load_json(REAPER_FILE)
+        data.setdefault("browsers", {})[f"{pid}:{entry['start']}"] = entry
+        save_json(REAPER_FILE, data)
+
+
+def release(pid: Optional[int]) -> int:
+    """
+    浏览器 quit() 之后调用：没退干净的进程当场结束，取消登记
+    :return: 结束的进程数
+    """
+    if not REAPER_ENABLED or not pid:
+        return 0
+    killed = 0
+    with file_lock(REAPER_FILE):
+        data = load_json(REAPER_FILE)
+        browsers = data.get("browsers", {})
+        for key in [k for k, e in browsers.items() if e.get("pid") == pid and e.get("owner") == os.getpid()]:
+            e = browsers.pop(key)
+            if _alive(pid, e.get("start", 0)):
+                killed += ProcessTree(pid).kill()
+        save_json(REAPER_FILE, data)
+    return killed
+# ----------------------------------------------------
+
+
+def reap(final: bool = False, log: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    回收遗留的浏览器进程与临时用户目录
+    :param final: 退出时为 True：本进程登记 / 启动的浏览器此时都应已关闭，剩下的也一并回收
+    :return: {"killed": 进程数, "dirs": 目录数, "freed_mb": 释放的空间}
+    """
+    stats = {"killed": 0, "dirs": 0, "freed_mb": 0.0}
+    if not REAPER_ENABLED:
+        return stats
+    me = os.getpid()
+
+    # 1. 已登记的浏览器：所属进程不在了就结束
+    stale_profiles = []
+    with file_lock(REAPER_FILE):
+        data = load_json(REAPER_FILE)
+        keep = {}
+        for key, e in data.get("browsers", {}).items():
+            owner = e.get("owner", 0)
+            if _alive(owner, e.get("owner_start", 0)) and not (final and owner == me):
+                keep[key] = e
+                continue
+            if _alive(e.get("pid", 0), e.get("start", 0)):
+                stats["killed"] += ProcessTree(e["pid"]).kill()
+            if e.get("profile"):
+                stale_profiles.append(e["profile"])
+        data["browsers"] = keep
+        save_json(REAPER_FILE, data)
+
+    # 2. 没登记过的遗留：用户目录在临时目录下、已被 init 收养（或退出时仍是本进程子进程）的 Chromium
+    root = os.path.realpath(BROWSER_TMP_DIR)
+    for pid in _pids():
+        st = proc_stat(pid)
+        if st and (st[0] == 1 or (final and st[0] == me)) \
+                and any(_under(d, root) for d in _user_data_dirs(pid)):
+            stats["killed"] += ProcessTree(pid).kill()
+
+    # 3. 临时用户目录：先删遗留的和超龄的，仍超上限则从最旧的开始删
+    in_use = _dirs_in_use()
+    freed = 0
+
+    def _drop(path: str) -> Optional[int]:
+        nonlocal freed
+        n = _remove(path, in_use)
+        if n is not None:
+            freed += n
+            stats["dirs"] += 1
+        return n
+
+    for path in stale_profiles:
+        _drop(path)
+
+    now = time.time()
+    aged = []
+    for path in _profile_dirs(root):
+        if path in in_use:
+            continue
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        aged.append((mtime, path))
+    aged.sort()
+    remaining = []
+    for mtime, path in aged:
+        if now - mtime > PROFILE_MAX_AGE_H * 3600:
+            _drop(path)
+        else:
+            remaining.append((mtime, path, _dir_size(path)))
+
+    total = sum(size for _, _, size in remaining)
+    budget = PROFILE_MAX_MB * 1024 * 1024
+    for mtime, path, size in remaining:
+        if total <= budget:
+            break
+        if now - mtime < _MIN_AGE:
+            continue
+        if _drop(path) is not None:
+            total -= size
+
+    stats["freed_mb"] = freed / 1024 / 1024
+    if log and (stats["killed"] or stats["dirs"]):
+        log(f"[reaper] 回收遗留浏览器进程 {stats['killed']} 个、临时用户目录 {stats['dirs']} 个（{stats['freed_mb']:.1f}MB）")
+    return stats
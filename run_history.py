@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+运行历史（两套实现共用，仅依赖标准库）
+
+每次运行把每个账号的结构化记录（各阶段耗时、结果、重试次数、流量、后端）追加到本地 SQLite，
+并提供命令行报表：按阶段的 p50 / p95 / max、按账号的失败率、按天的趋势、
+按启动配置（full / lite）对比的浏览器启动耗时与内存；
+开启 NAV_TRACE 时还有逐次导航的页面加载明细（见 nav_trace.py）。
+
+    python run_history.py --days 7
+    python run_history.py --days 30 --account cookie-1a2b3c4d5e6f
+"""
+import os
+import json
+import math
+import time
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from checkin_state import DATA_DIR
+
+# ------------------ 基础配置 ------------------
+RUN_HISTORY = os.environ.get("RUN_HISTORY", "true").strip().lower() not in ["false", "0", "off"]
+RUN_HISTORY_DB = os.environ.get("RUN_HISTORY_DB") or os.path.join(DATA_DIR, "history.sqlite3")
+# ----------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS account_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    stack TEXT NOT NULL,
+    account TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    outcome TEXT NOT NULL,
+    retries INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    backend TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS phases (
+    account_run_id INTEGER NOT NULL REFERENCES account_runs(id),
+    phase TEXT NOT NULL,
+    duration REAL NOT NULL,
+    ok INTEGER NOT NULL,
+    backend TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS nav_traces (
+    account_run_id INTEGER NOT NULL REFERENCES account_runs(id),
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    wall REAL NOT NULL,
+    ttfb REAL,
+    dcl REAL,
+    load REAL,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    heap_mb REAL,
+    detail TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS launches (
+    account_run_id INTEGER NOT NULL REFERENCES account_runs(id),
+    profile TEXT NOT NULL,
+    binary TEXT NOT NULL DEFAULT '',
+    duration REAL NOT NULL,
+    rss_mb REAL
+);
+CREATE INDEX IF NOT EXISTS idx_account_runs_started ON account_runs(started_at);
+"""
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class AccountRecord:
+    """一个账号一次运行的记录；phase() 计时各阶段，finish() 写库。"""
+
+    def __init__(self, recorder: "RunRecorder", account: str) -> None:
+        self.recorder = recorder
+        self.account = account
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        self.phases = []
+        self.outcome = "unknown"
+        self.retries = 0
+        self.bytes = 0
+        self.backend = ""
+        # 页面加载追踪（nav_trace.build_trace 的结果）
+        self.traces = []
+        # 浏览器启动：(启动配置, 二进制, 耗时, 关闭前进程树内存 MB)
+        self.launches = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """计时一个阶段；块内可通过返回的 dict 设置 ok / backend（默认 ok=True，异常时为 False）。"""
+        info = {"ok": True, "backend": ""}
+        t0 = time.monotonic()
+        try:
+            yield info
+        except BaseException:
+            info["ok"] = False
+            raise
+        finally:
+            self.phases.append((name, time.monotonic() - t0, bool(info["ok"]), info["backend"] or ""))
+
+    def add_phase(self, name: str, duration: float, ok: bool, backend: str = "") -> None:
+        self.phases.append((name, duration, bool(ok), backend or ""))
+
+    def add_attempts(self, name: str, attempts) -> None:
+        """把 BackendSelector.attempts（[(后端, 是否成功, 耗时)]）记为一个阶段，多余的尝试计入重试。"""
+        if not attempts:
+            return
+        backend, ok, _ = attempts[-1]
+        self.add_phase(name, sum(a[2] for a in attempts), ok, backend)
+        self.retries += len(attempts) - 1
+        if ok:
+            self.backend = backend
+
+    def add_traces(self, traces) -> None:
+        self.traces.extend(traces or [])
+
+    def add_launch(self, profile: str, seconds: float, rss_mb: Optional[float] = None, binary: str = "") -> None:
+        self.launches.append((profile, binary or "", seconds, rss_mb))
+
+    def finish(self, outcome: Optional[str] = None) -> None:
+        if outcome:
+            self.outcome = outcome
+        self.recorder._save(self, time.monotonic() - self._t0)
+
+
+class RunRecorder:
+    def __init__(self, stack: str, path: str = RUN_HISTORY_DB, enabled: bool = RUN_HISTORY) -> None:
+        self.stack = stack
+        self.path = path
+        self.enabled = enabled
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self._lock = threading.Lock()
+
+    def account(self, account: str) -> AccountRecord:
+        return AccountRecord(self, account)
+
+    def _save(self, rec: AccountRecord, duration: float) -> None:
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                conn = _connect(self.path)
+                try:
+                    with conn:
+                        cur = conn.execute(
+                            "INSERT INTO account_runs (run_id, stack, account, started_at, duration, outcome, retries, bytes, backend) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (self.run_id, self.stack, rec.account, rec.started_at, duration,
+                             rec.outcome, rec.retries, rec.bytes, rec.backend),
+                        )
+                        conn.executemany(
+                            "INSERT INTO phases (account_run_id, phase, duration, ok, backend) VALUES (?, ?, ?, ?, ?)",
+                            [(cur.lastrowid, n, d, int(ok), b) for n, d, ok, b in rec.phases],
+                        )
+                        core = ("kind", "url", "wall", "ttfb", "dcl", "load", "bytes", "heap")
+                        conn.executemany(
+                            "INSERT INTO nav_traces (account_run_id, kind, url, wall, ttfb, dcl, load, bytes, heap_mb, detail) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            [(cur.lastrowid, t["kind"], t["url"], t["wall"], t.get("ttfb"), t.get("dcl"), t.get("load"),
+                              int(t.get("bytes") or 0), t.get("heap"),
+                              json.dumps({k: v for k, v in t.items() if k not in core}, ensure_ascii=False))
+                             for t in rec.traces],
+                        )
+                        conn.executemany(
+                            "INSERT INTO launches (account_run_id, profile, binary, duration, rss_mb) VALUES (?, ?, ?, ?, ?)",
+                            [(cur.lastrowid, p, b, d, m) for p, b, d, m in rec.launches],
+                        )
+                finally:
+                    conn.close()
+        except sqlite3.Error:
+            # 历史记录只用于统计，写失败不影响签到
+            pass
+
+
+# ------------------ 报表 ------------------
+def percentile(values, p: float) -> float:
+    """最近秩法百分位。"""
+    if not values:
+        return 0.0
+    vals = sorted(values)
+    k = max(0, min(len(vals) - 1, math.ceil(p / 100.0 * len(vals)) - 1))
+    return vals[k]
+
+
+def _table(headers, rows) -> str:
+    rows = [[str(c) for c in r] for r in rows]
+    widths = [max(len(str(h)), *(len(r[i]) for r in rows)) if rows else len(str(h)) for i, h in enumerate(headers)]
+    line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+    out = [line, "-" * len(line)]
+    out += ["  ".join(c.ljust(w) for c, w in zip(r, widths)) for r in rows]
+    return "\n".join(out)
+
+
+def report(path: str = RUN_HISTORY_DB, days: float = 7, account: Optional[str] = None) -> str:
+    if not os.path.exists(path):
+        return f"没有运行历史：{path}"
+    since = time.time() - days * 86400
+    conn = _connect(path)
+    try:
+        where, args = "r.started_at >= ?", [since]
+        if account:
+            where += " AND r.account = ?"
+            args.append(account)
+
+        phases = {}
+        for name, dur, ok in conn.execute(
+            f"SELECT p.phase, p.duration, p.ok FROM phases p JOIN account_runs r ON r.id = p.account_run_id WHERE {where}", args
+        ):
+            phases.setdefault(name, []).append((dur, ok))
+        phase_rows = []
+        for name, items in sorted(phases.items()):
+            durs = [d for d, _ in items]
+            fails = sum(1 for _, ok in items if not ok)
+            phase_rows.append([name, len(items), f"{percentile(durs, 50):.1f}s", f"{percentile(durs, 95):.1f}s",
+                               f"{max(durs):.1f}s", f"{fails / len(items):.0%}"])
+
+        acct_rows = []
+        for acct, n, fails, retries, last in conn.execute(
+            f"SELECT r.account, COUNT(*), SUM(r.outcome != 'ok' AND r.outcome != 'skipped'), SUM(r.retries), "
+            f"(SELECT outcome FROM account_runs x WHERE x.account = r.account ORDER BY started_at DESC LIMIT 1) "
+            f"FROM account_runs r WHERE {where} GROUP BY r.account ORDER BY r.account", args
+        ):
+            acct_rows.append([acct, n, f"{(fails or 0) / n:.0%}", retries or 0, last])
+
+        days_map = {}
+        for started, dur, outcome in conn.execute(
+            f"SELECT r.started_at, r.duration, r.outcome FROM account_runs r WHERE {where}", args
+        ):
+            day = time.strftime("%Y-%m-%d", time.localtime(started))
+            days_map.setdefault(day, []).append((dur, outcome))
+        trend_rows = []
+        for day, items in sorted(days_map.items()):
+            durs = [d for d, _ in items]
+            fails = sum(1 for _, o in items if o not in ("ok", "skipped"))
+            trend_rows.append([day, len(items), f"{fails / len(items):.0%}",
+                               f"{percentile(durs, 50):.1f}s", f"{percentile(durs, 95):.1f}s"])
+
+        navs, res_bytes = {}, {}
+        for kind, wall, ttfb, dcl, load, nbytes, heap, detail in conn.execute(
+            f"SELECT t.kind, t.wall, t.ttfb, t.dcl, t.load, t.bytes, t.heap_mb, t.detail "
+            f"FROM nav_traces t JOIN account_runs r ON r.id = t.account_run_id WHERE {where}", args
+        ):
+            detail = json.loads(detail or "{}")
+            navs.setdefault(kind, []).append((wall, ttfb, dcl, load, nbytes, heap, detail))
+            for rtype, r in (detail.get("resources") or {}).items():
+                res_bytes[rtype] = res_bytes.get(rtype, 0) + r.get("bytes", 0)
+        nav_rows = []
+        for kind, items in sorted(navs.items()):
+            col = lambda i: [x[i] for x in items if x[i] is not None]
+            script = [x[6].get("script_s") for x in items if x[6].get("script_s") is not None]
+            nav_rows.append([
+                kind, len(items),
+                f"{percentile(col(0), 50):.1f}s / {percentile(col(0), 95):.1f}s",
+                f"{percentile(col(1), 50):.2f}s / {percentile(col(1), 95):.2f}s",
+                f"{percentile(col(2), 50):.1f}s", f"{percentile(col(3), 50):.1f}s",
+                f"{sum(col(4)) / len(items) / 1024:.0f}KB",
+                f"{percentile(col(5), 50):.0f}MB",
+                f"{percentile(script, 50):.2f}s",
+            ])
+
+        launches = {}
+        for profile, binary, dur, rss in conn.execute(
+            f"SELECT l.profile, l.binary, l.duration, l.rss_mb FROM launches l "
+            f"JOIN account_runs r ON r.id = l.account_run_id WHERE {where}", args
+        ):
+            launches.setdefault((profile, os.path.basename(binary) or "默认浏览器"), []).append((dur, rss))
+        launch_rows = []
+        for (profile, binary), items in sorted(launches.items()):
+            durs = [d for d, _ in items]
+            rss = [m for _, m in items if m]
+            launch_rows.append([profile, binary, len(items), f"{percentile(durs, 50):.1f}s", f"{percentile(durs, 95):.1f}s",
+                                f"{percentile(rss, 50):.0f}MB" if rss else "-", f"{max(rss):.0f}MB" if rss else "-"])
+    finally:
+        conn.close()
+
+    sections = [
+        f"== 各阶段耗时（最近 {days:g} 天） ==\n" + _table(["阶段", "次数", "p50", "p95", "max", "失败率"], phase_rows),
+        "== 各账号失败率 ==\n" + _table(["账号", "运行次数", "失败率", "重试合计", "最近结果"], acct_rows),
+        "== 按天趋势（账号总耗时） ==\n" + _table(["日期", "次数", "失败率", "p50", "p95"], trend_rows),
+    ]
+    if launch_rows:
+        sections.append("== 浏览器启动（full / lite） ==\n"
+                        + _table(["配置", "浏览器", "次数", "启动 p50", "启动 p95", "内存 p50", "内存 max"], launch_rows))
+    if nav_rows:
+        total = sum(res_bytes.values()) or 1
+        mix = "，".join(f"{k} {v / total:.0%}" for k, v in sorted(res_bytes.items(), key=lambda kv: -kv[1])[:5])
+        sections.append(
+            "== 页面加载（NAV_TRACE） ==\n"
+            + _table(["类型", "次数", "get p50/p95", "TTFB p50/p95", "DCL p50", "load p50", "平均传输", "JS 堆 p50",
+                      "JS 执行 p50"], nav_rows)
+            + (f"\n资源字节占比：{mix}" if mix else "")
+        )
+    return "\n\n".join(sections)
+# ----------------------------------------------------
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NodeLoc 运行历史报表")
+    parser.add_argument("--days", type=float, default=7, help="统计最近多少天，默认 7")
+    parser.add_argument("--account", default=None, help="只看某个账号")
+    parser.add_argument("--db", default=RUN_HISTORY_DB, help="历史数据库路径")
+    ns = parser.parse_args()
+    print(report(ns.db, ns.days, ns.account))
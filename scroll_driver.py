@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+页内自主滚动（两套实现共用，仅依赖标准库）
+
+随机滚动距离 / 停留时间仍由 Python 端按原有分布生成（scroll_plan），
+整个"滚动 → 停留 → 判断到底 / URL 变化 → 随机提前结束"循环在页面内执行，
+结束时返回摘要 {steps, bottom, url_changes, url}，每个主题只需一次调用。
+"""
+import random
+
+# 与原 _auto_scroll 相同的随机参数
+STEPS_RANGE = (6, 10)
+DIST_RANGE = (520, 700)
+DWELL_RANGE = (1.8, 3.5)
+EARLY_STOP_PROB = 0.07
+
+_CORE_JS = """
+(plan) => new Promise((resolve) => {
+    let i = 0, prevUrl = null, changes = 0, bottom = false;
+    const finish = () => resolve({steps: i, bottom: bottom, url_changes: changes, url: location.href});
+    const step = () => {
+        if (i >= plan.steps.length) return finish();
+        const s = plan.steps[i++];
+        window.scrollBy(0, s.dist);
+        setTimeout(() => {
+            bottom = window.scrollY + window.innerHeight >= document.body.scrollHeight;
+            const cur = location.href;
+            if (cur !== prevUrl) {
+                if (prevUrl !== null) changes++;
+                prevUrl = cur;
+            } else if (bottom) {
+                return finish();
+            }
+            if (s.stop) return finish();
+            step();
+        }, s.dwell_ms);
+    };
+    step();
+})
+"""
+
+# DrissionPage：run_js 会等待返回的 Promise
+DRISSION_SCROLL_JS = f"return ({_CORE_JS.strip()})(arguments[0]);"
+# Selenium：execute_async_script，最后一个参数是回调
+SELENIUM_SCROLL_JS = (
+    "const done = arguments[arguments.length - 1];"
+    f"({_CORE_JS.strip()})(arguments[0]).then(done, () => done(null));"
+)
+
+
+def scroll_plan(rng=random, steps_range=STEPS_RANGE, dwell_range=DWELL_RANGE) -> dict:
+    """生成一次主题阅读的滚动计划（时间预算紧张时由 browse_planner 缩短步数 / 停留）。"""
+    steps = []
+    for _ in range(rng.randint(*steps_range)):
+        steps.append({
+            "dist": rng.randint(*DIST_RANGE),
+            "dwell_ms": int(rng.uniform(*dwell_range) * 1000),
+            "stop": rng.random() < EARLY_STOP_PROB,
+        })
+    return {"steps": steps}
+
+
+def plan_timeout(plan: dict, margin: float = 15.0) -> float:
+    """脚本超时：所有停留时间之和 + 余量。"""
+    return sum(s["dwell_ms"] for s in plan["steps"]) / 1000.0 + margin
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+站点注册表（两套实现共用，仅依赖标准库）
+
+一个进程可以同时给多个签到插件相似的 Discourse 论坛签到。站点列表来自 SITES_FILE（JSON 文件）
+或 SITES（JSON 字符串），每个站点：
+
+    {
+        "name": "nodeloc",                      # 日志 / 推送中显示的名字
+        "base_url": "https://www.nodeloc.com",
+        "cookie_domain": ".www.nodeloc.com",    # 可选，默认 "." + host
+        "checkin_selectors": ["button.checkin-button"],  # 可选，默认 NodeLoc 的签到按钮
+        "checkin_endpoint": "/checkin",         # 可选，配置后可纯 HTTP 签到
+        "rate_per_min": 40, "rate_burst": 6,    # 可选，覆盖该 host 的 governor 限速
+        "cookies_env": "NL_COOKIE",             # 账号 Cookie 所在的环境变量（每行一个账号）
+        "accounts": "file:/data/nodeloc.txt"    # 可选，账号来源（见 account_source.py），配置后代替 cookies_env
+    }
+
+都没配置时只有一个默认站点：NODELOC_BASE_URL（默认 NodeLoc）+ ACCOUNTS_SOURCE（未配置时为 NL_COOKIE）。
+"""
+import os
+import json
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+from account_source import ACCOUNTS_SOURCE, AccountSource, open_source
+
+# ------------------ 基础配置 ------------------
+SITES_FILE = os.environ.get("SITES_FILE", "").strip()
+SITES_JSON = os.environ.get("SITES", "").strip()
+DEFAULT_BASE_URL = os.environ.get("NODELOC_BASE_URL", "https://www.nodeloc.com").rstrip("/")
+# ----------------------------------------------------
+
+# NodeLoc 顶部导航栏的签到按钮
+DEFAULT_CHECKIN_SELECTORS = ["li.header-dropdown-toggle.checkin-icon button.checkin-button"]
+
+
+def parse_cookie_lines(text: str) -> List[str]:
+    """每行一个账号的 Cookie，# 之后为备注。"""
+    lines = [line.split("#", 1)[0].strip() for line in (text or "").splitlines()]
+    return [line for line in lines if line]
+
+
+class Site:
+    """一个 Discourse 站点的签到配置。"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        cookie_domain: Optional[str] = None,
+        checkin_selectors: Optional[List[str]] = None,
+        checkin_endpoint: str = "",
+        rate_per_min: Optional[float] = None,
+        rate_burst: Optional[int] = None,
+        cookies_env: str = "NL_COOKIE",
+        accounts: str = "",
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.host = urlsplit(self.base_url).netloc
+        self.name = name or self.host
+        self.cookie_domain = cookie_domain or f".{self.host}"
+        self.checkin_selectors = list(checkin_selectors or DEFAULT_CHECKIN_SELECTORS)
+        self.checkin_endpoint = (checkin_endpoint or "").strip()
+        self.rate_per_min = rate_per_min
+        self.rate_burst = rate_burst
+        self.cookies_env = cookies_env
+        self.accounts_spec = (accounts or "").strip() or f"env:{cookies_env}"
+
+    @property
+    def user_page(self) -> str:
+        return f"{self.base_url}/u/"
+
+    @property
+    def checkin_button(self) -> str:
+        """所有候选签到按钮合成一个 CSS 选择器组。"""
+        return ", ".join(self.checkin_selectors)
+
+    def cookies(self) -> List[str]:
+        return parse_cookie_lines(os.environ.get(self.cookies_env, ""))
+
+    def account_source(self) -> AccountSource:
+        """该站点的账号来源，迭代时逐个读取账号（不一次性读入内存）。"""
+        return open_source(self.accounts_spec)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Site":
+        sels = d.get("checkin_selectors") or d.get("checkin_selector")
+        if isinstance(sels, str):
+            sels = [s.strip() for s in sels.split(",") if s.strip()]
+        return cls(
+            name=d.get("name", ""),
+            base_url=d["base_url"],
+            cookie_domain=d.get("cookie_domain"),
+            checkin_selectors=sels,
+            checkin_endpoint=d.get("checkin_endpoint", ""),
+            rate_per_min=d.get("rate_per_min"),
+            rate_burst=d.get("rate_burst"),
+            cookies_env=d.get("cookies_env", "NL_COOKIE"),
+            accounts=d.get("accounts", ""),
+        )
+
+    def __repr__(self) -> str:
+        return f"Site({self.name!r}, {self.base_url!r})"
+
+
+def default_site() -> Site:
+    return Site("nodeloc", DEFAULT_BASE_URL, checkin_endpoint=os.environ.get("CHECKIN_ENDPOINT", ""),
+                accounts=ACCOUNTS_SOURCE)
+
+
+def load_sites() -> List[Site]:
+    """读取站点注册表；配置格式错误时直接报错，不悄悄退回默认站点。"""
+    raw = None
+    if SITES_FILE:
+        with open(SITES_FILE, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    elif SITES_JSON:
+        raw = json.loads(SITES_JSON)
+    if not raw:
+        return [default_site()]
+    if isinstance(raw, dict):
+        raw = raw.get("sites", [])
+    sites = [Site.from_dict(d) for d in raw]
+    names = [s.name for s in sites]
+    if len(set(names)) != len(names):
+        raise ValueError(f"站点名重复: {names}")
+    return sites
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+账号级子进程隔离 + 看门狗（两套实现共用，仅依赖标准库）
+
+每个账号在独立的工作进程中执行，父进程监督：
+- 总时限与分阶段时限（工作进程通过 Reporter.phase() 报告当前阶段）
+- 进程树内存上限（按 /proc 统计 RSS，包括浏览器子进程）
+- 超时 / 超内存时强制结束整棵进程树，包括已经脱离父进程的 Chromium
+- 工作进程随时用 Reporter.update() 回传部分结果，被杀掉时父进程仍拿得到已完成部分
+
+    res = run_supervised(worker, arg1, arg2)
+    res["status"]  # done / timeout / memory / error / crashed
+    res["value"]   # worker 的返回值（status == done 时）
+    res["partial"] # 最后一次 update() 的内容
+
+不隔离（ISOLATE_ACCOUNTS=false）时用进程内的 Watchdog 执行同样的时限与内存上限，
+超限时只结束该账号登记的浏览器进程树，账号之间照常共用浏览器池与主机令牌桶：
+
+    with Watchdog() as dog:
+        worker(dog, arg1, arg2)   # dog 与 Reporter 接口相同，另外用 dog.watch(pid) 登记浏览器
+    dog.res["status"]  # done / timeout / memory
+"""
+import os
+import time
+import signal
+import threading
+import multiprocessing
+from typing import Callable, Dict, Optional, Set, Tuple
+
+# ------------------ 基础配置 ------------------
+# 是否把每个账号放到独立进程中执行（默认关闭：独立进程不共用浏览器池，主机令牌桶也各算各的；
+# 不隔离时由进程内的 Watchdog 执行同样的时限与内存上限）
+ISOLATE_ACCOUNTS = os.environ.get("ISOLATE_ACCOUNTS", "false").strip().lower() in ["true", "1", "on"]
+# 单个账号的总时限（秒）
+ACCOUNT_TIMEOUT = float(os.environ.get("ACCOUNT_TIMEOUT", "1200"))
+# 分阶段时限（秒），如 "validate=120,checkin=240,browse=900"
+PHASE_TIMEOUTS = os.environ.get("PHASE_TIMEOUTS", "validate=120,checkin=240,browse=900")
+# 工作进程树（含浏览器）的内存上限（MB），0 表示不限制
+WORKER_MAX_RSS_MB = float(os.environ.get("WORKER_MAX_RSS_MB", "2048"))
+# ----------------------------------------------------
+
+_POLL = 0.5
+
+
+def parse_phase_timeouts(spec: str) -> Dict[str, float]:
+    out = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            k, v = item.split("=", 1)
+            try:
+                out[k.strip()] = float(v)
+            except ValueError:
+                pass
+    return out
+
+
+class Reporter:
+    """工作进程一侧：报告阶段与部分结果。"""
+
+    # 超限状态；整个工作进程由父进程监督，这里总为空（见 Watchdog.tripped）
+    tripped = ""
+
+    def __init__(self, conn) -> None:
+        self._conn = conn
+        self.partial: dict = {}
+
+    def watch(self, pid: Optional[int]) -> None:
+        """整棵进程树都由父进程监督，浏览器不用单独登记。"""
+
+    def phase(self, name: str) -> None:
+        self._send(("phase", name))
+
+    def update(self, **data) -> None:
+        self.partial.update(data)
+        self._send(("update", dict(self.partial)))
+
+    def _send(self, msg) -> None:
+        try:
+            self._conn.send(msg)
+        except (OSError, ValueError):
+            pass
+
+
+def _child_main(conn, target: Callable, args: tuple, kwargs: dict) -> None:
+    # 自成一个会话：浏览器等子孙进程都在这个会话里，超时时可以整体结束
+    if hasattr(os, "setsid"):
+        try:
+            os.setsid()
+        except OSError:
+            pass
+    reporter = Reporter(conn)
+    try:
+        value = target(reporter, *args, **kwargs)
+        conn.send(("done", value))
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+# ------------------ 进程树（Linux /proc） ------------------
+def proc_stat(pid: int) -> Optional[Tuple[int, int, int]]:
+    """(ppid, sid, starttime)；进程不存在时为 None。"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read().decode("utf-8", "replace")
+    except OSError:
+        return None
+    fields = data[data.rfind(")") + 2:].split()
+    return int(fields[1]), int(fields[3]), int(fields[19])
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+class ProcessTree:
+    """
+    跟踪工作进程的所有子孙进程（同会话 + 父子关系）。
+    记住见过的每个 (pid, starttime)，父进程先死、被 init 收养的 Chromium 也能找回来。
+    """
+
+    def __init__(self, root: int) -> None:
+        self.root = root
+        self.seen: Set[Tuple[int, int]] = set()
+
+    def scan(self) -> Set[int]:
+        if not os.path.isdir("/proc"):
+            return {self.root}
+        stats = {}
+        for name in os.listdir("/proc"):
+            if name.isdigit():
+                st = proc_stat(int(name))
+                if st:
+                    stats[int(name)] = st
+        members = {pid for pid, (_, sid, _) in stats.items() if sid == self.root}
+        members.add(self.root)
+        # 再沿父子关系补上换了会话的后代
+        changed = True
+        while changed:
+            changed = False
+            for pid, (ppid, _, _) in stats.items():
+                if ppid in members and pid not in members:
+                    members.add(pid)
+                    changed = True
+        for pid in members:
+            if pid in stats:
+                self.seen.add((pid, stats[pid][2]))
+        alive_seen = {pid for pid, start in self.seen if stats.get(pid, (0, 0, -1))[2] == start}
+        return members | alive_seen
+
+    def rss_mb(self) -> float:
+        return sum(_rss_kb(pid) for pid in self.scan()) / 1024.0
+
+    def kill(self) -> int:
+        pids = self.scan()
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.root, signal.SIGKILL)
+            except OSError:
+                pass
+        killed = 0
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                killed += 1
+            except OSError:
+                pass
+        return killed
+# ----------------------------------------------------
+
+
+class Watchdog:
+    """
+    进程内看门狗：不隔离账号时代替 run_supervised，执行同样的总时限 / 分阶段时限，
+    内存上限只统计登记的浏览器进程树。超限时结束这些进程树，卡在浏览器调用上的线程随之出错返回；
+    之后再登记的浏览器当场结束，该账号剩下的步骤很快失败结束。
+    res 与 run_supervised 的返回值结构相同。
+    """
+
+    def __init__(self, timeout: float = ACCOUNT_TIMEOUT, phase_timeouts: Optional[Dict[str, float]] = None,
+                 max_rss_mb: float = WORKER_MAX_RSS_MB, log: Optional[Callable[[str], None]] = None) -> None:
+        self.timeout = timeout
+        self.phase_timeouts = parse_phase_timeouts(PHASE_TIMEOUTS) if phase_timeouts is None else phase_timeouts
+        self.max_rss_mb = max_rss_mb
+        self.log = log
+        self.partial: dict = {}
+        self.res = {"status": "done", "value": None, "partial": self.partial, "phase": "", "reason": "",
+                    "elapsed": 0.0, "phase_elapsed": 0.0}
+        self._trees: Dict[int, ProcessTree] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._t0 = self._phase_t0 = time.monotonic()
+
+    @property
+    def tripped(self) -> str:
+        """超限时为 timeout / memory（原因见 res["reason"]），未超限时为空。"""
+        return self.res["status"] if self.res["status"] != "done" else ""
+
+    def phase(self, name: str) -> None:
+        with self._lock:
+            self.res["phase"], self._phase_t0 = name, time.monotonic()
+
+    def update(self, **data) -> None:
+        self.partial.update(data)
+
+    def watch(self, pid: Optional[int]) -> None:
+        """登记本账号的浏览器（或 chromedriver）进程；已经超限时当场结束。"""
+        if not pid:
+            return
+        tree = ProcessTree(pid)
+        with self._lock:
+            self._trees[pid] = tree
+            tripped = self.res["status"] != "done"
+        if tripped:
+            tree.kill()
+
+    def _exceeded(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            phase, phase_t0, trees = self.res["phase"], self._phase_t0, list(self._trees.values())
+        limit = self.phase_timeouts.get(phase)
+        if now - self._t0 > self.timeout:
+            self.res["status"], self.res["reason"] = "timeout", f"超过总时限 {self.timeout:.0f}s（阶段 {phase or '-'}）"
+        elif limit and now - phase_t0 > limit:
+            self.res["status"], self.res["reason"] = "timeout", f"阶段 {phase} 超过 {limit:.0f}s"
+        elif self.max_rss_mb and trees and sum(t.rss_mb() for t in trees) > self.max_rss_mb:
+            self.res["status"], self.res["reason"] = "memory", f"浏览器内存超过 {self.max_rss_mb:.0f}MB（阶段 {phase or '-'}）"
+        else:
+            return False
+        self.res["phase_elapsed"] = now - phase_t0
+        return True
+
+    def _loop(self) -> None:
+        while not self._stop.wait(_POLL):
+            if not self._exceeded():
+                continue
+            with self._lock:
+                trees = list(self._trees.values())
+            killed = sum(t.kill() for t in trees)
+            if self.log:
+                self.log(f"[watchdog] {self.res['reason']}，已结束浏览器进程 {killed} 个")
+            return
+
+    def __enter__(self) -> "Watchdog":
+        self._t0 = self._phase_t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._loop, name="account-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self._stop.set()
+        self._thread.join()
+        now = time.monotonic()
+        self.res["elapsed"] = now - self._t0
+        if self.res["status"] == "done":
+            self.res["phase_elapsed"] = now - self._phase_t0
+        return False
+
+
+def run_supervised(
+    target: Callable,
+    *args,
+    timeout: float = ACCOUNT_TIMEOUT,
+    phase_timeouts: Optional[Dict[str, float]] = None,
+    max_rss_mb: float = WORKER_MAX_RSS_MB,
+    on_phase: Optional[Callable[[str], None]] = None,
+    **kwargs,
+) -> dict:
+    """
+    在独立进程中执行 target(reporter, *args, **kwargs) 并监督它。
+    target 必须是模块级函数（spawn 方式启动，需要可 pickle）。
+    """
+    phase_timeouts = parse_phase_timeouts(PHASE_TIMEOUTS) if phase_timeouts is None else phase_timeouts
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child_main, args=(child_conn, target, args, kwargs), name="account-worker")
+    t0 = time.monotonic()
+    proc.start()
+    child_conn.close()
+    tree = ProcessTree(proc.pid)
+
+    res = {"status": "crashed", "value": None, "partial": {}, "phase": "", "reason": "", "elapsed": 0.0,
+           "phase_elapsed": 0.0}
+    phase_t0 = t0
+    finished = False
+
+    def _drain() -> None:
+        nonlocal phase_t0, finished
+        while parent_conn.poll():
+            try:
+                kind, payload = parent_conn.recv()
+            except (EOFError, OSError):
+                return
+            if kind == "phase":
+                res["phase"], phase_t0 = payload, time.monotonic()
+                if on_phase:
+                    on_phase(payload)
+            elif kind == "update":
+                res["partial"] = payload
+            elif kind == "done":
+                res["status"], res["value"], finished = "done", payload, True
+            elif kind == "error":
+                res["status"], res["reason"], finished = "error", payload, True
+
+    try:
+        while True:
+            proc.join(_POLL)
+            _drain()
+            if not proc.is_alive():
+                break
+            if finished:
+                # 已回传结果，只等它自己退出
+                proc.join(5)
+                break
+            now = time.monotonic()
+            limit = phase_timeouts.get(res["phase"])
+            if now - t0 > timeout:
+                res["status"], res["reason"] = "timeout", f"超过总时限 {timeout:.0f}s（阶段 {res['phase'] or '-'}）"
+            elif limit and now - phase_t0 > limit:
+                res["status"], res["reason"] = "timeout", f"阶段 {res['phase']} 超过 {limit:.0f}s"
+            elif max_rss_mb and tree.rss_mb() > max_rss_mb:
+                res["status"], res["reason"] = "memory", f"进程树内存超过 {max_rss_mb:.0f}MB（阶段 {res['phase'] or '-'}）"
+            else:
+                continue
+            tree.kill()
+            proc.join(5)
+            break
+    finally:
+        _drain()
+        # 正常结束也清理一遍遗留的浏览器进程
+        tree.kill()
+        parent_conn.close()
+        res["elapsed"] = time.monotonic() - t0
+        res["phase_elapsed"] = time.monotonic() - phase_t0
+
+    if res["status"] == "crashed" and not finished:
+        res["reason"] = f"工作进程异常退出（exitcode={proc.exitcode}）"
+    return res
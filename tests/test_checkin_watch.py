@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""checkin_watch 的单元测试：由 STATE_JS 的结果判断签到是否成功。"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import checkin_watch as cw  # noqa: E402
+
+
+def xhr(status, body=""):
+    return {"xhr": {"url": "/checkin", "status": status, "body": body}, "bus": None, "dom": False}
+
+
+class ConfirmTest(unittest.TestCase):
+    def test_no_state(self):
+        self.assertIsNone(cw.confirm(None))
+        self.assertIsNone(cw.confirm({"xhr": None, "bus": None, "dom": False}))
+
+    def test_button_state(self):
+        self.assertEqual(cw.confirm({"xhr": None, "bus": None, "dom": True}), (True, "按钮状态"))
+
+    def test_xhr_success(self):
+        self.assertEqual(cw.confirm(xhr(200, '{"points": 10}')), (True, "签到接口 200"))
+        self.assertEqual(cw.confirm(xhr(204))[0], True)
+
+    def test_xhr_error_body(self):
+        for body in ('{"errors": ["签到失败"]}', '{"failed": "FAILED"}', '{"success": false}'):
+            ok, reason = cw.confirm(xhr(200, body))
+            self.assertFalse(ok, body)
+            self.assertIn("签到接口 200", reason)
+
+    def test_xhr_error_status(self):
+        self.assertEqual(cw.confirm(xhr(429, "Too Many Requests")), (False, "签到接口 429: Too Many Requests"))
+
+    def test_already_checked_in(self):
+        ok, reason = cw.confirm(xhr(422, '{"errors": ["今天已经签到过了"]}'))
+        self.assertTrue(ok)
+        self.assertIn("今日已签到", reason)
+        self.assertTrue(cw.confirm(xhr(403, '{"errors": ["您今日已签到"]}'))[0])
+
+    def test_already_word_is_not_a_mark(self):
+        # 泛词 already 不算已签到（如 "already logged in" / "already exists"）
+        self.assertEqual(cw.confirm(xhr(422, '{"errors": ["You have already done that"]}'))[0], False)
+
+    def test_aborted_request_falls_through(self):
+        self.assertIsNone(cw.confirm(xhr(0)))
+        state = xhr(0)
+        state["bus"] = {"channel": "/checkin/1", "data": "{}"}
+        self.assertEqual(cw.confirm(state), (True, "MessageBus /checkin/1"))
+
+    def test_message_bus(self):
+        state = {"xhr": None, "bus": {"channel": "/checkin/42", "data": "{}"}, "dom": False}
+        self.assertEqual(cw.confirm(state), (True, "MessageBus /checkin/42"))
+
+    def test_xhr_failure_wins_over_bus(self):
+        state = xhr(500, "oops")
+        state["bus"] = {"channel": "/checkin/1", "data": "{}"}
+        self.assertFalse(cw.confirm(state)[0])
+
+
+class ConfirmHttpTest(unittest.TestCase):
+    def test_json_success(self):
+        self.assertEqual(cw.confirm_http(200, '{"points": 10}'), (True, "HTTP 200"))
+        self.assertEqual(cw.confirm_http(201, "{}")[0], True)
+
+    def test_non_json_is_unconfirmed(self):
+        # Cloudflare 质询页 / 登录跳转页返回 200 也不算签到成功
+        for body in ("<!DOCTYPE html><title>Just a moment...</title>", "", "OK"):
+            self.assertIsNone(cw.confirm_http(200, body)[0], body)
+        self.assertIsNone(cw.confirm_http(200, "[1, 2]")[0])
+
+    def test_error_payload(self):
+        self.assertEqual(cw.confirm_http(200, '{"success": false, "message": "积分不足"}'),
+                         (False, "HTTP 200: 积分不足"))
+        self.assertEqual(cw.confirm_http(403, '{"errors": ["BAD CSRF"]}')[0], False)
+        self.assertEqual(cw.confirm_http(500, "{}"), (False, "HTTP 500"))
+
+    def test_already_checked_in(self):
+        self.assertEqual(cw.confirm_http(422, '{"errors": ["今天已经签到过了"]}'), (True, "今日已签到"))
+        self.assertEqual(cw.confirm_http(200, '{"error": "You have already done that"}')[0], False)
+
+
+class HelpersTest(unittest.TestCase):
+    def test_url_pattern(self):
+        self.assertEqual(cw.url_pattern(""), cw.DEFAULT_URL_PATTERN)
+        self.assertEqual(cw.url_pattern("https://www.nodeloc.com/checkin.json?x=1"), r"/checkin\.json")
+
+    def test_watch_args(self):
+        self.assertEqual(cw.watch_args("#btn", channels=["/a"]), ("#btn", cw.DEFAULT_URL_PATTERN, ["/a"]))
+        self.assertEqual(cw.watch_args("#btn")[2], cw.CHECKIN_CHANNELS)
+
+    def test_wait_confirmed(self):
+        states = iter([None, RuntimeError("navigating"), {"xhr": None, "bus": None, "dom": True}])
+
+        def read():
+            s = next(states)
+            if isinstance(s, Exception):
+                raise s
+            return s
+
+        self.assertEqual(cw.wait_confirmed(read, timeout=5, interval=0), (True, "按钮状态"))
+
+    def test_wait_confirmed_timeout(self):
+        self.assertEqual(cw.wait_confirmed(lambda: None, timeout=0, interval=0), (None, "超时"))
+
+    def test_poll_dom(self):
+        self.assertTrue(cw.poll_dom(lambda: True, timeout=0))
+        self.assertFalse(cw.poll_dom(lambda: False, timeout=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""supervisor.Watchdog 的单元测试：进程内执行时限，超限时结束登记的浏览器进程树。"""
+import os
+import sys
+import subprocess
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supervisor import Watchdog  # noqa: E402
+
+
+@unittest.skipUnless(os.path.isdir("/proc"), "进程树只在 Linux（/proc）上跟踪")
+class WatchdogTest(unittest.TestCase):
+    def spawn(self):
+        # 代替浏览器：带一个子进程的进程树
+        proc = subprocess.Popen(["sh", "-c", "sleep 60 & wait"])
+        self.addCleanup(lambda: proc.poll() is None and proc.kill())
+        return proc
+
+    def test_phase_timeout_kills_watched_tree(self):
+        browser = self.spawn()
+        with Watchdog(timeout=60, phase_timeouts={"checkin": 0.5}, max_rss_mb=0) as dog:
+            dog.phase("checkin")
+            dog.watch(browser.pid)
+            # 卡在浏览器上的调用随浏览器被结束而返回
+            browser.wait(timeout=10)
+        self.assertEqual(dog.tripped, "timeout")
+        self.assertEqual(dog.res["phase"], "checkin")
+        self.assertIn("阶段 checkin 超过", dog.res["reason"])
+        self.assertLess(dog.res["elapsed"], 10)
+
+    def test_browser_watched_after_trip_is_killed(self):
+        with Watchdog(timeout=0.5, phase_timeouts={}, max_rss_mb=0) as dog:
+            first = self.spawn()
+            dog.watch(first.pid)
+            first.wait(timeout=10)
+            late = self.spawn()
+            dog.watch(late.pid)
+            late.wait(timeout=10)
+        self.assertEqual(dog.tripped, "timeout")
+        self.assertIn("超过总时限", dog.res["reason"])
+
+    def test_within_limits(self):
+        browser = self.spawn()
+        with Watchdog(timeout=60, phase_timeouts={"checkin": 60}) as dog:
+            dog.phase("checkin")
+            dog.watch(browser.pid)
+            dog.update(login_ok=True)
+        self.assertEqual(dog.tripped, "")
+        self.assertEqual(dog.res["status"], "done")
+        self.assertEqual(dog.partial, {"login_ok": True})
+        self.assertIsNone(browser.poll())
+
+
+if __name__ == "__main__":
+    unittest.main()
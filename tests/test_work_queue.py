@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""work_queue 的单元测试：租约、过期接手、退避重试、死信、汇总资格与 ForeignTask 放回。"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import work_queue as wq  # noqa: E402
+
+BATCH = "2026-01-01"
+
+
+class QueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = wq.SqliteQueue(os.path.join(self.tmp, "queue.sqlite3"))
+        self.backoff = wq.QUEUE_BACKOFF
+
+    def tearDown(self):
+        wq.QUEUE_BACKOFF = self.backoff
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def enqueue(self, *keys, max_attempts=3):
+        return self.store.enqueue(BATCH, [{"key": k, "payload": {"key": k}} for k in keys], max_attempts=max_attempts)
+
+    def status(self, key):
+        with self.store._conn() as conn:
+            return conn.execute("SELECT status, attempts FROM tasks WHERE batch = ? AND key = ?",
+                                (BATCH, key)).fetchone()
+
+
+class SqliteQueueTest(QueueTestCase):
+    def test_enqueue_ignores_duplicates(self):
+        self.assertEqual(self.enqueue("a", "b"), 2)
+        self.assertEqual(self.enqueue("a", "c"), 1)
+        self.assertEqual(self.store.stats(BATCH)[wq.PENDING], 3)
+
+    def test_lease_and_ack(self):
+        self.enqueue("a")
+        task = self.store.lease(BATCH, "w1")
+        self.assertEqual((task["key"], task["payload"], task["attempts"]), ("a", {"key": "a"}, 1))
+        self.assertIsNone(self.store.lease(BATCH, "w2"))
+        self.assertTrue(self.store.renew(task))
+        self.assertTrue(self.store.ack(task, {"ok": True}))
+        self.assertEqual(self.status("a"), (wq.DONE, 1))
+        self.assertEqual(self.store.results(BATCH)[0]["result"], {"ok": True})
+
+    def test_expired_lease_is_taken_over(self):
+        self.enqueue("a")
+        stale = self.store.lease(BATCH, "w1", seconds=-1)
+        task = self.store.lease(BATCH, "w2")
+        self.assertEqual((task["id"], task["attempts"]), (stale["id"], 2))
+        # 原工作进程的租约已失效，续约 / 回写都不生效
+        self.assertFalse(self.store.renew(stale))
+        self.assertFalse(self.store.ack(stale, {"ok": True}))
+        self.assertTrue(self.store.ack(task, {"ok": True}))
+
+    def test_expired_lease_without_attempts_left_goes_dead(self):
+        self.enqueue("a", max_attempts=1)
+        self.store.lease(BATCH, "w1", seconds=-1)
+        self.assertIsNone(self.store.lease(BATCH, "w2"))
+        self.assertEqual(self.status("a"), (wq.DEAD, 1))
+
+    def test_fail_backs_off(self):
+        wq.QUEUE_BACKOFF = 60
+        self.enqueue("a")
+        task = self.store.lease(BATCH, "w1")
+        before = time.time()
+        self.assertTrue(self.store.fail(task, "boom"))
+        self.assertEqual(self.status("a"), (wq.PENDING, 1))
+        self.assertIsNone(self.store.lease(BATCH, "w1"))
+        # 第 1 次失败后等待 基数 × 1（±20% 抖动）
+        self.assertGreaterEqual(self.store.stats(BATCH)["next_at"], before + 60 * 0.8)
+
+    def test_backoff_grows_and_is_capped(self):
+        wq.QUEUE_BACKOFF = 10
+        self.assertLessEqual(wq.backoff(1), 12)
+        self.assertGreaterEqual(wq.backoff(3), 40 * 0.8)
+        self.assertLessEqual(wq.backoff(30), wq.MAX_BACKOFF * 1.2)
+
+    def test_dead_letter_after_max_attempts(self):
+        wq.QUEUE_BACKOFF = 0
+        self.enqueue("a", max_attempts=2)
+        for _ in range(2):
+            task = self.store.lease(BATCH, "w1")
+            self.store.fail(task, "boom", {"ok": False})
+        self.assertEqual(self.status("a"), (wq.DEAD, 2))
+        self.assertIsNone(self.store.lease(BATCH, "w1"))
+        dead = self.store.results(BATCH)[0]
+        self.assertEqual((dead["error"], dead["result"]), ("boom", {"ok": False}))
+
+    def test_fail_without_retry_goes_dead(self):
+        self.enqueue("a")
+        self.store.fail(self.store.lease(BATCH, "w1"), "fatal", retry=False)
+        self.assertEqual(self.status("a"), (wq.DEAD, 1))
+
+    def test_requeue_dead(self):
+        self.enqueue("a", max_attempts=1)
+        self.store.fail(self.store.lease(BATCH, "w1"), "boom")
+        self.assertTrue(self.store.claim_summary(BATCH, "w1"))
+        self.assertEqual(self.store.requeue_dead(BATCH), 1)
+        self.assertEqual(self.status("a"), (wq.PENDING, 0))
+        # 放回后汇总资格重置，批次结束时可以重新汇总
+        self.store.ack(self.store.lease(BATCH, "w1"), {"ok": True})
+        self.assertTrue(self.store.claim_summary(BATCH, "w2"))
+
+    def test_claim_summary_once_and_only_when_finished(self):
+        self.enqueue("a", "b")
+        self.assertFalse(self.store.claim_summary(BATCH, "w1"))
+        self.store.ack(self.store.lease(BATCH, "w1"), {"ok": True})
+        task = self.store.lease(BATCH, "w1")
+        self.assertFalse(self.store.claim_summary(BATCH, "w1"))
+        self.store.ack(task, {"ok": True})
+        self.assertTrue(self.store.claim_summary(BATCH, "w1"))
+        self.assertFalse(self.store.claim_summary(BATCH, "w2"))
+
+    def test_release_does_not_burn_attempts(self):
+        self.enqueue("a")
+        task = self.store.lease(BATCH, "w1")
+        self.assertTrue(self.store.release(task))
+        self.assertEqual(self.status("a"), (wq.PENDING, 0))
+        self.assertFalse(self.store.ack(task, {"ok": True}))
+        self.assertIsNone(self.store.lease(BATCH, "w1", exclude=[task["id"]]))
+        self.assertEqual(self.store.stats(BATCH, exclude=[task["id"]])[wq.PENDING], 0)
+        self.assertEqual(self.store.lease(BATCH, "w2")["attempts"], 1)
+
+    def test_open_queue(self):
+        path = os.path.join(self.tmp, "other.sqlite3")
+        self.assertIsInstance(wq.open_queue("sqlite://" + path), wq.SqliteQueue)
+        self.assertTrue(os.path.exists(path))
+        with self.assertRaises(ValueError):
+            wq.open_queue("nosuch://x")
+
+
+class RunWorkerTest(QueueTestCase):
+    def run_worker(self, handle, worker="w1"):
+        return wq.run_worker(self.store, BATCH, handle, lambda r: not r.get("ok"), log=lambda msg: None,
+                             worker=worker)
+
+    def test_handles_all_tasks(self):
+        self.enqueue("a", "b")
+        self.assertEqual(self.run_worker(lambda p: {"ok": True}), 2)
+        self.assertEqual([t["status"] for t in self.store.results(BATCH)], [wq.DONE, wq.DONE])
+        self.assertTrue(self.store.claim_summary(BATCH, "w1"))
+
+    def test_exception_counts_as_failure(self):
+        self.enqueue("a", max_attempts=1)
+
+        def handle(payload):
+            raise KeyError("cookie")
+
+        self.assertEqual(self.run_worker(handle), 1)
+        dead = self.store.results(BATCH)[0]
+        self.assertEqual((dead["status"], dead["error"]), (wq.DEAD, "KeyError: 'cookie'"))
+
+    def test_foreign_task_is_released_for_other_workers(self):
+        self.enqueue("a", max_attempts=1)
+
+        def foreign(payload):
+            raise wq.ForeignTask("没有该账号的 Cookie")
+
+        # 放回的任务不计入处理数，也不消耗尝试次数，工作进程不会一直等它
+        self.assertEqual(self.run_worker(foreign, "w1"), 0)
+        self.assertEqual(self.status("a"), (wq.PENDING, 0))
+        self.assertFalse(self.store.claim_summary(BATCH, "w1"))
+
+        self.assertEqual(self.run_worker(lambda p: {"ok": True}, "w2"), 1)
+        self.assertEqual(self.status("a"), (wq.DONE, 1))
+        self.assertTrue(self.store.claim_summary(BATCH, "w2"))
+
+    def test_plain_lookup_error_still_counts_as_failure(self):
+        self.enqueue("a", max_attempts=1)
+
+        def handle(payload):
+            raise LookupError("not found")
+
+        self.assertEqual(self.run_worker(handle), 1)
+        self.assertEqual(self.status("a"), (wq.DEAD, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+账号任务队列（两套实现共用，仅依赖标准库）
+
+账号很多时，可以在多个进程 / 多台机器上同时跑工作进程，从同一个队列领取账号：
+- 生产者把当天的账号任务写入一个批次（batch，默认为站点时区的日期），重复写入同一账号会被忽略
+- 工作进程领取任务时获得租约（lease），处理期间定时续约；进程崩溃、租约过期后任务重新可领
+- 失败的任务按指数退避重试，超过最大次数进入死信（dead），不再领取，结果仍参与汇总
+- 每个任务的结果写回队列；批次全部结束后，只有一个工作进程抢到发送汇总推送的资格
+
+WORK_QUEUE 指定队列存储：sqlite（默认路径 ~/.nodeloc/queue.sqlite3）或 sqlite:///绝对路径。
+SQLite 只适合同一台机器上的多个进程（网络文件系统上的文件锁不可靠）；
+多台机器共用时用 register_store() 注册一个共享存储（如 Redis / PostgreSQL）的 QueueStore 实现。
+
+    python work_queue.py                    # 查看今天批次的统计与死信
+    python work_queue.py --requeue-dead     # 把死信任务放回队列
+"""
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import Callable, Collection, Dict, List, Optional
+
+from checkin_state import DATA_DIR, site_today
+
+# ------------------ 基础配置 ------------------
+# 队列存储，为空表示不使用队列（单进程顺序处理所有账号）
+WORK_QUEUE = os.environ.get("WORK_QUEUE", "").strip()
+# 本进程的角色：all（写入当天任务 + 处理 + 汇总）/ producer（只写入任务）/ worker（只处理 + 汇总）
+QUEUE_ROLE = os.environ.get("QUEUE_ROLE", "all").strip().lower()
+# 批次名，默认为站点时区的今天
+QUEUE_BATCH = os.environ.get("QUEUE_BATCH", "").strip()
+# 租约时长（秒）；处理期间每 1/3 租约续约一次
+QUEUE_LEASE = float(os.environ.get("QUEUE_LEASE", "300"))
+# 每个任务最多尝试的次数，超过后进入死信
+QUEUE_MAX_ATTEMPTS = int(os.environ.get("QUEUE_MAX_ATTEMPTS", "3"))
+# 重试退避的基数（秒），第 n 次失败后等待 基数 × 2^(n-1)（带随机抖动）
+QUEUE_BACKOFF = float(os.environ.get("QUEUE_BACKOFF", "60"))
+
+DEFAULT_QUEUE_DB = os.path.join(DATA_DIR, "queue.sqlite3")
+# 退避上限（秒）
+MAX_BACKOFF = 3600
+# 没有可领取的任务、但批次还没结束时的轮询间隔上限（秒）
+POLL_INTERVAL = 15
+# ----------------------------------------------------
+
+PENDING, LEASED, DONE, DEAD = "pending", "leased", "done", "dead"
+
+
+class ForeignTask(LookupError):
+    """本进程处理不了的任务（如没有该账号的 Cookie）：放回队列，不计入尝试次数，留给其他工作进程。"""
+
+
+def batch_name() -> str:
+    return QUEUE_BATCH or site_today()
+
+
+def backoff(attempts: int) -> float:
+    """第 attempts 次失败后的等待时间（秒）。"""
+    delay = min(QUEUE_BACKOFF * (2 ** max(attempts - 1, 0)), MAX_BACKOFF)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class QueueStore:
+    """
+    队列存储接口。任务是 dict：
+        {"id", "batch", "key", "payload", "status", "attempts", "max_attempts", "token", "error", "result"}
+    lease() 返回的任务带 token；renew / ack / fail 必须带上同一个 token，
+    租约过期后被别的工作进程领走的任务，原工作进程的 ack / fail 不生效（返回 False）。
+    """
+
+    def enqueue(self, batch: str, tasks: List[dict], max_attempts: int = QUEUE_MAX_ATTEMPTS) -> int:
+        """写入一个批次的任务（{"key", "payload"}），已存在的 key 忽略；返回新写入的数量。"""
+        raise NotImplementedError
+
+    def lease(self, batch: str, worker: str, seconds: float = QUEUE_LEASE,
+              exclude: Collection[int] = ()) -> Optional[dict]:
+        """
+        领取一个可执行的任务；没有时返回 None。租约过期且次数用完的任务顺便转入死信。
+        :param exclude: 不领取的任务 id（本进程放回过的任务）
+        """
+        raise NotImplementedError
+
+    def release(self, task: dict) -> bool:
+        """放回任务，不计入尝试次数（本次领取作废），其他工作进程可以立即领取。"""
+        raise NotImplementedError
+
+    def renew(self, task: dict, seconds: float = QUEUE_LEASE) -> bool:
+        raise NotImplementedError
+
+    def ack(self, task: dict, result: dict) -> bool:
+        raise NotImplementedError
+
+    def fail(self, task: dict, error: str, result: Optional[dict] = None, retry: bool = True) -> bool:
+        """任务失败：还有次数且 retry 时按退避重新排队，否则进入死信。result 保留给汇总使用。"""
+        raise NotImplementedError
+
+    def stats(self, batch: str, exclude: Collection[int] = ()) -> Dict[str, int]:
+        """各状态的任务数，以及最早的待执行时间 next_at（没有待执行任务时为 None）；exclude 中的任务不计。"""
+        raise NotImplementedError
+
+    def results(self, batch: str) -> List[dict]:
+        """批次中已结束（done / dead）的任务。"""
+        raise NotImplementedError
+
+    def claim_summary(self, batch: str, worker: str) -> bool:
+        """批次全部结束时抢占发送汇总的资格；只有一个工作进程会得到 True。"""
+        raise NotImplementedError
+
+    def requeue_dead(self, batch: str) -> int:
+        raise NotImplementedError
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    summary_by TEXT,
+    summary_at REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    token TEXT,
+    worker TEXT,
+    error TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    updated_at REAL NOT NULL,
+    UNIQUE (batch, key)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_batch_status ON tasks(batch, status, available_at);
+"""
+
+_COLUMNS = "id, batch, key, payload, status, attempts, max_attempts, token, error, result"
+
+
+class SqliteQueue(QueueStore):
+    """单机多进程共用的 SQLite 队列；领取在 BEGIN IMMEDIATE 事务中完成，不会两个进程领到同一个任务。"""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_DB) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _conn(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _task(row) -> dict:
+        task = dict(zip([c.strip() for c in _COLUMNS.split(",")], row))
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    def enqueue(self, batch, tasks, max_attempts=QUEUE_MAX_ATTEMPTS):
+        now = time.time()
+        with self._tx() as conn:
+            conn.execute("INSERT OR IGNORE INTO batches (batch, created_at) VALUES (?, ?)", (batch, now))
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (batch, key, payload, max_attempts, available_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(batch, t["key"], json.dumps(t["payload"], ensure_ascii=False), max_attempts, now, now) for t in tasks],
+            )
+            return conn.total_changes - before
+
+    @staticmethod
+    def _not_in(exclude: Collection[int]) -> str:
+        return f" AND id NOT IN ({','.join(str(int(i)) for i in exclude)})" if exclude else ""
+
+    def lease(self, batch, worker, seconds=QUEUE_LEASE, exclude=()):
+        now = time.time()
+        with self._tx() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = 'lease expired', lease_until = NULL, token = NULL, updated_at = ? "
+                "WHERE batch = ? AND status = ? AND lease_until < ? AND attempts >= max_attempts",
+                (DEAD, now, batch, LEASED, now),
+            )
+            row = conn.execute(
+                "SELECT id FROM tasks WHERE batch = ? AND "
+                "((status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?))" + self._not_in(exclude) +
+                " ORDER BY available_at, id LIMIT 1",
+                (batch, PENDING, now, LEASED, now),
+            ).fetchone()
+            if not row:
+                return None
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE tasks SET status = ?, attempts = attempts + 1, lease_until = ?, token = ?, worker = ?, "
+                "updated_at = ? WHERE id = ?",
+                (LEASED, now + seconds, token, worker, now, row[0]),
+            )
+            return self._task(conn.execute(f"SELECT {_COLUMNS} FROM tasks WHERE id = ?", row).fetchone())
+
+    def _update_leased(self, task: dict, sql: str, args: tuple) -> bool:
+        with self._tx() as conn:
+            cur = conn.execute(
+                f"UPDATE tasks SET {sql}, updated_at = ? WHERE id = ? AND status = ? AND token = ?",
+                args + (time.time(), task["id"], LEASED, task["token"]),
+            )
+            return cur.rowcount == 1
+
+    def renew(self, task, seconds=QUEUE_LEASE):
+        return self._update_leased(task, "lease_until = ?", (time.time() + seconds,))
+
+    def release(self, task):
+        return self._update_leased(
+            task, "status = ?, attempts = MAX(attempts - 1, 0), available_at = ?, lease_until = NULL, token = NULL",
+            (PENDING, time.time()),
+        )
+
+    def ack(self, task, result):
+        return self._update_leased(
+            task, "status = ?, result = ?, error = '', lease_until = NULL, token = NULL",
+            (DONE, json.dumps(result, ensure_ascii=False)),
+        )
+
+    def fail(self, task, error, result=None, retry=True):
+        result_json = json.dumps(result, ensure_ascii=False) if result is not None else None
+        if retry and task["attempts"] < task["max_attempts"]:
+            return self._update_leased(
+                task, "status = ?, available_at = ?, error = ?, result = ?, lease_until = NULL, token = NULL",
+                (PENDING, time.time() + backoff(task["attempts"]), error, result_json),
+            )
+        return self._update_leased(
+            task, "status = ?, error = ?, result = ?, lease_until = NULL, token = NULL", (DEAD, error, result_json),
+        )
+
+    def stats(self, batch, exclude=()):
+        not_in = self._not_in(exclude)
+        with self._conn() as conn:
+            out = {s: 0 for s in (PENDING, LEASED, DONE, DEAD)}
+            out.update(dict(conn.execute(
+                f"SELECT status, COUNT(*) FROM tasks WHERE batch = ?{not_in} GROUP BY status", (batch,)
+            ).fetchall()))
+            out["next_at"] = conn.execute(
+                "SELECT MIN(CASE WHEN status = ? THEN available_at ELSE lease_until END) FROM tasks "
+                f"WHERE batch = ? AND status IN (?, ?){not_in}", (PENDING, batch, PENDING, LEASED),
+            ).fetchone()[0]
+            return out
+
+    def results(self, batch):
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"SELECT {_COLUMNS} FROM tasks WHERE batch = ? AND status IN (?, ?) ORDER BY id", (batch, DONE, DEAD)
+            ).fetchall()
+        return [self._task(r) for r in rows]
+
+    def claim_summary(self, batch, worker):
+        with self._tx() as conn:
+            cur = conn.execute(
+                "UPDATE batches SET summary_by = ?, summary_at = ? WHERE batch = ? AND summary_by IS NULL "
+                "AND NOT EXISTS (SELECT 1 FROM tasks WHERE batch = ? AND status IN (?, ?))",
+                (worker, time.time(), batch, batch, PENDING, LEASED),
+            )
+            return cur.rowcount == 1
+
+    def requeue_dead(self, batch):
+        with self._tx() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET status = ?, attempts = 0, available_at = ?, updated_at = ? WHERE batch = ? AND status = ?",
+                (PENDING, time.time(), time.time(), batch, DEAD),
+            )
+            if cur.rowcount:
+                conn.execute("UPDATE batches SET summary_by = NULL, summary_at = NULL WHERE batch = ?", (batch,))
+            return cur.rowcount
+
+
+def _open_sqlite(rest: str) -> QueueStore:
+    return SqliteQueue(rest or DEFAULT_QUEUE_DB)
+
+
+# 存储类型 -> 工厂函数（参数为 "类型://" 之后的部分）
+_STORES: Dict[str, Callable[[str], QueueStore]] = {"sqlite": _open_sqlite}
+
+
+def register_store(scheme: str, factory: Callable[[str], QueueStore]) -> None:
+    """注册共享存储的实现，如 register_store("redis", lambda rest: RedisQueue("redis://" + rest))。"""
+    _STORES[scheme] = factory
+
+
+def open_queue(url: str = WORK_QUEUE) -> QueueStore:
+    """按 WORK_QUEUE 打开队列：sqlite / sqlite:///path / 已注册的 类型://..."""
+    scheme, _, rest = (url or "sqlite").partition("://")
+    if scheme not in _STORES:
+        raise ValueError(f"未知的队列存储: {scheme}（可用: {', '.join(sorted(_STORES))}）")
+    return _STORES[scheme](rest)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+@contextmanager
+def keep_leased(store: QueueStore, task: dict, seconds: float = QUEUE_LEASE):
+    """处理期间在后台线程中定时续约；返回的 dict 中 lost 为 True 表示租约已被别的进程接手。"""
+    state = {"lost": False}
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(seconds / 3.0):
+            try:
+                if not store.renew(task, seconds):
+                    state["lost"] = True
+                    return
+            except Exception:
+                # 存储暂时不可用：下一轮再试，租约过期前恢复即可
+                pass
+
+    t = threading.Thread(target=_loop, name="queue-lease", daemon=True)
+    t.start()
+    try:
+        yield state
+    finally:
+        stop.set()
+        t.join(timeout=5)
+
+
+def run_worker(store: QueueStore, batch: str, handle: Callable[[dict], dict],
+               should_retry: Callable[[dict], bool], log=print, worker: Optional[str] = None) -> int:
+    """
+    工作循环：领取 -> handle(payload) -> ack / fail，直到批次中没有本进程能处理的未结束任务。
+    别的工作进程还持有租约、或任务在退避中时继续等待，接手崩溃进程过期的租约。
+    :param handle: 处理一个任务，返回结果 dict；抛异常视为可重试的失败，抛 ForeignTask 时放回队列留给其他进程
+    :param should_retry: 根据结果判断是否需要重试
+    :return: 本进程处理的任务数（不含放回的任务）
+    """
+    worker = worker or worker_id()
+    handled = 0
+    foreign = set()
+    while True:
+        task = store.lease(batch, worker, exclude=foreign)
+        if task is None:
+            st = store.stats(batch, exclude=foreign)
+            if not st[PENDING] and not st[LEASED]:
+                if foreign:
+                    log(f"📦 还有 {len(foreign)} 个任务本进程无法处理，留给其他工作进程")
+                return handled
+            wait = min(max((st["next_at"] or 0) - time.time(), 1.0), POLL_INTERVAL)
+            time.sleep(wait)
+            continue
+
+        log(f"📥 领取任务 {task['key']}（第 {task['attempts']}/{task['max_attempts']} 次）")
+        with keep_leased(store, task) as lease:
+            try:
+                result = handle(task["payload"])
+                error = None
+            except ForeignTask as e:
+                foreign.add(task["id"])
+                store.release(task)
+                log(f"↩️ 任务 {task['key']} 放回队列：{e}")
+                continue
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {e}"
+        handled += 1
+        if lease["lost"]:
+            log(f"⚠️ 任务 {task['key']} 的租约已过期并被其他进程接手，结果不回写")
+            continue
+        if error is None and not should_retry(result):
+            store.ack(task, result)
+            continue
+        error = error or (result or {}).get("error") or "failed"
+        store.fail(task, error, result)
+        if task["attempts"] < task["max_attempts"]:
+            log(f"🔁 任务 {task['key']} 失败（{error}），稍后重试")
+        else:
+            log(f"☠️ 任务 {task['key']} 失败 {task['attempts']} 次，转入死信（{error}）")
+
+
+# ------------------ 命令行 ------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NodeLoc 账号任务队列")
+    parser.add_argument("--batch", default=batch_name(), help="批次名，默认今天")
+    parser.add_argument("--queue", default=WORK_QUEUE or "sqlite", help="队列存储，默认 WORK_QUEUE")
+    parser.add_argument("--requeue-dead", action="store_true", help="把死信任务放回队列")
+    ns = parser.parse_args()
+    q = open_queue(ns.queue)
+    if ns.requeue_dead:
+        print(f"已放回 {q.requeue_dead(ns.batch)} 个死信任务")
+    st = q.stats(ns.batch)
+    print(f"批次 {ns.batch}: " + "，".join(f"{k} {st[k]}" for k in (PENDING, LEASED, DONE, DEAD)))
+    for t in q.results(ns.batch):
+        if t["status"] == DEAD:
+            print(f"  ☠️ {t['key']}  尝试 {t['attempts']} 次  {t['error']}")
+# ----------------------------------------------------